@@ -6,20 +6,27 @@ import os
 from typing import Any, Dict, Optional
 
 from dotenv import load_dotenv
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
+
+from src.rest.api.request_deadline import request_deadline, request_timeout
+from src.service.business_index import BusinessIndex
+from src.service.opening_hours import OpeningHours, parse_window
+from src.util.admission import AdmissionController, AdmissionRejectedError
+from src.util.deadline import DeadlineExceededError, RequestCancelledError
+from src.util.http_client import HttpClient
+from src.util.lazy import Lazy
+from src.util.metrics import REGISTRY
+from src.util.warmup import Warmup
 
 from .memory import store
 from .schemas import TriggerRequest, WebhookEvent
 from .vapi_client import ApiError, VapiClient
 
+logger = logging.getLogger(__name__)
+
 
 def register_vapi_routes(app: Flask) -> None:
     """Register Vapi-related routes and error handlers on an existing Flask app."""
-    load_dotenv()
-
-    logging.basicConfig(level=logging.INFO)
-    logger = logging.getLogger(__name__)
-
     vapi_api_key = os.getenv("VAPI_API_KEY", "").strip()
     vapi_base_url = os.getenv("VAPI_BASE_URL", "https://api.vapi.ai").strip()
     public_url = os.getenv("PUBLIC_URL", "http://localhost:5000").strip()
@@ -28,7 +35,23 @@ def register_vapi_routes(app: Flask) -> None:
     if not vapi_api_key:
         logger.warning("VAPI_API_KEY is not set. Set it in .env.")
 
-    client = VapiClient(base_url=vapi_base_url, api_key=vapi_api_key)
+    vapi_timeout = float(os.getenv("VAPI_TIMEOUT_SECONDS") or 30)
+    client = Lazy(lambda: VapiClient(base_url=vapi_base_url, api_key=vapi_api_key, timeout=vapi_timeout))
+    # Every trigger starts a call, so a burst is queued briefly or turned away rather than all sent to Vapi at once
+    trigger_admission = AdmissionController(
+        "trigger",
+        max_concurrent=int(os.getenv("ADMISSION_TRIGGER_MAX_CONCURRENT") or 32),
+        max_queue=int(os.getenv("ADMISSION_TRIGGER_MAX_QUEUE") or 64),
+        queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS") or 10),
+    )
+    REGISTRY.register_collector("admission_trigger", trigger_admission.stats)
+    # Opened off the request path by the warm-up, like the other lazily built services
+    business_index = Lazy(BusinessIndex)
+    Warmup().add("business_index", business_index.get)
+    Warmup().add("vapi_connections", lambda: HttpClient().prewarm(
+        vapi_base_url,
+        connections=int(os.getenv("WARMUP_CONNECTIONS") or 4)
+    ))
 
     @app.errorhandler(ApiError)
     def handle_api_error(err: ApiError):
@@ -45,6 +68,19 @@ def register_vapi_routes(app: Flask) -> None:
             err.status_code,
         )
 
+    @app.errorhandler(AdmissionRejectedError)
+    def handle_admission_rejected(err: AdmissionRejectedError):
+        return jsonify({"error": {"message": str(err)}}), 429, {"Retry-After": str(err.retry_after)}
+
+    @app.errorhandler(DeadlineExceededError)
+    def handle_deadline_exceeded(err: DeadlineExceededError):
+        return jsonify({"error": {"message": str(err)}}), 504
+
+    @app.errorhandler(RequestCancelledError)
+    def handle_request_cancelled(err: RequestCancelledError):
+        # Nobody reads the response of a client that went away; the status is for logs and metrics
+        return jsonify({"error": {"message": str(err)}}), 499
+
     @app.errorhandler(Exception)
     def handle_exception(err: Exception):
         logger.exception("Unhandled error")
@@ -54,6 +90,15 @@ def register_vapi_routes(app: Flask) -> None:
     def health():
         return jsonify({"ok": True})
 
+    @app.get("/ready")
+    def ready():
+        status = Warmup().status()
+        return jsonify(status), 200 if status["ready"] else 503
+
+    @app.get("/metrics")
+    def metrics():
+        return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
     @app.get("/workflows")
     def workflows():
         page_param = request.args.get("page")
@@ -61,7 +106,8 @@ def register_vapi_routes(app: Flask) -> None:
         page = int(page_param) if page_param is not None else None
         limit = int(limit_param) if limit_param is not None else None
 
-        items = client.list_workflows(page=page, limit=limit)
+        with request_deadline(request.environ, request_timeout(request.headers)):
+            items = client.get().list_workflows(page=page, limit=limit)
         return jsonify(items)
 
     @app.post("/trigger")
@@ -78,13 +124,18 @@ def register_vapi_routes(app: Flask) -> None:
 
         phone_number_id = payload.phoneNumberId or default_phone_number_id
 
-        result = client.start_workflow_run(
-            workflow_id=payload.workflowId,
-            variables=variables,
-            webhook_url=webhook_url,
-            customer_number=payload.customerNumber,
-            phone_number_id=phone_number_id,
-        )
+        if payload.customerNumber and _closed_during(payload.customerNumber, payload.window):
+            return jsonify({"error": {"message": "The business is closed during the requested window"}}), 409
+
+        # The deadline is entered first, so time queued for a slot is charged to the request
+        with request_deadline(request.environ, request_timeout(request.headers)), trigger_admission.slot():
+            result = client.get().start_workflow_run(
+                workflow_id=payload.workflowId,
+                variables=variables,
+                webhook_url=webhook_url,
+                customer_number=payload.customerNumber,
+                phone_number_id=phone_number_id,
+            )
 
         return (
             jsonify(
@@ -97,6 +148,18 @@ def register_vapi_routes(app: Flask) -> None:
             201,
         )
 
+    def _closed_during(number: str, window: str) -> bool:
+        """
+        Whether the indexed hours of the business at number leave it closed for the whole window. Unknown
+        businesses, unparsable hours and windows that cannot be read precisely never block a call.
+        """
+        mask = parse_window(window)
+        if mask is None:
+            return False
+        hours = [OpeningHours.parse(text) for text in business_index.get().hours_by_number(number)]
+        hours = [h for h in hours if h is not None]
+        return bool(hours) and not any(h.overlaps(mask) for h in hours)
+
     def _extract_booking_summary(event: Dict[str, Any]) -> Dict[str, Any]:
         # Best-effort extraction of relevant fields if present
         fields: Dict[str, Any] = {}
@@ -157,7 +220,7 @@ def register_vapi_routes(app: Flask) -> None:
 
         # Log key fields
         summary = _extract_booking_summary(event_json)
-        logging.getLogger(__name__).info("Webhook summary: %s", json.dumps(summary))
+        logger.info("Webhook summary: %s", json.dumps(summary))
 
         return jsonify({"ok": True})
 
@@ -165,29 +228,19 @@ def register_vapi_routes(app: Flask) -> None:
     def last_webhook():
         return jsonify(store.get_last() or {})
 
-    # Print curl examples on startup
-    logger.info("""Curl examples:
-# 1) List workflows
-curl -s http://localhost:5000/workflows | jq
-
-# 2) Trigger a workflow (replace WF_ID)
-curl -s -X POST http://localhost:5000/trigger \
-  -H "Content-Type: application/json" \
-  -d "{\"workflowId\":\"WF_ID\",\"user\":\"Marco\",\"serviceType\":\"men's haircut\",\"window\":\"Mon–Fri afternoon\"}" | jq
-
-# 3) Inspect the last webhook payload
-curl -s http://localhost:5000/debug/last-webhook | jq""")
-
 
 def create_app() -> Flask:
     app = Flask(__name__)
     # Do not enable CORS here to avoid double middleware; let main app decide
     register_vapi_routes(app)
+    Warmup().start()
     return app
 
 
 if __name__ == "__main__":
-    # Standalone run for this module
+    # Standalone run for this module; when served by MyClanker, Env has already loaded .env
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
     app = create_app()
     port_str = os.getenv("PORT", "5000")
     try:
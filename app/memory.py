@@ -17,6 +17,15 @@ class InMemoryStore:
         with self._lock:
             return self._last_payload
 
+    def snapshot(self) -> Optional[Dict[str, Any]]:
+        return self.get_last()
+
+    def restore(self, payload: Dict[str, Any]) -> None:
+        with self._lock:
+            # A webhook received since startup is newer than the snapshot
+            if self._last_payload is None:
+                self._last_payload = payload
+
 
 store = InMemoryStore()
 
@@ -5,6 +5,10 @@ from typing import Any, Dict, List, Optional, Tuple
 
 import requests
 
+from src.util.deadline import budget, check
+from src.util.http_client import HttpClient
+from src.util.metrics import upstream_call
+
 
 class ApiError(Exception):
     def __init__(self, *, status_code: int, endpoint: str, response_text: str) -> None:
@@ -15,22 +19,32 @@ class ApiError(Exception):
 
 
 class VapiClient:
-    def __init__(self, *, base_url: str, api_key: str) -> None:
+    def __init__(self, *, base_url: str, api_key: str, timeout: Optional[float] = 30.0) -> None:
         self.base_url = base_url.rstrip("/")
-        self.session = requests.Session()
-        # Default headers (acts like an interceptor)
-        self.session.headers.update(
-            {
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json",
-            }
-        )
+        # Per call, capped by the remaining budget of the current request deadline
+        self.timeout = timeout
+        # Shares the process-wide connection pool, so connections opened by the warm-up are reused
+        self.session = HttpClient().session
+        # Default headers (acts like an interceptor), sent per request since the session is shared
+        self.headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        }
 
     def _full_url(self, path: str) -> str:
         if not path.startswith("/"):
             path = "/" + path
         return f"{self.base_url}{path}"
 
+    def _send(self, method: str, endpoint: str, **kwargs: Any) -> requests.Response:
+        try:
+            return self.session.request(
+                method, self._full_url(endpoint), headers=self.headers, timeout=budget(self.timeout), **kwargs
+            )
+        except requests.exceptions.Timeout:
+            check()
+            raise TimeoutError(f"Vapi request to {endpoint} timed out")
+
     def _handle_response(self, *, resp: requests.Response, endpoint: str) -> Any:
         if not resp.ok:
             raise ApiError(status_code=resp.status_code, endpoint=endpoint, response_text=resp.text)
@@ -49,7 +63,9 @@ class VapiClient:
         if limit is not None:
             params["limit"] = limit
 
-        resp = self.session.get(self._full_url(endpoint), params=params)
+        with upstream_call("vapi", "list_workflows") as call:
+            resp = self._send("GET", endpoint, params=params)
+            call.status = resp.status_code
         data = self._handle_response(resp=resp, endpoint=endpoint)
 
         # Normalize to list of workflows
@@ -91,7 +107,9 @@ class VapiClient:
         if customer_number:
             payload["customer"] = {"number": customer_number}
             payload["type"] = "outboundPhoneCall"
-        resp = self.session.post(self._full_url(endpoint), data=json.dumps(payload))
+        with upstream_call("vapi", "create_call") as call:
+            resp = self._send("POST", endpoint, data=json.dumps(payload))
+            call.status = resp.status_code
         data = self._handle_response(resp=resp, endpoint=endpoint)
         if isinstance(data, dict):
             return {
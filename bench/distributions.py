@@ -0,0 +1,77 @@
+import math
+import random
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Optional, Tuple
+
+
+@dataclass(frozen=True)
+class LatencyModel:
+    """
+    Distribution of the simulated latency of a mock endpoint, in seconds.
+
+    Specs are "<kind>:<params>":
+        fixed:0.2             always 200ms
+        uniform:0.1,0.5       anywhere between 100ms and 500ms
+        normal:0.3,0.05       mean 300ms, standard deviation 50ms
+        lognormal:0.8,0.5     median 800ms with a long tail, sigma of the underlying normal 0.5
+    Samples are clamped at zero.
+    """
+    kind: str = "fixed"
+    params: Tuple[float, ...] = (0.0,)
+
+    __ARITY = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyModel":
+        kind, _, params = spec.strip().partition(":")
+        kind = kind.lower()
+        if kind not in cls.__ARITY:
+            raise ValueError(f"Unknown latency distribution '{kind}', expected one of {sorted(cls.__ARITY)}")
+        values = tuple(float(p) for p in params.split(",") if p.strip())
+        if len(values) != cls.__ARITY[kind]:
+            raise ValueError(f"Latency distribution '{kind}' takes {cls.__ARITY[kind]} parameters, got '{spec}'")
+        return cls(kind, values)
+
+    def sample(self, rng: random.Random = random) -> float:
+        if self.kind == "fixed":
+            value = self.params[0]
+        elif self.kind == "uniform":
+            value = rng.uniform(*self.params)
+        elif self.kind == "normal":
+            value = rng.gauss(*self.params)
+        else:
+            median, sigma = self.params
+            value = rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+        return max(value, 0.0)
+
+    def __str__(self) -> str:
+        return f"{self.kind}:{','.join(f'{p:g}' for p in self.params)}"
+
+
+@dataclass
+class ErrorModel:
+    """
+    Injects upstream failures: a share of requests gets one of the given HTTP statuses instead of a real answer.
+    429s carry a Retry-After header, like the real APIs.
+    """
+    rate: float = 0.0
+    statuses: Tuple[int, ...] = (500,)
+    retry_after_seconds: int = 1
+    _rng: random.Random = field(default_factory=random.Random, repr=False)
+    _lock: Lock = field(default_factory=Lock, repr=False)
+
+    def __post_init__(self):
+        if not 0 <= self.rate <= 1:
+            raise ValueError("Error rate must be between 0 and 1")
+        if not self.statuses:
+            raise ValueError("At least one error status is required")
+
+    def sample(self) -> Optional[int]:
+        """
+        :return: the status to fail the request with, or None to answer it normally
+        """
+        with self._lock:
+            if self._rng.random() >= self.rate:
+                return None
+            return self._rng.choice(self.statuses)
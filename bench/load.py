@@ -0,0 +1,174 @@
+import itertools
+import math
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import requests
+
+SERVICES = ["men's haircut", "beard trim", "dog grooming", "deep tissue massage", "manicure", "car detailing"]
+WINDOWS = ["Mon-Fri afternoon", "tomorrow morning", "this weekend", "weekday evenings"]
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """
+    One kind of request the driver sends. build(i) returns the method, path and JSON body of the i-th request.
+    """
+    name: str
+    build: Callable[[int], Tuple[str, str, Optional[Dict[str, Any]]]]
+
+
+def conversation_scenario(unique_ratio: float = 1.0) -> Scenario:
+    """
+    POST /v1/conversation. A unique_ratio share of requests is distinct; the rest repeat a small set of requests,
+    so the app's caches see a realistic mix of hits and misses.
+    """
+    def build(i: int):
+        service = SERVICES[i % len(SERVICES)]
+        repeated = (i * 0.6180339887) % 1 >= unique_ratio
+        suffix = f"#{i % 4}" if repeated else f"#{uuid.uuid4().hex[:8]}"
+        return "POST", "/v1/conversation", {"user_request": f"Book me a {service} near me {suffix}"}
+
+    return Scenario("conversation", build)
+
+
+def trigger_scenario() -> Scenario:
+    """
+    POST /trigger, which starts a Vapi call per request
+    """
+    def build(i: int):
+        return "POST", "/trigger", {
+            "workflowId": f"wf-bench-{i % 3 + 1}",
+            "user": f"bench-user-{i}",
+            "serviceType": SERVICES[i % len(SERVICES)],
+            "window": WINDOWS[i % len(WINDOWS)],
+        }
+
+    return Scenario("trigger", build)
+
+
+def webhook_scenario() -> Scenario:
+    """
+    POST /webhooks/vapi with end-of-call reports, as Vapi sends them
+    """
+    def build(i: int):
+        return "POST", "/webhooks/vapi", {
+            "id": f"call-bench-{i}",
+            "status": "ended",
+            "type": "end-of-call-report",
+            "booking": {"date": "2025-10-21", "time": "16:00", "price": "$27", "duration": "30 min"},
+            "business": {"name": "Bench Barbers", "phone": "+14155550100"},
+        }
+
+    return Scenario("webhook", build)
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """
+    Linearly interpolated percentile of already sorted values, q in [0, 100]
+    """
+    if not sorted_values:
+        return math.nan
+    rank = (len(sorted_values) - 1) * q / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+@dataclass
+class LoadResult:
+    scenario: str
+    concurrency: int
+    elapsed_seconds: float = 0.0
+    latencies: List[float] = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Throughput and latency percentiles of the run. Requests are ok when they got a 2xx; transport failures are
+        counted under the exception name in statuses.
+        """
+        latencies = sorted(self.latencies)
+        requests_sent = len(latencies)
+        ok = sum(n for status, n in self.statuses.items() if str(status).startswith("2"))
+        return {
+            "scenario": self.scenario,
+            "concurrency": self.concurrency,
+            "requests": requests_sent,
+            "ok": ok,
+            "errors": requests_sent - ok,
+            "error_rate": (requests_sent - ok) / requests_sent if requests_sent else 0.0,
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items(), key=lambda kv: str(kv[0]))},
+            "elapsed_seconds": round(self.elapsed_seconds, 3),
+            "throughput_rps": round(requests_sent / self.elapsed_seconds, 3) if self.elapsed_seconds else 0.0,
+            "latency_ms": {
+                "min": round(latencies[0] * 1000, 3) if latencies else None,
+                "mean": round(sum(latencies) / requests_sent * 1000, 3) if latencies else None,
+                "p50": round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+                "p95": round(percentile(latencies, 95) * 1000, 3) if latencies else None,
+                "p99": round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+                "max": round(latencies[-1] * 1000, 3) if latencies else None,
+            },
+        }
+
+
+def run_load(
+    base_url: str,
+    scenario: Scenario,
+    concurrency: int,
+    requests_total: Optional[int] = None,
+    duration_seconds: Optional[float] = None,
+    timeout: float = 300.0
+) -> LoadResult:
+    """
+    Send requests of a scenario from concurrency closed-loop workers, each starting its next request as soon as the
+    previous one finished, until requests_total were sent or duration_seconds passed.
+
+    :param base_url: URL of the app under test
+    :param scenario: Requests to send
+    :param concurrency: Number of workers, i.e. requests in flight at once
+    :param requests_total: Stop after this many requests
+    :param duration_seconds: Stop starting requests after this many seconds
+    :param timeout: Seconds each request may take
+    :return: latency of every request and the count of each status
+    """
+    if requests_total is None and duration_seconds is None:
+        raise ValueError("Either requests_total or duration_seconds is required")
+
+    result = LoadResult(scenario=scenario.name, concurrency=concurrency)
+    lock = threading.Lock()
+    counter = itertools.count()
+    started = time.perf_counter()
+    deadline = None if duration_seconds is None else started + duration_seconds
+
+    def worker():
+        session = requests.Session()
+        while True:
+            i = next(counter)
+            if requests_total is not None and i >= requests_total:
+                return
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+
+            method, path, body = scenario.build(i)
+            request_started = time.perf_counter()
+            try:
+                status = session.request(method, f"{base_url}{path}", json=body, timeout=timeout).status_code
+            except requests.RequestException as e:
+                status = type(e).__name__
+            latency = time.perf_counter() - request_started
+
+            with lock:
+                result.latencies.append(latency)
+                result.statuses[status] += 1
+
+    workers = [threading.Thread(target=worker, name=f"load-{i}", daemon=True) for i in range(concurrency)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+    result.elapsed_seconds = time.perf_counter() - started
+    return result
@@ -0,0 +1,195 @@
+"""
+Local stand-in for the OpenAI endpoints the app calls: chat completions (intent, query composition, result cleaning
+and conversation replies) and responses (web search). Answers are synthetic but shaped like the real payloads, so
+the app runs its full parsing path. Query composition echoes a digest of the user request, so distinct requests
+miss the app's caches like distinct real requests would.
+
+Run standalone with: python -m bench.mock_openai --port 9001
+"""
+import argparse
+import hashlib
+import json
+import random
+import time
+import uuid
+from typing import Any, Dict, Iterator, List, Optional
+from flask import Flask, Response, jsonify, request
+from bench.distributions import ErrorModel, LatencyModel
+from bench.server import MockStats
+
+# Seconds between streamed chunks, after the sampled time to first token
+STREAM_CHUNK_INTERVAL = 0.005
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()[:8]
+
+
+def _businesses(query: str, count: int) -> Dict[str, Dict[str, Any]]:
+    rng = random.Random(query)
+    digest = _digest(query)
+    return {
+        f"Bench Studio {digest} No {i + 1}": {
+            "number": f"(415) 555-{rng.randint(1000, 9999):04d}",
+            "hours": rng.choice(["Mon-Fri 9am-6pm; Sat 10am-4pm", "Tue-Sun 10am-8pm", "Daily 8am-10pm"]),
+            "stars": round(rng.uniform(3.5, 5.0), 1),
+            "price_range": rng.choice(["$", "$$", "$$$"]),
+        }
+        for i in range(count)
+    }
+
+
+def _chat_content(messages: List[Dict[str, Any]], businesses: int) -> str:
+    system = next((m.get("content") or "" for m in messages if m.get("role") == "system"), "").lower()
+    prompt = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    if "intent classification" in system:
+        return "Book Appointment"
+    if "search query" in system:
+        return f"bench services {_digest(prompt)} near me"
+    if "data-cleaning" in system:
+        return json.dumps(_businesses(prompt, businesses))
+    return "Happy to help. The earliest opening is tomorrow at 4 PM for $27, shall I book it?"
+
+
+def _chunks(text: str, size: int = 16) -> Iterator[str]:
+    for i in range(0, len(text), size):
+        yield text[i:i + size]
+
+
+def _usage(prompt: str, completion: str) -> Dict[str, int]:
+    prompt_tokens, completion_tokens = len(prompt) // 4 + 1, len(completion) // 4 + 1
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def create_openai_app(
+    chat_latency: LatencyModel = LatencyModel("fixed", (0.05,)),
+    responses_latency: LatencyModel = LatencyModel("fixed", (0.5,)),
+    errors: Optional[ErrorModel] = None,
+    businesses: int = 5,
+    stats: Optional[MockStats] = None
+) -> Flask:
+    """
+    :param chat_latency: Time to the first byte of chat completions
+    :param responses_latency: Time to the first byte of web searches
+    :param errors: Injected failures, none by default
+    :param businesses: Businesses returned by every web search
+    :param stats: Counters the requests are recorded in
+    """
+    app = Flask("mock_openai")
+    errors = errors or ErrorModel()
+    app.config["stats"] = stats = stats or MockStats()
+
+    def fail(endpoint: str):
+        status = errors.sample()
+        if status is None:
+            return None
+        stats.record(endpoint, status)
+        headers = {"Retry-After": str(errors.retry_after_seconds)} if status == 429 else {}
+        return jsonify({"error": {"message": "Injected failure", "type": "bench", "code": status}}), status, headers
+
+    @app.post("/v1/chat/completions")
+    def chat_completions():
+        body = request.get_json(force=True)
+        time.sleep(chat_latency.sample())
+        failure = fail("chat_completions")
+        if failure is not None:
+            return failure
+
+        messages = body.get("messages") or []
+        content = _chat_content(messages, businesses)
+        usage = _usage(json.dumps(messages), content)
+        stats.record("chat_completions", 200)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+        if not body.get("stream"):
+            return jsonify({
+                "id": completion_id,
+                "object": "chat.completion",
+                "model": body.get("model"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+
+        def events() -> Iterator[str]:
+            for chunk in _chunks(content):
+                delta = {"choices": [{"index": 0, "delta": {"content": chunk}}], "id": completion_id}
+                yield f"data: {json.dumps(delta)}\n\n"
+                time.sleep(STREAM_CHUNK_INTERVAL)
+            yield f"data: {json.dumps({'choices': [], 'usage': usage, 'id': completion_id})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return Response(events(), mimetype="text/event-stream")
+
+    @app.post("/v1/responses")
+    def responses():
+        body = request.get_json(force=True)
+        time.sleep(responses_latency.sample())
+        failure = fail("responses")
+        if failure is not None:
+            return failure
+
+        query = str(body.get("input") or "").split("\n", 1)[0]
+        text = f"Here are some options:\n```json\n{json.dumps(_businesses(query, businesses), indent=2)}\n```"
+        usage = _usage(str(body.get("input")), text)
+        stats.record("responses", 200)
+        response_id = f"resp_{uuid.uuid4().hex}"
+
+        if not body.get("stream"):
+            return jsonify({
+                "id": response_id,
+                "object": "response",
+                "model": body.get("model"),
+                "output": [{
+                    "type": "message",
+                    "role": "assistant",
+                    "content": [{"type": "output_text", "text": text}],
+                }],
+                "usage": usage,
+            })
+
+        def events() -> Iterator[str]:
+            for chunk in _chunks(text, size=64):
+                yield f"data: {json.dumps({'type': 'response.output_text.delta', 'delta': chunk})}\n\n"
+                time.sleep(STREAM_CHUNK_INTERVAL)
+            completed = {"type": "response.completed", "response": {"id": response_id, "usage": usage}}
+            yield f"data: {json.dumps(completed)}\n\n"
+
+        return Response(events(), mimetype="text/event-stream")
+
+    @app.get("/_stats")
+    def mock_stats():
+        return jsonify(stats.to_dict())
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--chat-latency", type=LatencyModel.parse, default=LatencyModel("fixed", (0.05,)))
+    parser.add_argument("--responses-latency", type=LatencyModel.parse, default=LatencyModel("fixed", (0.5,)))
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-statuses", default="500", help="Comma separated statuses of injected failures")
+    parser.add_argument("--businesses", type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_openai_app(
+        chat_latency=args.chat_latency,
+        responses_latency=args.responses_latency,
+        errors=ErrorModel(args.error_rate, tuple(int(s) for s in args.error_statuses.split(","))),
+        businesses=args.businesses
+    )
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
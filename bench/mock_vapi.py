@@ -0,0 +1,126 @@
+"""
+Local stand-in for the Vapi endpoints the app calls: listing workflows and creating calls. Every created call can be
+followed by webhook callbacks to the app, a status update and then an end-of-call report with a booking, as Vapi
+sends them when a call progresses.
+
+Run standalone with: python -m bench.mock_vapi --port 9002 --webhook-url http://localhost:8000/webhooks/vapi
+"""
+import argparse
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+import requests
+from flask import Flask, jsonify, request
+from bench.distributions import ErrorModel, LatencyModel
+from bench.server import MockStats
+
+
+def _end_of_call_report(call_id: str) -> Dict[str, Any]:
+    return {
+        "id": call_id,
+        "status": "ended",
+        "type": "end-of-call-report",
+        "booking": {
+            "date": "2025-10-21",
+            "time": "16:00",
+            "price": "$27",
+            "duration": "30 min",
+        },
+        "business": {
+            "name": "Bench Barbers",
+            "address": "1 Market St, San Francisco, CA",
+            "phone": "+14155550100",
+        },
+    }
+
+
+def create_vapi_app(
+    latency: LatencyModel = LatencyModel("fixed", (0.1,)),
+    errors: Optional[ErrorModel] = None,
+    webhook_url: Optional[str] = None,
+    webhook_delay: LatencyModel = LatencyModel("fixed", (1.0,)),
+    workflows: int = 3,
+    stats: Optional[MockStats] = None
+) -> Flask:
+    """
+    :param latency: Time to answer each API request
+    :param errors: Injected failures, none by default
+    :param webhook_url: Where webhook callbacks of created calls are posted, no callbacks when None
+    :param webhook_delay: Time between the call being created and each of its callbacks
+    :param workflows: Workflows returned by GET /workflow
+    :param stats: Counters the requests and callbacks are recorded in
+    """
+    app = Flask("mock_vapi")
+    errors = errors or ErrorModel()
+    app.config["stats"] = stats = stats or MockStats()
+    callbacks = requests.Session()
+
+    def respond(endpoint: str, body: Any, status: int = 200):
+        time.sleep(latency.sample())
+        failure = errors.sample()
+        if failure is not None:
+            stats.record(endpoint, failure)
+            headers = {"Retry-After": str(errors.retry_after_seconds)} if failure == 429 else {}
+            return jsonify({"message": "Injected failure", "statusCode": failure}), failure, headers
+        stats.record(endpoint, status)
+        return jsonify(body), status
+
+    def send_callbacks(call_id: str) -> None:
+        for event in ({"id": call_id, "status": "in-progress", "type": "status-update"}, _end_of_call_report(call_id)):
+            time.sleep(webhook_delay.sample())
+            try:
+                callbacks.post(webhook_url, json=event, timeout=10).raise_for_status()
+                stats.event("webhook_delivered")
+            except requests.RequestException:
+                stats.event("webhook_failed")
+
+    @app.get("/workflow")
+    def list_workflows():
+        return respond("workflow", [
+            {"id": f"wf-bench-{i + 1}", "name": f"Bench workflow {i + 1}"} for i in range(workflows)
+        ])
+
+    @app.post("/call")
+    def create_call():
+        payload = request.get_json(force=True, silent=True) or {}
+        call_id = str(uuid.uuid4())
+        res = respond("call", {
+            "id": call_id,
+            "status": "queued",
+            "workflowId": payload.get("workflowId"),
+            "type": payload.get("type", "webCall"),
+        }, status=201)
+        if webhook_url and res[1] == 201:
+            threading.Thread(target=send_callbacks, args=(call_id,), daemon=True).start()
+        return res
+
+    @app.get("/_stats")
+    def mock_stats():
+        return jsonify(stats.to_dict())
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Vapi server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9002)
+    parser.add_argument("--latency", type=LatencyModel.parse, default=LatencyModel("fixed", (0.1,)))
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-statuses", default="500", help="Comma separated statuses of injected failures")
+    parser.add_argument("--webhook-url", help="Post webhook callbacks of created calls here")
+    parser.add_argument("--webhook-delay", type=LatencyModel.parse, default=LatencyModel("fixed", (1.0,)))
+    args = parser.parse_args()
+
+    app = create_vapi_app(
+        latency=args.latency,
+        errors=ErrorModel(args.error_rate, tuple(int(s) for s in args.error_statuses.split(","))),
+        webhook_url=args.webhook_url,
+        webhook_delay=args.webhook_delay
+    )
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Offline benchmark of the app: starts mock OpenAI and Vapi servers, runs the app against them and drives its
+endpoints at a fixed concurrency, then prints and saves throughput and latency percentiles per scenario.
+
+    python -m bench.run --concurrency 16 --requests 200
+    python -m bench.run --scenarios conversation --duration 60 --responses-latency lognormal:2,0.6 --error-rate 0.02
+    python -m bench.run --app-url http://localhost:8000 ...   # against an app that is already running
+
+No real API is called and no credits are spent. Results are written as JSON to bench/results/ so runs can be
+compared.
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+import requests
+from bench.distributions import ErrorModel, LatencyModel
+from bench.load import conversation_scenario, run_load, trigger_scenario, webhook_scenario
+from bench.mock_openai import create_openai_app
+from bench.mock_vapi import create_vapi_app
+from bench.server import BackgroundServer, MockStats
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+# The mocks answer as fast as they are configured to; the app's limits for the real OpenAI account would otherwise
+# dominate every result. Override them with --app-env to benchmark the limiter itself.
+DEFAULT_APP_ENV = {
+    "LLM_RPM_LIMIT": "1000000",
+    "LLM_TPM_LIMIT": "1000000000",
+    "SNAPSHOT_INTERVAL_SECONDS": "0",
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _wait_ready(base_url: str, timeout: float, process: Optional[subprocess.Popen] = None) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"App exited with status {process.returncode} before it was ready")
+        try:
+            if requests.get(f"{base_url}/ready", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"App at {base_url} was not ready within {timeout:.0f}s")
+
+
+def _start_app(args, port: int, openai_url: str, vapi_url: str, workdir: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        **DEFAULT_APP_ENV,
+        "HOST": "127.0.0.1",
+        "PORT": str(port),
+        "SERVER_MODE": args.server_mode,
+        "OPENAI_BASE_URL": f"{openai_url}/v1",
+        "OPENAI_API_KEY": "bench",
+        "VAPI_BASE_URL": vapi_url,
+        "VAPI_API_KEY": "bench",
+        "PUBLIC_URL": f"http://127.0.0.1:{port}",
+        # Fresh state for every run, so earlier runs cannot turn misses into cache hits
+        "SNAPSHOT_PATH": os.path.join(workdir, "snapshot.bin"),
+        "SEARCH_CACHE_PATH": os.path.join(workdir, "search_cache.sqlite3"),
+        "BUSINESS_INDEX_PATH": os.path.join(workdir, "business_index.sqlite3"),
+        "CONVERSATION_STORE_PATH": os.path.join(workdir, "conversations.sqlite3"),
+        "PYTHONPATH": os.pathsep.join(p for p in (ROOT, os.environ.get("PYTHONPATH")) if p),
+    }
+    for item in args.app_env:
+        key, _, value = item.partition("=")
+        env[key] = value
+
+    with open(os.path.join(workdir, "app.log"), "w") as log:
+        return subprocess.Popen(
+            [sys.executable, "-m", "src.main"], cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+
+
+def _stop_app(process: subprocess.Popen) -> None:
+    if process.poll() is None:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def _print_summary(summary: Dict[str, Any]) -> None:
+    latency = summary["latency_ms"]
+    print(
+        f"{summary['scenario']:<14} {summary['requests']:>7} req {summary['throughput_rps']:>9.2f} req/s "
+        f"err {summary['error_rate'] * 100:>5.1f}%  p50 {latency['p50'] or 0:>9.1f}ms  "
+        f"p95 {latency['p95'] or 0:>9.1f}ms  p99 {latency['p99'] or 0:>9.1f}ms"
+    )
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Offline load test of MyClanker against mock OpenAI and Vapi servers")
+    parser.add_argument("--scenarios", default="conversation,trigger,webhook",
+                        help="Comma separated scenarios to run in order: conversation, trigger, webhook")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight at once")
+    parser.add_argument("--requests", type=int, help="Requests per scenario, defaults to 200 without --duration")
+    parser.add_argument("--duration", type=float, help="Seconds per scenario, instead of a request count")
+    parser.add_argument("--warmup-requests", type=int, default=0, help="Requests per scenario excluded from results")
+    parser.add_argument("--unique-ratio", type=float, default=1.0,
+                        help="Share of distinct conversation requests, the rest repeat and can hit caches")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Seconds each request may take")
+    parser.add_argument("--chat-latency", type=LatencyModel.parse, default=LatencyModel("lognormal", (0.6, 0.4)))
+    parser.add_argument("--responses-latency", type=LatencyModel.parse, default=LatencyModel("lognormal", (3.0, 0.5)))
+    parser.add_argument("--vapi-latency", type=LatencyModel.parse, default=LatencyModel("lognormal", (0.3, 0.3)))
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of mock upstream requests that fail")
+    parser.add_argument("--error-statuses", default="500,503,429", help="Statuses of injected upstream failures")
+    parser.add_argument("--webhook-delay", type=LatencyModel.parse, default=LatencyModel("fixed", (1.0,)),
+                        help="Delay of each Vapi webhook callback after a call was created")
+    parser.add_argument("--no-webhooks", action="store_true", help="Do not send webhook callbacks for created calls")
+    parser.add_argument("--server-mode", default="gevent", choices=("gevent", "flask"))
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra environment of the app, repeatable")
+    parser.add_argument("--app-url", help="Benchmark an already running app instead of starting one")
+    parser.add_argument("--ready-timeout", type=float, default=60.0)
+    parser.add_argument("--output", help="Result file, defaults to bench/results/<timestamp>.json")
+    args = parser.parse_args(argv)
+    if args.requests is None and args.duration is None:
+        args.requests = 200
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    args = parse_args(argv)
+    # One access log line per mock request would drown the summary
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    scenarios = {
+        "conversation": conversation_scenario(args.unique_ratio),
+        "trigger": trigger_scenario(),
+        "webhook": webhook_scenario(),
+    }
+    selected = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in selected if s not in scenarios]
+    if unknown:
+        raise SystemExit(f"Unknown scenarios {unknown}, expected some of {sorted(scenarios)}")
+
+    def errors() -> ErrorModel:
+        return ErrorModel(args.error_rate, tuple(int(s) for s in args.error_statuses.split(",")))
+
+    openai_stats, vapi_stats = MockStats(), MockStats()
+    openai = BackgroundServer(create_openai_app(
+        chat_latency=args.chat_latency,
+        responses_latency=args.responses_latency,
+        errors=errors(),
+        stats=openai_stats
+    )).start()
+
+    app_process = None
+    workdir = tempfile.mkdtemp(prefix="clanker-bench-")
+    # The app's URL is needed for webhook callbacks before the app starts, so its port is chosen up front
+    app_port = None if args.app_url else _free_port()
+    base_url = args.app_url.rstrip("/") if args.app_url else f"http://127.0.0.1:{app_port}"
+    vapi = BackgroundServer(create_vapi_app(
+        latency=args.vapi_latency,
+        errors=errors(),
+        webhook_url=None if args.no_webhooks else f"{base_url}/webhooks/vapi",
+        webhook_delay=args.webhook_delay,
+        stats=vapi_stats
+    )).start()
+
+    results: Dict[str, Any] = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "config": {k: str(v) if isinstance(v, LatencyModel) else v for k, v in vars(args).items()},
+        "scenarios": {},
+    }
+    try:
+        if not args.app_url:
+            app_process = _start_app(args, app_port, openai.url, vapi.url, workdir)
+            print(f"Started app at {base_url}, logs in {os.path.join(workdir, 'app.log')}")
+        _wait_ready(base_url, args.ready_timeout, app_process)
+
+        for name in selected:
+            scenario = scenarios[name]
+            if args.warmup_requests:
+                run_load(base_url, scenario, args.concurrency, requests_total=args.warmup_requests,
+                         timeout=args.timeout)
+            result = run_load(
+                base_url,
+                scenario,
+                args.concurrency,
+                requests_total=args.requests,
+                duration_seconds=args.duration,
+                timeout=args.timeout
+            )
+            summary = result.summary()
+            results["scenarios"][name] = summary
+            _print_summary(summary)
+
+        try:
+            results["app_metrics"] = requests.get(f"{base_url}/metrics", timeout=10).text
+        except requests.RequestException:
+            results["app_metrics"] = None
+    finally:
+        if app_process is not None:
+            _stop_app(app_process)
+        openai.stop()
+        vapi.stop()
+
+    results["finished_at"] = datetime.now(timezone.utc).isoformat()
+    results["mocks"] = {"openai": openai_stats.to_dict(), "vapi": vapi_stats.to_dict()}
+
+    output = args.output or os.path.join(
+        ROOT, "bench", "results", f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import threading
+from collections import Counter
+from typing import Any, Dict
+from flask import Flask
+from werkzeug.serving import make_server
+
+
+class MockStats:
+    """
+    Thread-safe request counters of a mock server, keyed by endpoint and returned status
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__responses: Counter = Counter()
+        self.__events: Counter = Counter()
+
+    def record(self, endpoint: str, status: int) -> None:
+        with self.__lock:
+            self.__responses[f"{endpoint} {status}"] += 1
+
+    def event(self, name: str) -> None:
+        with self.__lock:
+            self.__events[name] += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self.__lock:
+            return {"responses": dict(sorted(self.__responses.items())), "events": dict(sorted(self.__events.items()))}
+
+
+class BackgroundServer:
+    """
+    Serves a WSGI app on a background thread, one thread per request so simulated latency does not serialize
+    requests. Port 0 picks a free port.
+    """
+
+    def __init__(self, app: Flask, host: str = "127.0.0.1", port: int = 0):
+        self.__server = make_server(host, port, app, threaded=True)
+        self.__thread = threading.Thread(target=self.__server.serve_forever, name=f"bench-{app.name}", daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.__server.host}:{self.__server.server_port}"
+
+    def start(self) -> "BackgroundServer":
+        self.__thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.__server.shutdown()
+        self.__thread.join(timeout=5)
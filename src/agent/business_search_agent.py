@@ -0,0 +1,161 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Iterator, List, Optional, Set, Tuple, Union
+from src.agent.agent import Agent
+from src.llm.service.llm_response_service import LlmResponseService
+from src.service.business_index import BusinessIndex
+from src.service.search_parser_service import BusinessDirectory, BusinessInfo, SearchParserService
+from src.service.search_service import SearchLocation, SearchService
+from src.util.env import Env
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BusinessSearchTask:
+    """
+    Phrasings of one request, the most promising first, and the locations to search them around; the agent's own
+    locations when there are none
+    """
+    queries: List[str]
+    locations: Optional[List[SearchLocation]] = None
+
+
+class BusinessSearchAgent(Agent):
+    """Agent that searches for businesses matching already composed search queries"""
+
+    DEFAULT_LOCATIONS = [SearchLocation(city="San Francisco", region="San Francisco Bay Area")]
+
+    # Index refreshes run off the request path, at most once per category and locations at a time
+    __refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="index-refresh")
+    __refreshing: Set[Tuple[str, Tuple[SearchLocation, ...]]] = set()
+    __refreshing_lock = Lock()
+
+    def __init__(
+        self,
+        cleaner_llm_response_service: Optional[LlmResponseService] = None,
+        locations: Optional[List[SearchLocation]] = None,
+        business_index: Optional[BusinessIndex] = None
+    ):
+        """
+        :param cleaner_llm_response_service: Service used to clean the search results, defaults to a background
+                                             priority OpenAI service
+        :param locations: Locations searched for tasks that do not name their own, defaults to San Francisco
+        :param business_index: Index consulted before searching, defaults to the process-wide BusinessIndex
+        """
+        env = Env()
+        self.__index = business_index if business_index is not None else BusinessIndex()
+        self.__search_service = SearchService(cleaner_llm_response_service, business_index=self.__index)
+        self.__locations = locations or self.DEFAULT_LOCATIONS
+        self.__max_age_seconds = float(env["BUSINESS_INDEX_MAX_AGE_SECONDS"] or 7 * 24 * 60 * 60)
+        self.__refresh_after_seconds = float(env["BUSINESS_INDEX_REFRESH_SECONDS"] or 24 * 60 * 60)
+        self.__min_results = int(env["BUSINESS_INDEX_MIN_RESULTS"] or 3)
+
+    def agent_type(self) -> str:
+        return "business_search_agent"
+
+    def execute(
+        self,
+        task: Union[BusinessSearchTask, str]
+    ) -> Any:
+        """
+        Serve the primary query's category from the business index when every location has enough fresh
+        businesses, refreshing it in the background once it ages; otherwise search every phrasing around every
+        location.
+
+        :param task: Queries and locations to search, or a single query searched around the agent's locations
+        """
+        queries, locations = self.__resolve(task)
+        indexed = self.__indexed(queries, locations)
+        if indexed is not None:
+            return indexed
+
+        res = self.__search_service.search_many(
+            queries=queries,
+            locations=locations
+        )
+
+        return res
+
+    def stream(self, task: Union[BusinessSearchTask, str]) -> Iterator[Tuple[str, BusinessInfo]]:
+        """
+        Streaming counterpart of execute: yields each business as soon as it is known. Index hits are yielded at
+        once; otherwise every location is searched for every phrasing in turn with SearchService.stream_search, so
+        the first businesses arrive while the web search is still writing the rest.
+
+        :return: (business name, business info) pairs, each name once, in arrival order
+        """
+        queries, locations = self.__resolve(task)
+        indexed = self.__indexed(queries, locations)
+        if indexed is not None:
+            yield from indexed.businesses.items()
+            return
+
+        seen: Set[str] = set()
+        for query in queries:
+            for location in locations:
+                for name, info in self.__search_service.stream_search(
+                        query,
+                        city=location.city,
+                        region=location.region,
+                        country=location.country
+                ):
+                    if name not in seen:
+                        seen.add(name)
+                        yield name, info
+
+    def __resolve(self, task: Union[BusinessSearchTask, str]) -> Tuple[List[str], List[SearchLocation]]:
+        """
+        Distinct queries and locations of a task, the agent's locations when it names none
+        """
+        if isinstance(task, str):
+            task = BusinessSearchTask(queries=[task])
+        queries = list(dict.fromkeys(q for q in task.queries if q and q.strip()))
+        if not queries:
+            raise ValueError("A business search needs at least one query")
+        return queries, list(dict.fromkeys(task.locations or self.__locations))
+
+    def __indexed(self, queries: List[str], locations: List[SearchLocation]) -> Optional[BusinessDirectory]:
+        """
+        The primary query's category from the business index when every location has enough fresh businesses,
+        refreshed in the background once it ages; None when the web search has to run
+        """
+        category = BusinessIndex.category(queries[0])
+        lookups = []
+        for location in locations:
+            lookup = self.__index.lookup(
+                category,
+                location.city,
+                location.region,
+                location.country,
+                max_age_seconds=self.__max_age_seconds,
+                min_results=self.__min_results
+            )
+            if lookup is None:
+                return None
+            lookups.append(lookup)
+
+        if max(lookup.age_seconds for lookup in lookups) > self.__refresh_after_seconds:
+            self.__refresh(category, queries, locations)
+        return SearchParserService().merge(lookup.directory for lookup in lookups)
+
+    def __refresh(self, category: str, queries: List[str], locations: List[SearchLocation]) -> None:
+        key = (category, tuple(locations))
+        with self.__refreshing_lock:
+            if key in self.__refreshing:
+                return
+            self.__refreshing.add(key)
+
+        def refresh() -> None:
+            try:
+                # Results land in the index through SearchService; a cached result would not refresh it
+                self.__search_service.search_many(queries=queries, locations=locations, refresh=True)
+            except Exception:
+                logger.warning("Could not refresh business index for %r", category, exc_info=True)
+            finally:
+                with self.__refreshing_lock:
+                    self.__refreshing.discard(key)
+
+        self.__refresher.submit(refresh)
@@ -1,14 +1,38 @@
-from typing import Any, List, Optional
+from typing import Any, Hashable, List, Optional, Iterator
 from src.agent.agent import Agent
+from src.llm.memory.context_window import ContextWindow
 from src.llm.service.llm_response_service import LlmResponseService
 from src.llm.models.llm_message import LlmMessage
+from src.util.metrics import span
 
 
 class ConversationAgent(Agent):
     """Agent that handles general conversation"""
 
-    def __init__(self, llm_response_service: LlmResponseService):
+    __ROLE = """
+        You are Clanker, a helpful AI assistant. You will always be the second agent after the user
+        requests a task. You just need to keep bringing the conversation back to the task at hand.
+        """
+
+    def __init__(
+            self,
+            llm_response_service: LlmResponseService,
+            context_token_budget: Optional[int] = None,
+            summary_llm_response_service: Optional[LlmResponseService] = None
+    ):
+        """
+        :param llm_response_service: Service used to generate replies
+        :param context_token_budget: Tokens of verbatim conversation history sent with each turn, older turns are
+                                     folded into a running summary. None sends the whole history.
+        :param summary_llm_response_service: Service used to write the running summaries off the request path,
+                                             ideally at background priority so they never delay a reply; defaults
+                                             to llm_response_service
+        """
         self.__llm_response_service = llm_response_service
+        self.__context_window = (
+            ContextWindow(summary_llm_response_service or llm_response_service, context_token_budget)
+            if context_token_budget else None
+        )
 
     def agent_type(self) -> str:
         return "conversation_agent"
@@ -16,24 +40,52 @@ class ConversationAgent(Agent):
     def execute(
             self,
             task: str,
-            conversation_history: Optional[List[LlmMessage]] = None
+            conversation_history: Optional[List[LlmMessage]] = None,
+            conversation_id: Optional[Hashable] = None
     ) -> str:
         """
         Execute the conversation task with optional conversation history
 
         :param task: The user's request/message
         :param conversation_history: Previous conversation messages for context
+        :param conversation_id: Identifies the conversation, required to fit the history into the token budget
         :return: The agent's response
         """
-        role = """
-        You are Clanker, a helpful AI assistant. You will always be the second agent after the user
-        requests a task. You just need to keep bringing the conversation back to the task at hand.
+        with span(f"agent.{self.agent_type()}"):
+            response = self.__llm_response_service.response(
+                role=self.__ROLE,
+                prompt=task,
+                conversation_history=self.__context(conversation_id, conversation_history)
+            )
+
+        return response
+
+    def stream(
+            self,
+            task: str,
+            conversation_history: Optional[List[LlmMessage]] = None,
+            conversation_id: Optional[Hashable] = None
+    ) -> Iterator[str]:
         """
+        Execute the conversation task, yielding the agent's response in chunks as it is generated
 
-        response = self.__llm_response_service.response(
-            role=role,
-            prompt=task,
-            conversation_history=conversation_history
-        )
+        :param task: The user's request/message
+        :param conversation_history: Previous conversation messages for context
+        :param conversation_id: Identifies the conversation, required to fit the history into the token budget
+        :return: Chunks of the agent's response, in order
+        """
+        with span(f"agent.{self.agent_type()}", stream=True):
+            yield from self.__llm_response_service.stream(
+                role=self.__ROLE,
+                prompt=task,
+                conversation_history=self.__context(conversation_id, conversation_history)
+            )
 
-        return response
+    def __context(
+            self,
+            conversation_id: Optional[Hashable],
+            conversation_history: Optional[List[LlmMessage]]
+    ) -> Optional[List[LlmMessage]]:
+        if self.__context_window is None or conversation_id is None or not conversation_history:
+            return conversation_history
+        return self.__context_window.fit(conversation_id, conversation_history)
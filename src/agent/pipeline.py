@@ -0,0 +1,210 @@
+import time
+import logging
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from src.agent.agent import Agent
+from src.util.deadline import DeadlineExceededError, RequestCancelledError, budget, check, current_deadline, submit
+from src.util.metrics import span
+
+logger = logging.getLogger(__name__)
+
+
+def _pass_input(task: Any, _: Dict[str, Any]) -> Any:
+    return task
+
+
+@dataclass
+class PipelineStep:
+    """
+    A single agent invocation in a pipeline.
+
+    ``task`` builds the agent's task from the pipeline input and the outputs of the steps listed in ``depends_on``
+    (keyed by step name); by default the pipeline input is passed through unchanged.
+
+    An ``optional`` step cannot fail the pipeline: its error is recorded and its output is None. Steps depending on
+    it still run, with None as its output.
+    """
+    name: str
+    agent: Agent
+    depends_on: Tuple[str, ...] = ()
+    task: Callable[[Any, Dict[str, Any]], Any] = _pass_input
+    optional: bool = False
+
+
+@dataclass
+class PipelineResult:
+    outputs: Dict[str, Any]
+    timings: Dict[str, float] = field(default_factory=dict)
+    total_seconds: float = 0.0
+    # Errors of optional steps that failed or did not finish in time, keyed by step name
+    errors: Dict[str, str] = field(default_factory=dict)
+
+
+class PipelineStepError(RuntimeError):
+    """
+    Raised when a step fails; the original exception is chained as __cause__
+    """
+
+    def __init__(self, step: str, cause: BaseException):
+        super().__init__(f"Pipeline step '{step}' failed: {cause}")
+        self.step = step
+
+
+class Pipeline:
+    """
+    Runs agents as a dependency graph: every step starts as soon as the steps it depends on are done, so
+    independent steps run concurrently and adding one to the graph does not add its latency end to end unless
+    something depends on it. Every step is timed.
+    """
+
+    def __init__(self, steps: List[PipelineStep], max_workers: Optional[int] = None):
+        """
+        :param steps: Steps of the pipeline, in any order
+        :param max_workers: Size of the pool shared by all concurrent runs of this pipeline, defaults to one worker
+                            per step
+        """
+        self.__steps = {s.name: s for s in steps}
+        if len(self.__steps) != len(steps):
+            raise ValueError("Pipeline step names must be unique")
+        for s in steps:
+            missing = [d for d in s.depends_on if d not in self.__steps]
+            if missing:
+                raise ValueError(f"Pipeline step '{s.name}' depends on unknown steps: {missing}")
+        self.__check_acyclic()
+
+        self.__executor = ThreadPoolExecutor(
+            max_workers=max_workers or len(steps),
+            thread_name_prefix="pipeline"
+        )
+
+    def step(self, name: str) -> PipelineStep:
+        return self.__steps[name]
+
+    def run(
+        self,
+        task: Any,
+        timeout: Optional[float] = None,
+        skip: Tuple[str, ...] = (),
+        on_output: Optional[Callable[[str, Any], None]] = None
+    ) -> PipelineResult:
+        """
+        Execute every step of the pipeline
+
+        :param task: Pipeline input, handed to each step's task builder
+        :param timeout: Maximum seconds for the whole pipeline, None waits indefinitely; capped by the remaining
+                        budget of the current request deadline
+        :param skip: Steps not to run, along with every step depending on them; e.g. a step the caller runs itself
+                     to stream its output
+        :param on_output: Called with the name and output of every step as soon as the step is done, before the
+                          rest of the pipeline finishes; runs on the thread calling run
+        :return: outputs and durations of every step, keyed by step name
+        :exception: PipelineStepError when a required step fails
+        :exception: TimeoutError when a required step does not finish in time, DeadlineExceededError when that is
+                    because the request deadline passed
+        :exception: RequestCancelledError when the request is cancelled while steps are running
+        """
+        with span("pipeline"):
+            started = time.monotonic()
+            request_deadline = current_deadline()
+            timeout = budget(timeout)
+            deadline = None if timeout is None else started + timeout
+            result = PipelineResult(outputs={})
+            running: Dict[Future, str] = {}
+            skipped = set(skip)
+            while True:
+                dependents = {n for n, s in self.__steps.items() if skipped.intersection(s.depends_on)} - skipped
+                if not dependents:
+                    break
+                skipped |= dependents
+            remaining = {n: s for n, s in self.__steps.items() if n not in skipped}
+
+            def record(name: str, output: Any, error: Optional[str] = None) -> None:
+                result.outputs[name] = output
+                if error is not None:
+                    result.errors[name] = error
+                if on_output is not None:
+                    on_output(name, output)
+
+            def submit_ready() -> None:
+                for name, s in list(remaining.items()):
+                    if all(d in result.outputs for d in s.depends_on):
+                        del remaining[name]
+                        deps = {d: result.outputs[d] for d in s.depends_on}
+                        # Steps run in a copy of this context, so they inherit the request deadline and trace
+                        running[submit(self.__executor, self.__run_step, s, task, deps)] = name
+
+            submit_ready()
+            try:
+                while running:
+                    wait_for = None if deadline is None else max(deadline - time.monotonic(), 0)
+                    waiting_on = set(running)
+                    if request_deadline is not None:
+                        waiting_on.add(request_deadline.cancelled_future)
+                    done, _ = wait(waiting_on, timeout=wait_for, return_when=FIRST_COMPLETED)
+                    if request_deadline is not None:
+                        done.discard(request_deadline.cancelled_future)
+                        request_deadline.check()
+                    if not done:
+                        if any(not self.__steps[name].optional for name in running.values()):
+                            raise TimeoutError(
+                                f"Pipeline did not finish within {timeout}s, waiting on {sorted(running.values())}"
+                            )
+                        for future, name in running.items():
+                            future.cancel()
+                            record(name, None, f"did not finish within {timeout}s")
+                        running.clear()
+                        submit_ready()
+                        continue
+
+                    for future in done:
+                        name = running.pop(future)
+                        try:
+                            output, result.timings[name] = future.result()
+                        except (DeadlineExceededError, RequestCancelledError):
+                            raise
+                        except Exception as e:
+                            if not self.__steps[name].optional:
+                                raise PipelineStepError(name, e) from e
+                            logger.warning("Optional pipeline step '%s' failed: %s", name, e)
+                            record(name, None, str(e))
+                        else:
+                            record(name, output)
+                    submit_ready()
+            finally:
+                for future in running:
+                    future.cancel()
+
+            result.total_seconds = time.monotonic() - started
+            logger.debug(
+                "Pipeline finished in %.3fs: %s",
+                result.total_seconds,
+                ", ".join(f"{n}={t:.3f}s" for n, t in result.timings.items())
+            )
+            return result
+
+    @staticmethod
+    def __run_step(s: PipelineStep, task: Any, deps: Dict[str, Any]) -> Tuple[Any, float]:
+        started = time.monotonic()
+        # A step that waited in the pool past its request's deadline is not worth starting
+        check()
+        with span(f"agent.{s.agent.agent_type()}", step=s.name):
+            output = s.agent.execute(s.task(task, deps))
+        return output, time.monotonic() - started
+
+    def __check_acyclic(self) -> None:
+        visiting, visited = set(), set()
+
+        def visit(name: str) -> None:
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"Pipeline has a dependency cycle through step '{name}'")
+            visiting.add(name)
+            for d in self.__steps[name].depends_on:
+                visit(d)
+            visiting.discard(name)
+            visited.add(name)
+
+        for name in self.__steps:
+            visit(name)
@@ -0,0 +1,45 @@
+import re
+from typing import Any, List, Optional
+from src.agent.agent import Agent
+from src.llm.service.llm_response_service import LlmResponseService
+from src.llm.template.llm_template import LlmTemplate
+from src.util.env import Env
+
+
+class SearchQueryAgent(Agent):
+    """Agent that rewrites a user task into web search queries, one per phrasing of the task"""
+
+    # "1. ", "- ", "Query: " and quotes the model adds despite being told not to
+    _DECORATION = re.compile(r"^\s*(?:\d+[.)]\s*|[-*•]\s*|query:\s*)*[\"'“”]?|[\"'“”]?\s*$", re.IGNORECASE)
+
+    def __init__(self, llm_response_service: LlmResponseService, max_queries: Optional[int] = None):
+        """
+        :param max_queries: Most phrasings searched for one task, defaults to SEARCH_QUERY_PHRASINGS or 2
+        """
+        self.__llm_response_service = llm_response_service
+        self.__max_queries = max_queries or int(Env()["SEARCH_QUERY_PHRASINGS"] or 2)
+
+    def agent_type(self) -> str:
+        return "search_query_agent"
+
+    def execute(
+        self,
+        task
+    ) -> Any:
+        """
+        :return: distinct search queries, the most promising first
+        :exception: ValueError when the model returned no query
+        """
+        response = self.__llm_response_service.response(
+            role="You are a search agent that receives a user task and then generates a search query from it",
+            prompt=LlmTemplate.web_search_query(task, self.__max_queries),
+        )
+
+        queries: List[str] = []
+        for line in str(response).splitlines():
+            query = self._DECORATION.sub("", line).strip()
+            if query and query.lower() not in (q.lower() for q in queries):
+                queries.append(query)
+        if not queries:
+            raise ValueError("No search query was composed for the task")
+        return queries[:self.__max_queries]
@@ -0,0 +1,157 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+from src.llm.models.llm_message import LlmMessage
+from src.llm.service.llm_response_service import LlmResponseService
+from src.llm.template.llm_template import LlmTemplate
+from src.util.tokens import estimate_message_tokens
+from src.util.ttl_lru_cache import TtlLruCache
+
+logger = logging.getLogger(__name__)
+
+
+class ContextWindow:
+    """
+    Token-budgeted view over a conversation history.
+
+    The most recent messages that fit in ``token_budget`` are passed through verbatim. Older messages are folded
+    into a single summary message, kept per conversation and refreshed incrementally in the background: each refresh
+    only summarizes the messages that fell out of the window since the previous one. Callers never wait on a
+    summary; messages not covered by one yet stay in the view verbatim until a refresh lands, so nothing is lost
+    while the view briefly runs over budget.
+
+    What a summary covers is recorded by the last messages it folded, not by their position, so it still lines up
+    when the store drops the oldest messages of a long conversation.
+    """
+
+    # Messages fingerprinted to find the end of a summary's coverage in a later history
+    __ANCHOR_MESSAGES = 3
+
+    # Summaries are background work, a small shared pool keeps them from competing with user-facing calls
+    __executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="context-summary")
+
+    def __init__(
+            self,
+            llm_response_service: LlmResponseService,
+            token_budget: int,
+            summary_tokens: Optional[int] = None,
+            max_conversations: int = 4096,
+            summary_ttl_seconds: float = 24 * 60 * 60
+    ):
+        """
+        :param llm_response_service: Service used to write the summaries
+        :param token_budget: Tokens of verbatim history kept in the view
+        :param summary_tokens: Target size of the summary message, defaults to a quarter of token_budget
+        :param max_conversations: Number of conversation summaries kept before the least recently used is dropped
+        :param summary_ttl_seconds: How long an untouched summary is kept
+        """
+        if token_budget < 1:
+            raise ValueError("token_budget must be at least 1")
+
+        self.__llm_response_service = llm_response_service
+        self.__token_budget = token_budget
+        self.__summary_tokens = summary_tokens or max(token_budget // 4, 64)
+        # conversation_id -> (fingerprint of the last messages covered by the summary, summary text)
+        self.__summaries = TtlLruCache(max_entries=max_conversations, ttl_seconds=summary_ttl_seconds)
+        self.__lock = Lock()
+        self.__refreshing: Set[Hashable] = set()
+
+    @property
+    def token_budget(self) -> int:
+        return self.__token_budget
+
+    def fit(self, conversation_id: Hashable, messages: List[LlmMessage]) -> List[LlmMessage]:
+        """
+        Returns the view of the conversation history that fits the token budget
+
+        :param conversation_id: Identifies the conversation the summary belongs to
+        :param messages: Full conversation history, oldest first
+        :return: summary message (if any older turns were folded) followed by the most recent messages
+        """
+        split = self.__split(messages)
+        if split == 0:
+            return list(messages)
+
+        anchor, summary = self.__summaries.get(conversation_id, (None, None))
+        covered = self.__covered(messages, anchor)
+        if covered < split:
+            self.__refresh(conversation_id, messages[covered:split], self.__anchor(messages[:split]), summary)
+
+        view = list(messages[min(covered, split):])
+        if summary:
+            view.insert(0, LlmMessage(role="system", content=f"Summary of the earlier conversation:\n{summary}"))
+        return view
+
+    def __split(self, messages: List[LlmMessage]) -> int:
+        """
+        Index of the oldest message kept verbatim. The latest message is always kept, even if it alone is over budget.
+        """
+        used = 0
+        for i in range(len(messages) - 1, -1, -1):
+            used += estimate_message_tokens(messages[i])
+            if used > self.__token_budget and i < len(messages) - 1:
+                return i + 1
+        return 0
+
+    @classmethod
+    def __anchor(cls, covered: List[LlmMessage]) -> Tuple[int, ...]:
+        return tuple(hash((m.role, m.content)) for m in covered[-cls.__ANCHOR_MESSAGES:])
+
+    @classmethod
+    def __covered(cls, messages: List[LlmMessage], anchor: Optional[Tuple[int, ...]]) -> int:
+        """
+        Number of leading messages covered by the summary with the given anchor: everything up to the latest place
+        the anchor matches. 0 when it does not match, i.e. every covered message was already dropped from history.
+        """
+        if not anchor:
+            return 0
+        for end in range(len(messages), len(anchor) - 1, -1):
+            if cls.__anchor(messages[end - len(anchor):end]) == anchor:
+                return end
+        return 0
+
+    def __refresh(
+            self,
+            conversation_id: Hashable,
+            folded: List[LlmMessage],
+            anchor: Tuple[int, ...],
+            summary: Optional[str]
+    ) -> None:
+        with self.__lock:
+            if conversation_id in self.__refreshing:
+                return
+            self.__refreshing.add(conversation_id)
+
+        self.__executor.submit(self.__summarize, conversation_id, list(folded), anchor, summary)
+
+    def __summarize(
+            self,
+            conversation_id: Hashable,
+            folded: List[LlmMessage],
+            anchor: Tuple[int, ...],
+            summary: Optional[str]
+    ) -> None:
+        try:
+            transcript = "\n".join(f"{m.role}: {m.content}" for m in folded)
+            updated = self.__llm_response_service.response(
+                role="You are a summarization agent that compresses conversation history without losing facts",
+                prompt=LlmTemplate.conversation_summary(
+                    summary,
+                    transcript,
+                    max_words=self.__summary_tokens * 3 // 4  # ~0.75 words per token
+                ),
+            )
+            with self.__lock:
+                # One refresh runs per conversation at a time, so this always extends the summary it started from
+                self.__summaries.set(conversation_id, (anchor, updated.strip()))
+        except Exception:
+            logger.warning("Could not refresh summary for conversation %s", conversation_id, exc_info=True)
+        finally:
+            with self.__lock:
+                self.__refreshing.discard(conversation_id)
+
+    def stats(self) -> Dict[str, int]:
+        with self.__lock:
+            refreshing = len(self.__refreshing)
+        return {**self.__summaries.stats(), "refreshing": refreshing}
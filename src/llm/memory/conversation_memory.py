@@ -1,31 +1,70 @@
 import uuid
-from typing import List, Dict
-from threading import RLock
-from collections import defaultdict
+from typing import Any, Dict, List, Optional, Union
+from src.llm.memory.conversation_store import ConversationStore
+from src.llm.memory.in_memory_conversation_store import InMemoryConversationStore
+from src.llm.memory.sqlite_conversation_store import SqliteConversationStore
 from src.llm.models.llm_message import LlmMessage
+from src.util.env import Env
 from src.util.singleton import singleton
 
+_STORES = {
+    "memory": InMemoryConversationStore,
+    "sqlite": SqliteConversationStore,
+}
+
 
 @singleton
 class ConversationMemory:
     """
     Thread-safe class responsible for managing conversation history between the user and LLM.
+
+    History is kept by a pluggable ConversationStore chosen with CONVERSATION_STORE: "memory" (default) keeps it in
+    this process, "sqlite" keeps it in a database file shared by every worker process on the host.
     """
 
-    def __init__(self):
-        self.__lock = RLock()
-        self.__store: Dict[uuid.UUID, List[LlmMessage]] = defaultdict(list)
+    def __init__(self, store: Optional[ConversationStore] = None):
+        """
+        :param store: Storage backend, defaults to the one selected by CONVERSATION_STORE
+        """
+        if store is None:
+            name = (Env()["CONVERSATION_STORE"] or "memory").lower()
+            if name not in _STORES:
+                raise ValueError(f"Unknown CONVERSATION_STORE '{name}', expected one of {sorted(_STORES)}")
+            store = _STORES[name]()
+        self.__store = store
+
+    @staticmethod
+    def _key(conversation_id: Union[uuid.UUID, str]) -> str:
+        # IDs arrive as UUIDs from POST and as strings from PATCH bodies, both must address the same conversation
+        return str(conversation_id).lower()
+
+    @property
+    def store(self) -> ConversationStore:
+        return self.__store
 
     def history(self, conversation_id: uuid.UUID) -> List[LlmMessage]:
         """
-        Returns a copy of the conversation history for the given conversation_id.
+        Returns a copy of the conversation history for the given conversation_id, empty for unknown or expired ones.
         """
-        with self.__lock:
-            return self.__store[conversation_id].copy()
+        return self.__store.history(self._key(conversation_id))
 
     def add(self, conversation_id: uuid.UUID, message: LlmMessage) -> None:
         """
         Adds a new message to the conversation history for the given conversation_id.
         """
-        with self.__lock:
-            self.__store[conversation_id].append(message)
+        self.__store.add(self._key(conversation_id), message)
+
+    def snapshot(self) -> Optional[Dict[str, Any]]:
+        """
+        State of the store for SnapshotManager, None for stores that persist on their own
+        """
+        snapshot = getattr(self.__store, "snapshot", None)
+        return snapshot() if snapshot else None
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        restore = getattr(self.__store, "restore", None)
+        if restore:
+            restore(state)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.__store.stats()
@@ -0,0 +1,34 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List
+from src.llm.models.llm_message import LlmMessage
+
+
+class ConversationStore(ABC):
+    """
+    Storage backend of ConversationMemory. Conversation IDs are already normalized to strings by the caller.
+    """
+
+    @abstractmethod
+    def history(self, conversation_id: str) -> List[LlmMessage]:
+        """
+        Messages of a conversation, oldest first
+
+        :param conversation_id: Normalized conversation ID
+        :return: the conversation's messages, empty for unknown or expired conversations; reading an unknown
+                 conversation must not create it
+        """
+        pass
+
+    @abstractmethod
+    def add(self, conversation_id: str, message: LlmMessage) -> None:
+        """
+        Appends a message to a conversation, creating the conversation if needed
+
+        :param conversation_id: Normalized conversation ID
+        :param message: Message to append
+        """
+        pass
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        pass
@@ -0,0 +1,307 @@
+import json
+import logging
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+from src.llm.memory.conversation_store import ConversationStore
+from src.llm.models.llm_message import LlmMessage
+from src.util.blocking import run_blocking
+from src.util.env import Env
+
+logger = logging.getLogger(__name__)
+
+
+def freeze(messages: List[LlmMessage]) -> Tuple[bytes, int]:
+    """
+    Serializes and compresses messages
+
+    :return: compressed blob and the size of the uncompressed serialization in bytes
+    """
+    raw = json.dumps([[m.role, m.content] for m in messages], separators=(",", ":")).encode()
+    return zlib.compress(raw, 6), len(raw)
+
+
+def thaw(blob: bytes) -> List[LlmMessage]:
+    return [LlmMessage(role=role, content=content) for role, content in json.loads(zlib.decompress(blob))]
+
+
+def _freeze_entries(entries: List[Tuple[str, Any, int, float]]) -> List[Tuple[str, bytes, int, int, float]]:
+    """
+    Snapshot entries with the messages of hot conversations compressed, cold ones keep their blob and raw size
+    """
+    return [
+        (conversation_id, *(frozen if isinstance(frozen, tuple) else freeze(frozen)), size, idle)
+        for conversation_id, frozen, size, idle in entries
+    ]
+
+
+@dataclass
+class _Conversation:
+    # Exactly one of messages (hot) and blob (cold) is set
+    messages: Optional[List[LlmMessage]] = field(default_factory=list)
+    blob: Optional[bytes] = None
+    raw_size: int = 0
+    size: int = 0
+    accessed_at: float = field(default_factory=time.monotonic)
+
+    def rehydrate(self) -> List[LlmMessage]:
+        if self.messages is None:
+            self.messages, self.blob, self.raw_size = thaw(self.blob), None, 0
+        return self.messages
+
+
+class _Shard:
+    """
+    One lock stripe: its conversations ordered from least to most recently used, and the hot ones among them in the
+    same order so idle hot conversations can be found without scanning the cold ones
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.conversations: "OrderedDict[str, _Conversation]" = OrderedDict()
+        self.hot: "OrderedDict[str, None]" = OrderedDict()
+        self.cold_bytes = 0
+        self.cold_raw_bytes = 0
+
+    def touch(self, conversation_id: str, conversation: _Conversation, now: float) -> None:
+        if conversation.blob is not None:
+            self.cold_bytes -= len(conversation.blob)
+            self.cold_raw_bytes -= conversation.raw_size
+            conversation.rehydrate()
+        conversation.accessed_at = now
+        self.conversations.move_to_end(conversation_id)
+        self.hot[conversation_id] = None
+        self.hot.move_to_end(conversation_id)
+
+    def pop(self, conversation_id: str) -> None:
+        conversation = self.conversations.pop(conversation_id)
+        self.hot.pop(conversation_id, None)
+        if conversation.blob is not None:
+            self.cold_bytes -= len(conversation.blob)
+            self.cold_raw_bytes -= conversation.raw_size
+
+
+class InMemoryConversationStore(ConversationStore):
+    """
+    Process-local conversation store, the default backend of ConversationMemory.
+
+    Conversations are spread over lock-striped shards so concurrent requests for different conversations rarely
+    contend. Memory is bounded: a conversation idle for longer than CONVERSATION_TTL_SECONDS is dropped, the least
+    recently used conversations are evicted beyond CONVERSATION_MAX_CONVERSATIONS (enforced per shard), and only the
+    latest CONVERSATION_MAX_MESSAGES messages of a conversation are kept.
+
+    Conversations idle for longer than CONVERSATION_COLD_AFTER_SECONDS move to a cold tier as a zlib-compressed blob
+    and are decompressed again on their next read or write. Requests move them a few at a time in the shard they touch,
+    and a background thread sweeps every shard each CONVERSATION_FREEZE_INTERVAL_SECONDS.
+    """
+
+    # Upper bound on the conversations compressed by a single call, keeps the latency it adds to a request small
+    __MAX_FREEZES_PER_CALL = 8
+
+    def __init__(self):
+        env = Env()
+        self.__ttl_seconds = float(env["CONVERSATION_TTL_SECONDS"] or 24 * 60 * 60)
+        self.__cold_after_seconds = float(env["CONVERSATION_COLD_AFTER_SECONDS"] or 15 * 60)
+        self.__max_conversations = int(env["CONVERSATION_MAX_CONVERSATIONS"] or 10_000)
+        self.__max_messages = int(env["CONVERSATION_MAX_MESSAGES"] or 200)
+        shards = int(env["CONVERSATION_MEMORY_SHARDS"] or 16)
+
+        self.__shards = [_Shard() for _ in range(shards)]
+        self.__max_per_shard = max(-(-self.__max_conversations // shards), 1)
+        self.__stats_lock = Lock()
+        self.__expired = 0
+        self.__evicted = 0
+        self.__truncated = 0
+        self.__frozen = 0
+        self.__thawed = 0
+
+        self.__freeze_interval_seconds = float(env["CONVERSATION_FREEZE_INTERVAL_SECONDS"] or 60)
+        if self.__freeze_interval_seconds > 0:
+            threading.Thread(target=self.__freeze_periodically, name="conversation-freezer", daemon=True).start()
+
+    def __shard(self, conversation_id: str) -> _Shard:
+        return self.__shards[hash(conversation_id) % len(self.__shards)]
+
+    def history(self, conversation_id: str) -> List[LlmMessage]:
+        shard = self.__shard(conversation_id)
+        now = time.monotonic()
+        with shard.lock:
+            conversation = shard.conversations.get(conversation_id)
+            if conversation is None:
+                return []
+            if now - conversation.accessed_at > self.__ttl_seconds:
+                shard.pop(conversation_id)
+                self.__count(expired=1)
+                return []
+            thawed = int(conversation.blob is not None)
+            shard.touch(conversation_id, conversation, now)
+            messages = conversation.messages.copy()
+            frozen = self.__freeze_idle(shard, now)
+        self.__count(frozen=frozen, thawed=thawed)
+        return messages
+
+    def add(self, conversation_id: str, message: LlmMessage) -> None:
+        shard = self.__shard(conversation_id)
+        now = time.monotonic()
+        with shard.lock:
+            conversation = shard.conversations.get(conversation_id)
+            restarted = int(conversation is not None and now - conversation.accessed_at > self.__ttl_seconds)
+            if restarted:
+                shard.pop(conversation_id)
+            if conversation is None or restarted:
+                conversation = shard.conversations[conversation_id] = _Conversation()
+            thawed = int(conversation.blob is not None)
+            shard.touch(conversation_id, conversation, now)
+            conversation.messages.append(message)
+
+            truncated = max(len(conversation.messages) - self.__max_messages, 0)
+            if truncated:
+                del conversation.messages[:truncated]
+            conversation.size = len(conversation.messages)
+            expired, evicted = self.__evict(shard, now)
+            frozen = self.__freeze_idle(shard, now)
+        self.__count(
+            expired=expired + restarted, evicted=evicted, truncated=truncated, frozen=frozen, thawed=thawed
+        )
+
+    def __evict(self, shard: _Shard, now: float) -> Tuple[int, int]:
+        """
+        Drops expired conversations, then the least recently used ones beyond the shard's share of the size cap.
+        Conversations are kept in access order, so both only ever look at the front of the shard.
+        """
+        expired = evicted = 0
+        conversations = shard.conversations
+        while conversations:
+            conversation_id, oldest = next(iter(conversations.items()))
+            if now - oldest.accessed_at <= self.__ttl_seconds:
+                break
+            shard.pop(conversation_id)
+            expired += 1
+        while len(conversations) > self.__max_per_shard:
+            shard.pop(next(iter(conversations)))
+            evicted += 1
+        return expired, evicted
+
+    def freeze_idle(self) -> int:
+        """
+        Moves every conversation idle past the cold threshold to the cold tier. Requests already do this a few
+        conversations at a time for the shard they touch; this catches up shards that see no traffic.
+
+        :return: number of conversations compressed
+        """
+        frozen = 0
+        for shard in self.__shards:
+            with shard.lock:
+                frozen += self.__freeze_idle(shard, time.monotonic(), limit=None)
+        self.__count(frozen=frozen)
+        return frozen
+
+    def __freeze_periodically(self) -> None:
+        while True:
+            time.sleep(self.__freeze_interval_seconds)
+            try:
+                self.freeze_idle()
+            except Exception:
+                logger.exception("Failed to move idle conversations to the cold tier")
+
+    def __freeze_idle(self, shard: _Shard, now: float, limit: Optional[int] = __MAX_FREEZES_PER_CALL) -> int:
+        """
+        Compresses the hot conversations of a shard that have been idle past the cold threshold, oldest first
+        """
+        frozen = 0
+        while shard.hot and (limit is None or frozen < limit):
+            conversation_id = next(iter(shard.hot))
+            conversation = shard.conversations[conversation_id]
+            if now - conversation.accessed_at <= self.__cold_after_seconds:
+                break
+            del shard.hot[conversation_id]
+            conversation.blob, conversation.raw_size = freeze(conversation.messages)
+            conversation.messages = None
+            shard.cold_bytes += len(conversation.blob)
+            shard.cold_raw_bytes += conversation.raw_size
+            frozen += 1
+        return frozen
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Every conversation as a compressed blob, with how long it has been idle, least recently used first per shard
+        """
+        now = time.monotonic()
+        entries = []
+        for shard in self.__shards:
+            with shard.lock:
+                for conversation_id, c in shard.conversations.items():
+                    # Hot conversations are compressed after the locks are released
+                    frozen = (c.blob, c.raw_size) if c.blob is not None else c.messages.copy()
+                    entries.append((conversation_id, frozen, c.size, now - c.accessed_at))
+        return {"saved_at": time.time(), "conversations": run_blocking(_freeze_entries, entries)}
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        """
+        Loads conversations from a snapshot into the cold tier, so they are only decompressed when used again.
+        The time since the snapshot was taken counts as idle time.
+        """
+        elapsed = max(time.time() - state["saved_at"], 0)
+        now = time.monotonic()
+        expired = evicted = 0
+        # Oldest first, so every shard stays in access order
+        for conversation_id, blob, raw_size, size, idle in sorted(state["conversations"], key=lambda e: -e[4]):
+            idle += elapsed
+            shard = self.__shard(conversation_id)
+            with shard.lock:
+                if idle > self.__ttl_seconds:
+                    expired += 1
+                    continue
+                if conversation_id in shard.conversations:
+                    continue
+                shard.conversations[conversation_id] = _Conversation(
+                    messages=None, blob=blob, raw_size=raw_size, size=size, accessed_at=now - idle
+                )
+                shard.cold_bytes += len(blob)
+                shard.cold_raw_bytes += raw_size
+                while len(shard.conversations) > self.__max_per_shard:
+                    shard.pop(next(iter(shard.conversations)))
+                    evicted += 1
+        self.__count(expired=expired, evicted=evicted)
+
+    def __count(
+        self, expired: int = 0, evicted: int = 0, truncated: int = 0, frozen: int = 0, thawed: int = 0
+    ) -> None:
+        if expired or evicted or truncated or frozen or thawed:
+            with self.__stats_lock:
+                self.__expired += expired
+                self.__evicted += evicted
+                self.__truncated += truncated
+                self.__frozen += frozen
+                self.__thawed += thawed
+
+    def stats(self) -> Dict[str, Any]:
+        conversations = hot = messages = cold_bytes = cold_raw_bytes = 0
+        for shard in self.__shards:
+            with shard.lock:
+                conversations += len(shard.conversations)
+                hot += len(shard.hot)
+                messages += sum(c.size for c in shard.conversations.values())
+                cold_bytes += shard.cold_bytes
+                cold_raw_bytes += shard.cold_raw_bytes
+        with self.__stats_lock:
+            return {
+                "store": "memory",
+                "conversations": conversations,
+                "hot": hot,
+                "cold": conversations - hot,
+                "messages": messages,
+                "cold_bytes": cold_bytes,
+                "cold_compression_ratio": cold_raw_bytes / cold_bytes if cold_bytes else 0.0,
+                "max_conversations": self.__max_conversations,
+                "shards": len(self.__shards),
+                "expired": self.__expired,
+                "evicted": self.__evicted,
+                "truncated_messages": self.__truncated,
+                "frozen": self.__frozen,
+                "thawed": self.__thawed,
+            }
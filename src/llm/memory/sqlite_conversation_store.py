@@ -0,0 +1,260 @@
+import atexit
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from os import makedirs, path
+from typing import Any, Dict, List, Tuple
+from src.llm.memory.conversation_store import ConversationStore
+from src.llm.models.llm_message import LlmMessage
+from src.util.blocking import run_blocking
+from src.util.deadline import budget
+from src.util.env import Env
+
+logger = logging.getLogger(__name__)
+
+
+class SqliteConversationStore(ConversationStore):
+    """
+    Conversation store in a SQLite database in WAL mode, shared by every worker process on a host so a PATCH can
+    land on a different process than the POST that started the conversation.
+
+    Messages are append-only rows indexed by conversation. Writes are group-committed: a single writer thread
+    drains every message queued while the previous transaction ran into the next one, so concurrent requests share
+    one fsync. add() returns once its message is committed, which keeps reads on any process consistent with it.
+    Under gevent the transactions themselves run on the hub's threadpool, their fsyncs would stall every request of
+    the process otherwise.
+
+    A conversation expires CONVERSATION_TTL_SECONDS after its last message, and only its latest
+    CONVERSATION_MAX_MESSAGES messages are read back.
+    """
+
+    __MAX_BATCH = 512
+    __SWEEP_INTERVAL_SECONDS = 60.0
+    # Longest add() waits for its commit; matches the time a writer waits on the database lock
+    __COMMIT_TIMEOUT_SECONDS = 30.0
+
+    def __init__(self):
+        env = Env()
+        self.__ttl_seconds = float(env["CONVERSATION_TTL_SECONDS"] or 24 * 60 * 60)
+        self.__max_messages = int(env["CONVERSATION_MAX_MESSAGES"] or 200)
+        self.__path = env["CONVERSATION_STORE_PATH"] or path.join(
+            path.dirname(path.realpath(__file__)), "../../..", ".cache", "conversations.sqlite3"
+        )
+        if self.__path == ":memory:":
+            raise ValueError("SqliteConversationStore needs a database file, it is shared between processes")
+        makedirs(path.dirname(path.abspath(self.__path)), exist_ok=True)
+
+        self.__pending: List[Tuple[str, LlmMessage, Future]] = []
+        self.__condition = threading.Condition()
+        self.__closed = False
+        self.__batches = 0
+        self.__written = 0
+        self.__expired = 0
+
+        # Two connections for the whole process: one used by the writer only, one shared by all reads. Connections
+        # per thread would be one per request under gevent, where every request is a greenlet
+        self.__write_db = self.__connect()
+        self.__read_db = self.__connect()
+        self.__read_lock = threading.Lock()
+
+        db = self.__write_db
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                conversation_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        db.execute("CREATE INDEX IF NOT EXISTS messages_conversation_id ON messages (conversation_id, id)")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS conversations (
+                conversation_id TEXT PRIMARY KEY,
+                updated_at REAL NOT NULL
+            )
+        """)
+        db.execute("CREATE INDEX IF NOT EXISTS conversations_updated_at ON conversations (updated_at)")
+
+        self.__writer = threading.Thread(target=self.__write_loop, name="conversation-store-writer", daemon=True)
+        self.__writer.start()
+        atexit.register(self.close)
+
+    def __connect(self) -> sqlite3.Connection:
+        """
+        A new connection; WAL lets reads run alongside the writer
+        """
+        # Statements run on gevent's threadpool when serving with gevent, see run_blocking
+        db = sqlite3.connect(self.__path, isolation_level=None, timeout=30, check_same_thread=False)
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def __read(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+        with self.__read_lock:
+            return run_blocking(lambda: self.__read_db.execute(sql, params).fetchall())
+
+    def close(self, timeout: float = 5.0) -> None:
+        """
+        Commits the messages already queued, stops the writer and closes both connections. Runs at interpreter
+        exit; add() must not be called afterwards.
+
+        :param timeout: Seconds to wait for the writer to finish
+        """
+        with self.__condition:
+            if self.__closed:
+                return
+            self.__closed = True
+            self.__condition.notify()
+        self.__writer.join(timeout)
+        with self.__read_lock:
+            self.__read_db.close()
+
+    def history(self, conversation_id: str) -> List[LlmMessage]:
+        rows = self.__read(
+            """
+            SELECT role, content FROM (
+                SELECT m.id, m.role, m.content FROM messages m
+                JOIN conversations c ON c.conversation_id = m.conversation_id
+                WHERE m.conversation_id = ? AND c.updated_at >= ?
+                ORDER BY m.id DESC LIMIT ?
+            ) ORDER BY id
+            """,
+            (conversation_id, time.time() - self.__ttl_seconds, self.__max_messages)
+        )
+        return [LlmMessage(role=role, content=content) for role, content in rows]
+
+    def add(self, conversation_id: str, message: LlmMessage) -> None:
+        """
+        :exception: TimeoutError when the message is not committed within 30 seconds or the request deadline
+        """
+        committed: Future = Future()
+        with self.__condition:
+            self.__pending.append((conversation_id, message, committed))
+            self.__condition.notify()
+        try:
+            committed.result(timeout=budget(self.__COMMIT_TIMEOUT_SECONDS))
+        except FutureTimeoutError:
+            raise TimeoutError(f"Message of conversation {conversation_id} was not committed in time") from None
+
+    def __write_loop(self) -> None:
+        db = self.__write_db
+        swept_at = 0.0
+        while True:
+            batch: List[Tuple[str, LlmMessage, Future]] = []
+            try:
+                with self.__condition:
+                    while not self.__pending and not self.__closed:
+                        self.__condition.wait(timeout=self.__SWEEP_INTERVAL_SECONDS)
+                        if not self.__pending and time.monotonic() - swept_at >= self.__SWEEP_INTERVAL_SECONDS:
+                            break
+                    if self.__closed and not self.__pending:
+                        break
+                    batch = self.__pending[:self.__MAX_BATCH]
+                    del self.__pending[:len(batch)]
+
+                if time.monotonic() - swept_at >= self.__SWEEP_INTERVAL_SECONDS:
+                    swept_at = time.monotonic()
+                    self.__sweep(db)
+                if batch:
+                    self.__commit(db, batch)
+            except Exception as e:
+                # The writer must outlive any failure, every later add() would wait on it otherwise
+                logger.exception("Conversation store writer failed")
+                for _, _, committed in batch:
+                    if not committed.done():
+                        committed.set_exception(e)
+        db.close()
+
+    def __commit(self, db: sqlite3.Connection, batch: List[Tuple[str, LlmMessage, Future]]) -> None:
+        try:
+            run_blocking(self.__insert, db, [(conversation_id, m) for conversation_id, m, _ in batch])
+        except Exception as e:
+            for _, _, committed in batch:
+                committed.set_exception(e)
+            return
+
+        self.__batches += 1
+        self.__written += len(batch)
+        for _, _, committed in batch:
+            committed.set_result(None)
+
+    def __insert(self, db: sqlite3.Connection, messages: List[Tuple[str, LlmMessage]]) -> None:
+        """
+        Appends messages and touches their conversations in one transaction, rolled back when it fails
+        """
+        now = time.time()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            db.executemany(
+                "INSERT INTO messages (conversation_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                [(conversation_id, m.role, m.content, now) for conversation_id, m in messages]
+            )
+            db.executemany(
+                """
+                INSERT INTO conversations (conversation_id, updated_at) VALUES (?, ?)
+                ON CONFLICT (conversation_id) DO UPDATE SET updated_at = excluded.updated_at
+                """,
+                [(conversation_id, now) for conversation_id in {c for c, _ in messages}]
+            )
+            db.execute("COMMIT")
+        except Exception:
+            self.__rollback(db)
+            raise
+
+    def __sweep(self, db: sqlite3.Connection) -> None:
+        try:
+            self.__expired += run_blocking(self.__delete_expired, db)
+        except Exception:
+            logger.exception("Failed to sweep expired conversations")
+
+    def __delete_expired(self, db: sqlite3.Connection) -> int:
+        """
+        Deletes conversations whose last message is older than the TTL, rolled back when it fails
+
+        :return: number of conversations deleted
+        """
+        oldest = time.time() - self.__ttl_seconds
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute(
+                """
+                DELETE FROM messages WHERE conversation_id IN (
+                    SELECT conversation_id FROM conversations WHERE updated_at < ?
+                )
+                """,
+                (oldest,)
+            )
+            expired = db.execute("DELETE FROM conversations WHERE updated_at < ?", (oldest,)).rowcount
+            db.execute("COMMIT")
+        except Exception:
+            self.__rollback(db)
+            raise
+        return expired
+
+    @staticmethod
+    def __rollback(db: sqlite3.Connection) -> None:
+        try:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+        except sqlite3.Error:
+            logger.exception("Failed to roll back conversation store transaction")
+
+    def stats(self) -> Dict[str, Any]:
+        [(conversations, messages)] = self.__read(
+            "SELECT (SELECT COUNT(*) FROM conversations), (SELECT COUNT(*) FROM messages)"
+        )
+        with self.__condition:
+            pending = len(self.__pending)
+        return {
+            "store": "sqlite",
+            "conversations": conversations,
+            "messages": messages,
+            "pending_writes": pending,
+            "batches": self.__batches,
+            "written": self.__written,
+            "avg_batch_size": self.__written / self.__batches if self.__batches else 0.0,
+            "expired": self.__expired,
+        }
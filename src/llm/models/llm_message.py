@@ -7,5 +7,5 @@ class LlmMessage:
     """
     Represents a message that can be passed in the payload of request to LLM as conversation history
     """
-    role: Literal["user", "assistant"]
+    role: Literal["system", "user", "assistant"]
     content: str
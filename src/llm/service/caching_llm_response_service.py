@@ -0,0 +1,109 @@
+import json
+import hashlib
+from typing import override, Optional, List, Iterator, Dict
+from src.util.env import Env
+from src.util.ttl_lru_cache import TtlLruCache
+from src.llm.models.llm_message import LlmMessage
+from src.llm.service.llm_response_service import LlmResponseService
+
+
+class CachingLlmResponseService(LlmResponseService):
+    """
+    Decorator around any LlmResponseService that answers exact repeats of a request from a bounded LRU/TTL cache.
+
+    Requests are keyed on model, role, prompt and a hash of the conversation history. Agents opt in by being
+    constructed with a caching service instead of the bare one, so only deterministic rewrites (query composition,
+    intent classification, search result cleaning) are ever served from cache.
+    """
+
+    def __init__(
+            self,
+            llm_response_service: LlmResponseService,
+            cache: Optional[TtlLruCache] = None
+    ):
+        env = Env()
+        self.__llm_response_service = llm_response_service
+        self.__cache = cache if cache is not None else TtlLruCache(
+            max_entries=int(env["LLM_CACHE_MAX_ENTRIES"] or 1024),
+            ttl_seconds=float(env["LLM_CACHE_TTL_SECONDS"] or 60 * 60)
+        )
+
+    @property
+    def model(self) -> str:
+        return getattr(self.__llm_response_service, "model", type(self.__llm_response_service).__name__)
+
+    @property
+    def cache(self) -> TtlLruCache:
+        return self.__cache
+
+    def stats(self) -> Dict[str, int]:
+        return self.__cache.stats()
+
+    @override
+    def response(
+            self,
+            role: str,
+            prompt: str,
+            conversation_history: Optional[List[LlmMessage]] = None,
+            timeout: Optional[int] = None
+    ) -> str:
+        key = self.__key(role, prompt, conversation_history)
+        cached = self.__cache.lookup(key)
+        if cached is not TtlLruCache.MISSING:
+            return cached
+
+        res = self.__llm_response_service.response(role, prompt, conversation_history, timeout)
+        self.__cache.set(key, res)
+        return res
+
+    @override
+    async def aresponse(
+            self,
+            role: str,
+            prompt: str,
+            conversation_history: Optional[List[LlmMessage]] = None,
+            timeout: Optional[int] = None
+    ) -> str:
+        key = self.__key(role, prompt, conversation_history)
+        cached = self.__cache.lookup(key)
+        if cached is not TtlLruCache.MISSING:
+            return cached
+
+        res = await self.__llm_response_service.aresponse(role, prompt, conversation_history, timeout)
+        self.__cache.set(key, res)
+        return res
+
+    @override
+    def stream(
+            self,
+            role: str,
+            prompt: str,
+            conversation_history: Optional[List[LlmMessage]] = None,
+            timeout: Optional[int] = None
+    ) -> Iterator[str]:
+        key = self.__key(role, prompt, conversation_history)
+        cached = self.__cache.lookup(key)
+        if cached is not TtlLruCache.MISSING:
+            yield cached
+            return
+
+        chunks = []
+        for chunk in self.__llm_response_service.stream(role, prompt, conversation_history, timeout):
+            chunks.append(chunk)
+            yield chunk
+        # Only a stream that ran to completion is a valid cache entry
+        self.__cache.set(key, "".join(chunks))
+
+    def __key(
+            self,
+            role: str,
+            prompt: str,
+            conversation_history: Optional[List[LlmMessage]]
+    ) -> str:
+        history = hashlib.sha256(
+            json.dumps([[m.role, m.content] for m in (conversation_history or [])], default=str).encode()
+        ).hexdigest()
+
+        return hashlib.sha256(
+            json.dumps([self.model, role, prompt, history]).encode()
+        ).hexdigest()
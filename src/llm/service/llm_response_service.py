@@ -1,5 +1,8 @@
+import asyncio
 from abc import ABC, abstractmethod
-from typing import Optional, List
+from contextvars import copy_context
+from functools import partial
+from typing import Optional, List, Iterator
 from src.llm.models.llm_message import LlmMessage
 
 
@@ -18,9 +21,54 @@ class LlmResponseService(ABC):
         :param role: The behavior/persona for the model to inherit
         :param prompt: The task for the model to complete
         :param conversation_history: The conversation history to provide context for the model
-        :param timeout: Amount of seconds to wait before throwing requests.exceptions.Timeout
+        :param timeout: Amount of seconds to wait before throwing requests.exceptions.Timeout; implementations cap it
+                        by the remaining budget of the current request deadline (see src.util.deadline)
         :return: response from LLM
         :rtype: str
         :exception: requests.exceptions.Timeout
         """
         pass
+
+    async def aresponse(
+            self,
+            role: str,
+            prompt: str,
+            conversation_history: Optional[List[LlmMessage]] = None,
+            timeout: Optional[int] = None
+    ) -> str:
+        """
+        Async counterpart of response, so callers can await many LLM calls at once.
+        Implementations without a native async transport run response on the event loop's executor.
+
+        :param role: The behavior/persona for the model to inherit
+        :param prompt: The task for the model to complete
+        :param conversation_history: The conversation history to provide context for the model
+        :param timeout: Amount of seconds to wait before throwing requests.exceptions.Timeout
+        :return: response from LLM
+        :rtype: str
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None,
+            partial(copy_context().run, self.response, role, prompt, conversation_history, timeout)
+        )
+
+    def stream(
+            self,
+            role: str,
+            prompt: str,
+            conversation_history: Optional[List[LlmMessage]] = None,
+            timeout: Optional[int] = None
+    ) -> Iterator[str]:
+        """
+        Streaming counterpart of response that yields the completion in chunks as the model produces them.
+        Implementations without a streaming transport yield the whole response as a single chunk.
+
+        :param role: The behavior/persona for the model to inherit
+        :param prompt: The task for the model to complete
+        :param conversation_history: The conversation history to provide context for the model
+        :param timeout: Amount of seconds to wait before throwing requests.exceptions.Timeout
+        :return: chunks of the response from LLM, in order
+        :rtype: Iterator[str]
+        """
+        yield self.response(role, prompt, conversation_history, timeout)
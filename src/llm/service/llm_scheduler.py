@@ -0,0 +1,250 @@
+import heapq
+import itertools
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from enum import IntEnum
+from threading import Condition
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+from src.util.env import Env
+from src.util.singleton import singleton
+
+
+class Priority(IntEnum):
+    """
+    Scheduling class of an LLM call, lower values are admitted first
+    """
+    INTERACTIVE = 0
+    DEFAULT = 1
+    BACKGROUND = 2
+
+
+class SchedulerQueueFullError(RuntimeError):
+    """
+    Raised when the wait queue of a priority class is full and the call is shed instead of queued
+    """
+    pass
+
+
+def retry_after_seconds(headers: Mapping[str, str], default: float = 1.0) -> float:
+    """
+    Seconds to back off after a 429, read from the Retry-After header (or OpenAI's reset header) when present
+    """
+    for header in ("Retry-After", "retry-after-ms", "x-ratelimit-reset-requests"):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            seconds = float(value.rstrip("s"))
+        except ValueError:
+            continue
+        return seconds / 1000 if header == "retry-after-ms" else seconds
+    return default
+
+
+class _TokenBucket:
+    """
+    Classic token bucket refilled continuously at ``per_minute / 60`` tokens a second, holding at most one minute of
+    budget. The level may go negative when actual usage exceeds what was reserved; later calls pay off the debt.
+    """
+
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self.level = float(per_minute)
+        self.__updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(float(self.per_minute), self.level + (now - self.__updated) * self.per_minute / 60)
+        self.__updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """
+        Seconds until amount can be taken, assumes refill was just called
+        """
+        amount = min(amount, self.per_minute)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60 / self.per_minute
+
+    def take(self, amount: float) -> None:
+        self.level -= min(amount, self.per_minute)
+
+
+@dataclass
+class _ModelLimits:
+    requests: _TokenBucket
+    tokens: _TokenBucket
+    blocked_until: float = 0.0
+    waiting: List[Tuple[int, int]] = field(default_factory=list)
+    admitted: int = 0
+    rejected: int = 0
+    timed_out: int = 0
+
+
+@dataclass
+class Ticket:
+    """
+    Admission handed to a scheduled call, used to settle the token reservation against actual usage
+    """
+    model: str
+    priority: Priority
+    reserved_tokens: int
+    waited_seconds: float
+    used_tokens: Optional[int] = None
+
+    def record_usage(self, total_tokens: int) -> None:
+        self.used_tokens = total_tokens
+
+
+@singleton
+class LlmScheduler:
+    """
+    Central admission point for every LLM call in the process.
+
+    Each model has a requests-per-minute and a tokens-per-minute token bucket. Calls wait in a priority queue per
+    model and are admitted strictly in priority order (FIFO within a class) as the buckets allow, so interactive
+    replies never queue behind bulk background work. Each priority class has a bounded queue; when it is full the
+    call fails fast with SchedulerQueueFullError instead of piling up.
+    """
+
+    def __init__(self):
+        env = Env()
+        self.__default_rpm = int(env["LLM_RPM_LIMIT"] or 500)
+        self.__default_tpm = int(env["LLM_TPM_LIMIT"] or 200_000)
+        self.__max_queue = int(env["LLM_SCHEDULER_MAX_QUEUE"] or 256)
+        self.__condition = Condition()
+        self.__models: Dict[str, _ModelLimits] = {}
+        self.__queued: Dict[Priority, int] = {p: 0 for p in Priority}
+        self.__sequence = itertools.count()
+
+    def configure(self, model: str, requests_per_minute: int, tokens_per_minute: int) -> None:
+        """
+        Set the rate limits of a model, models that are never configured use LLM_RPM_LIMIT and LLM_TPM_LIMIT
+        """
+        if requests_per_minute < 1 or tokens_per_minute < 1:
+            raise ValueError("rate limits must be at least 1 per minute")
+
+        with self.__condition:
+            limits = self.__limits(model)
+            limits.requests = _TokenBucket(requests_per_minute)
+            limits.tokens = _TokenBucket(tokens_per_minute)
+            self.__condition.notify_all()
+
+    def penalize(self, model: str, retry_after_seconds: float) -> None:
+        """
+        Hold back all calls to a model, used when upstream answers 429 Too Many Requests
+        """
+        with self.__condition:
+            limits = self.__limits(model)
+            limits.blocked_until = max(limits.blocked_until, time.monotonic() + retry_after_seconds)
+
+    @contextmanager
+    def slot(
+            self,
+            model: str,
+            priority: Priority,
+            estimated_tokens: int,
+            timeout: Optional[float] = None
+    ) -> Iterator[Ticket]:
+        """
+        Wait for admission of a call to model and settle its token usage once the call is done
+
+        :param model: Model the call is made against
+        :param priority: Scheduling class of the call
+        :param estimated_tokens: Tokens reserved up front; settled with Ticket.record_usage when known
+        :param timeout: Maximum seconds to wait for admission, None waits indefinitely
+        :exception: SchedulerQueueFullError when the priority class queue is full
+        :exception: TimeoutError when admission takes longer than timeout
+        """
+        ticket = self.__admit(model, priority, estimated_tokens, timeout)
+        try:
+            yield ticket
+        finally:
+            if ticket.used_tokens is not None and ticket.used_tokens != ticket.reserved_tokens:
+                with self.__condition:
+                    tokens = self.__models[model].tokens
+                    tokens.refill(time.monotonic())
+                    tokens.level -= ticket.used_tokens - ticket.reserved_tokens
+                    self.__condition.notify_all()
+
+    def __admit(self, model: str, priority: Priority, estimated_tokens: int, timeout: Optional[float]) -> Ticket:
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+
+        with self.__condition:
+            limits = self.__limits(model)
+            if self.__queued[priority] >= self.__max_queue:
+                limits.rejected += 1
+                raise SchedulerQueueFullError(f"LLM scheduler queue for {priority.name} calls is full")
+
+            entry = (int(priority), next(self.__sequence))
+            heapq.heappush(limits.waiting, entry)
+            self.__queued[priority] += 1
+            admitted = False
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self.__wait_time(limits, entry, estimated_tokens, now)
+                    if wait == 0.0:
+                        heapq.heappop(limits.waiting)
+                        limits.requests.take(1)
+                        limits.tokens.take(estimated_tokens)
+                        limits.admitted += 1
+                        admitted = True
+                        return Ticket(model, priority, estimated_tokens, now - started)
+
+                    if deadline is not None:
+                        if now >= deadline:
+                            limits.timed_out += 1
+                            raise TimeoutError(f"Timed out waiting for an LLM slot on {model}")
+                        wait = deadline - now if wait is None else min(wait, deadline - now)
+
+                    self.__condition.wait(timeout=wait)
+            finally:
+                self.__queued[priority] -= 1
+                if not admitted:
+                    limits.waiting.remove(entry)
+                    heapq.heapify(limits.waiting)
+                # Whoever is next in line may be admissible now
+                self.__condition.notify_all()
+
+    @staticmethod
+    def __wait_time(limits: _ModelLimits, entry: Tuple[int, int], tokens: int, now: float) -> Optional[float]:
+        """
+        Seconds until entry could be admitted: 0 when admissible now, None when it is not at the head of the queue
+        """
+        if limits.waiting[0] != entry:
+            return None
+        if limits.blocked_until > now:
+            return limits.blocked_until - now
+
+        limits.requests.refill(now)
+        limits.tokens.refill(now)
+        return max(limits.requests.wait_time(1), limits.tokens.wait_time(tokens))
+
+    def __limits(self, model: str) -> _ModelLimits:
+        limits = self.__models.get(model)
+        if limits is None:
+            limits = _ModelLimits(
+                requests=_TokenBucket(self.__default_rpm),
+                tokens=_TokenBucket(self.__default_tpm)
+            )
+            self.__models[model] = limits
+        return limits
+
+    def stats(self) -> Dict[str, Any]:
+        with self.__condition:
+            return {
+                "queued": {p.name.lower(): n for p, n in self.__queued.items()},
+                "max_queue": self.__max_queue,
+                "models": {
+                    model: {
+                        "queued": len(limits.waiting),
+                        "admitted": limits.admitted,
+                        "rejected": limits.rejected,
+                        "timed_out": limits.timed_out,
+                        "requests_available": round(limits.requests.level, 2),
+                        "tokens_available": round(limits.tokens.level, 2),
+                    } for model, limits in self.__models.items()
+                },
+            }
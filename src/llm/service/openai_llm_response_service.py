@@ -1,24 +1,53 @@
+import json
+import asyncio
+import hashlib
+from contextvars import copy_context
+from functools import partial
 import requests
-from typing import override, Optional, List
+from contextlib import contextmanager
+from typing import override, Optional, List, Iterator, Dict, Any
+from src.util.deadline import budget, check
 from src.util.env import Env
+from src.util.http_client import HttpClient
+from src.util.metrics import LLM_REQUEST_SECONDS, UpstreamCall, upstream_call
+from src.util.single_flight import SingleFlight
+from src.util.tokens import estimate_messages_tokens
 from src.llm.models.llm_message import LlmMessage
 from src.llm.service.llm_response_service import LlmResponseService
+from src.llm.service.llm_scheduler import LlmScheduler, Priority, retry_after_seconds
 
 
 class OpenAILlmResponseService(LlmResponseService):
-    def __init__(self, model: str = "gpt-5-chat-latest"):
+    # Shared by every instance so identical requests coalesce regardless of which agent issued them
+    __inflight = SingleFlight()
+    # Completion tokens reserved with the scheduler before the actual usage is known
+    __COMPLETION_TOKENS_ESTIMATE = 512
+
+    def __init__(self, model: str = "gpt-5-chat-latest", priority: Priority = Priority.INTERACTIVE):
+        """
+        :param model: OpenAI chat model to use
+        :param priority: Scheduling class of calls made through this service
+        """
         self.__model = model
-        self.__url = "https://api.openai.com/v1/chat/completions"
+        self.__priority = priority
+        base_url = (Env()["OPENAI_BASE_URL"] or "https://api.openai.com/v1").rstrip("/")
+        self.__url = f"{base_url}/chat/completions"
         self.__api_key = Env()["OPENAI_API_KEY"]
         self.__headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.__api_key}",
         }
+        self.__http = HttpClient()
+        self.__scheduler = LlmScheduler()
 
     @property
     def model(self) -> str:
         return self.__model
 
+    @property
+    def priority(self) -> Priority:
+        return self.__priority
+
     @override
     def response(
             self,
@@ -27,7 +56,151 @@ class OpenAILlmResponseService(LlmResponseService):
             conversation_history: Optional[List[LlmMessage]] = None,
             timeout: Optional[int] = None
     ) -> str:
-        payload = {
+        payload = self.__payload(role, prompt, conversation_history)
+        key = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+        estimated_tokens = self.__estimate(conversation_history, role, prompt)
+
+        # Followers of a coalesced call stop waiting once their own budget runs out
+        return self.__inflight.do(key, lambda: self.__post(payload, estimated_tokens, timeout), timeout=budget(timeout))
+
+    @override
+    async def aresponse(
+            self,
+            role: str,
+            prompt: str,
+            conversation_history: Optional[List[LlmMessage]] = None,
+            timeout: Optional[int] = None
+    ) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.__http.executor,
+            partial(copy_context().run, self.response, role, prompt, conversation_history, timeout)
+        )
+
+    @override
+    def stream(
+            self,
+            role: str,
+            prompt: str,
+            conversation_history: Optional[List[LlmMessage]] = None,
+            timeout: Optional[int] = None
+    ) -> Iterator[str]:
+        payload = self.__payload(role, prompt, conversation_history)
+        payload["stream"] = True
+        payload["stream_options"] = {"include_usage": True}
+
+        with self.__scheduler.slot(self.__model, self.__priority, self.__estimate(conversation_history, role, prompt),
+                                   timeout=budget(timeout)) as ticket, self.__traced(stream=True) as call:
+            try:
+                response = self.__http.session.post(
+                    url=self.__url,
+                    headers=self.__headers,
+                    json=payload,
+                    timeout=budget(timeout),
+                    stream=True
+                )
+            except requests.exceptions.Timeout:
+                check()
+                raise TimeoutError("OpenAI must be down or increase timeout duration")
+            call.status = response.status_code
+
+            with response:
+                if response.status_code == 429:
+                    self.__scheduler.penalize(self.__model, retry_after_seconds(response.headers))
+                if response.status_code >= 400:
+                    raise RuntimeError(
+                        f"OpenAI request failed: {response.status_code} {response.reason} - {response.text}"
+                    )
+
+                # SSE bodies are utf-8, but requests falls back to latin-1 for text/* without a charset
+                response.encoding = "utf-8"
+                try:
+                    for line in response.iter_lines(decode_unicode=True):
+                        if not line or not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+
+                        chunk = json.loads(data)
+                        if chunk.get("usage"):
+                            ticket.record_usage(chunk["usage"].get("total_tokens", ticket.reserved_tokens))
+                        choices = chunk.get("choices") or []
+                        if not choices:
+                            continue
+                        delta = (choices[0].get("delta") or {}).get("content")
+                        if delta:
+                            yield delta
+                        # Closing the response mid-stream releases the upstream generation of an abandoned request
+                        check()
+                except requests.exceptions.Timeout:
+                    check()
+                    raise TimeoutError("OpenAI must be down or increase timeout duration")
+
+    def __post(self, payload: Dict[str, Any], estimated_tokens: int, timeout: Optional[int]) -> str:
+        with self.__scheduler.slot(self.__model, self.__priority, estimated_tokens, timeout=budget(timeout)) as ticket:
+            with self.__traced(stream=False) as call:
+                try:
+                    response = self.__http.session.post(
+                        url=self.__url,
+                        headers=self.__headers,
+                        json=payload,
+                        timeout=budget(timeout)
+                    )
+                except requests.exceptions.Timeout:
+                    check()
+                    raise TimeoutError("OpenAI must be down or increase timeout duration")
+                call.status = response.status_code
+
+            if response.status_code == 429:
+                self.__scheduler.penalize(self.__model, retry_after_seconds(response.headers))
+
+            response_data = response.json()
+            usage = response_data.get("usage") or {}
+            if "total_tokens" in usage:
+                ticket.record_usage(usage["total_tokens"])
+
+        try:
+            return response_data["choices"][0]["message"]["content"]
+        except (KeyError, IndexError):
+            raise ValueError("No content found in the response")
+
+    @contextmanager
+    def __traced(self, stream: bool) -> Iterator[UpstreamCall]:
+        """
+        Traces a chat completion request and records its latency per model
+        """
+        call = None
+        try:
+            with upstream_call("openai", "chat_completions", model=self.__model, stream=stream) as call:
+                yield call
+        finally:
+            if call is not None:
+                LLM_REQUEST_SECONDS.observe(
+                    call.span.duration,
+                    model=self.__model,
+                    priority=self.__priority.name.lower(),
+                    status=call.status
+                )
+
+    def __estimate(self, conversation_history: Optional[List[LlmMessage]], role: str, prompt: str) -> int:
+        return estimate_messages_tokens([
+            LlmMessage(role="system", content=role),
+            *(conversation_history or []),
+            LlmMessage(role="user", content=prompt),
+        ]) + self.__COMPLETION_TOKENS_ESTIMATE
+
+    @classmethod
+    def inflight_stats(cls) -> Dict[str, int]:
+        return cls.__inflight.stats()
+
+    def __payload(
+            self,
+            role: str,
+            prompt: str,
+            conversation_history: Optional[List[LlmMessage]]
+    ) -> Dict[str, Any]:
+        return {
             "model": self.__model,
             "messages": [
                 {
@@ -46,19 +219,3 @@ class OpenAILlmResponseService(LlmResponseService):
                 }
             ]
         }
-
-        try:
-            response = requests.post(
-                url=self.__url,
-                headers=self.__headers,
-                json=payload,
-                timeout=timeout
-            )
-        except requests.exceptions.Timeout:
-            raise TimeoutError("OpenAI must be down or increase timeout duration")
-
-        response_data = response.json()
-        try:
-            return response_data["choices"][0]["message"]["content"]
-        except (KeyError, IndexError):
-            raise ValueError("No content found in the response")
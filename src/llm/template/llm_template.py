@@ -30,7 +30,7 @@ class LlmTemplate:
                 "number": "<phone or null>",
                 "hours": "<hours string or null>",
                 "stars": <number or null>,
-                "price_range": "<$, $$, $$$ or null>"
+                "price_range": "<$, $$, $$$, a range like $-$$, or null>"
               }},
               ...
             }}
@@ -47,8 +47,8 @@ class LlmTemplate:
                         set null.
                - stars: find the first decimal or integer number that represents a 0–5 rating (e.g., "4.7"). Coerce to
                         a JSON number (not string). If no clear rating, set null.
-               - price_range: map the first occurrence of price symbols to "$", "$$", or "$$$". If empty/blank, set 
-                              null.
+               - price_range: map the first occurrence of price symbols to "$", "$$", or "$$$"; keep a range as
+                              both ends joined by a hyphen, e.g. "$-$$". If empty/blank, set null.
             4) Strip ALL markdown:
                - Remove code fences like ```json ... ```.
                - Replace any markdown links "[label](url)" with just "label".
@@ -90,25 +90,29 @@ class LlmTemplate:
         ).strip()
 
     @staticmethod
-    def web_search_query(user_request: str):
+    def web_search_query(user_request: str, max_queries: int = 1):
         """
-        Rewrite a natural-language user task into a concise, engine-friendly web search query.
+        Rewrite a natural-language user task into concise, engine-friendly web search queries, one per line.
 
         Examples:
-          - "I need a haircut"            -> "barbers near me"
+          - "I need a haircut"            -> "barbers near me", "men's haircut near me"
           - "Any good dessert spots"      -> "dessert spots near me"
 
+        :param max_queries: Most phrasings of the task to return
         """
         return dedent(
             f"""
-            You are a Search Query Composer. Convert the user's task into a single, effective web search query.
+            You are a Search Query Composer. Convert the user's task into at most {max_queries} effective web search
+            queries, each a different phrasing of the same task.
 
             <user_request>
             {user_request}
             </user_request>
 
             Rules:
-            1) Output ONLY one search query string. No quotes, no markdown, no JSON, no extra text.
+            1) Output ONLY the search queries, one per line, the most likely to find what the user wants first. No
+               quotes, no numbering, no markdown, no JSON, no extra text. Add a phrasing only when it finds businesses
+               the others would miss (e.g., "barbers" and "men's haircut"), never a mere reordering.
             2) Be concise (3–10 words). Remove filler (“I need”, “please”, “can you”).
             3) Prefer common head terms and plurals for local services
                (e.g., "barbers", "hair salons", "plumbers", "restaurants", "mechanics").
@@ -123,9 +127,35 @@ class LlmTemplate:
                 User: I need to be a haircut
                 Query: Barbers near me
                 
-            Now return only the rewritten search query.
+            Now return only the rewritten search queries.
             """
         ).strip()
 
+    @staticmethod
+    def conversation_summary(previous_summary: str, transcript: str, max_words: int):
+        """
+        Fold older conversation turns into a running summary that replaces them in the context window.
+        :return: contextualized prompt
+        """
+        return dedent(
+            f"""
+            You maintain a running summary of a conversation between a user and Clanker, a booking assistant.
 
+            <previous_summary>
+            {previous_summary or "(none)"}
+            </previous_summary>
 
+            <new_turns>
+            {transcript}
+            </new_turns>
+
+            Rules:
+            1) Output ONLY the updated summary as plain text. No markdown, no preamble.
+            2) Merge the new turns into the previous summary; never drop facts that are still relevant.
+            3) Keep every booking detail: services, businesses, phone numbers, dates, times, prices, preferences and
+               anything the user accepted or rejected.
+            4) Stay under {max_words} words.
+
+            Now return the updated summary.
+            """
+        ).strip()
@@ -1,38 +1,144 @@
+from src.util.env import Env
+
+# Cooperative serving needs the standard library patched before anything imports sockets, ssl or threads
+if (Env()['SERVER_MODE'] or 'gevent').lower() == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
 import logging
-from flask import Flask
+import signal
+import time
+from flask import Flask, g, request
 from flask_cors import CORS
 from src.util.logging_config import setup_logging
 from src.rest.api.clanker_api import clanker_routes
-from src.util.env import Env
+from src.util.metrics import HTTP_REQUEST_SECONDS
+from src.util.snapshot import SnapshotManager
+from src.util.warmup import Warmup
 from app.app import register_vapi_routes
+from app.memory import store
+
+logger = logging.getLogger(__name__)
 
 
 class MyClanker:
-    def __init__(self, host=None, port=None):
+    def __init__(self, host=None, port=None, mode=None):
+        """
+        :param host: Interface to bind, defaults to HOST
+        :param port: Port to bind, defaults to PORT
+        :param mode: "gevent" for the cooperative production server, "flask" for Flask's development server,
+                     defaults to SERVER_MODE
+        """
         env = Env()
         self.__app = Flask(__name__)
         self.__host = host or env['HOST'] or '0.0.0.0'
         self.__port = int(port or env['PORT'] or 8000)
+        self.__mode = (mode or env['SERVER_MODE'] or 'gevent').lower()
+        # Requests served at once; further connections wait in the accept backlog
+        self.__max_concurrency = int(env['SERVER_MAX_CONCURRENCY'] or 2000)
+        # On SIGTERM/SIGINT, in-flight requests get this long to finish before they are cut off
+        self.__shutdown_grace_seconds = float(env['SERVER_SHUTDOWN_GRACE_SECONDS'] or 30)
         self.__configure_app()
 
     def __configure_app(self):
         """Configure Flask application with middleware and routes"""
         CORS(self.__app)
+        self.__app.before_request(self.__start_timer)
+        self.__app.after_request(self.__observe_request)
         clanker_routes(self.__app)
         # Register Vapi routes under the same app
         register_vapi_routes(self.__app)
+        snapshots = SnapshotManager()
+        snapshots.register("vapi_webhooks", store)
+        snapshots.start()
+        # Not ready before the saved state is back, a request could otherwise miss its conversation
+        Warmup().add("snapshot_restore", snapshots.wait_restored)
+        # Builds the lazily constructed services and opens upstream connections while the server starts accepting
+        Warmup().start()
+
+    @staticmethod
+    def __start_timer():
+        g.request_started = time.perf_counter()
+
+    @staticmethod
+    def __observe_request(response):
+        started = g.get('request_started')
+        if started is not None:
+            # The route template, not the path, so ids do not become label values
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=request.method,
+                route=route,
+                status=response.status_code
+            )
+        return response
 
     def run(self):
-        self.__app.run(
-            host=self.__host,
-            port=self.__port,
-            debug=False
+        if self.__mode == 'gevent':
+            self.__serve_gevent()
+        elif self.__mode == 'flask':
+            self.__app.run(
+                host=self.__host,
+                port=self.__port,
+                debug=False
+            )
+        else:
+            raise ValueError(f"Unknown SERVER_MODE '{self.__mode}', expected 'gevent' or 'flask'")
+
+    def __serve_gevent(self):
+        """
+        Serve on gevent's WSGI server: every request runs in a greenlet, so requests blocked on OpenAI or Vapi I/O
+        cost a few KB each instead of an OS thread. Stops gracefully on SIGTERM and SIGINT.
+        """
+        import gevent
+        from gevent.pool import Pool
+        from gevent.pywsgi import WSGIHandler, WSGIServer
+
+        class Handler(WSGIHandler):
+            def get_environ(self):
+                # Exposes the client connection, so requests can notice when their client disconnects
+                environ = super().get_environ()
+                environ['clanker.socket'] = self.socket
+                return environ
+
+        pool = Pool(self.__max_concurrency)
+        server = WSGIServer(
+            (self.__host, self.__port),
+            self.__app,
+            spawn=pool,
+            handler_class=Handler,
+            log=logging.getLogger('gevent.access'),
+            error_log=logging.getLogger('gevent.error')
+        )
+
+        def shutdown():
+            if server.closed:
+                return
+            logger.info(
+                "Shutting down, waiting up to %.0fs for %d in-flight requests",
+                self.__shutdown_grace_seconds,
+                len(pool)
+            )
+            # Stops accepting right away, then waits for the pool to drain; runs outside the signal callback
+            gevent.spawn(server.stop, timeout=self.__shutdown_grace_seconds)
+
+        # These replace the snapshot's own SIGTERM handler; the snapshot is still written at exit once serving stops
+        gevent.signal_handler(signal.SIGTERM, shutdown)
+        gevent.signal_handler(signal.SIGINT, shutdown)
+
+        logger.info(
+            "Serving on http://%s:%d with gevent, up to %d concurrent requests",
+            self.__host,
+            self.__port,
+            self.__max_concurrency
         )
+        server.serve_forever()
+        logger.info("Server stopped")
 
 
 def main():
     setup_logging()
-    logger = logging.getLogger(__name__)
     logger.info("Starting application...")
     server = MyClanker()
     server.run()
@@ -1,10 +1,35 @@
+import json
 import uuid
-from flask import jsonify, request
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import asdict
+from typing import Optional
+from flask import Response, jsonify, request
 from src.llm.memory.conversation_memory import ConversationMemory
 from src.llm.models.llm_message import LlmMessage
 from src.llm.service.openai_llm_response_service import OpenAILlmResponseService
-from src.agent.search_agent import SearchAgent
+from src.llm.service.caching_llm_response_service import CachingLlmResponseService
+from src.llm.service.llm_scheduler import LlmScheduler, Priority
+from src.agent.pipeline import Pipeline, PipelineStep
+from src.agent.search_query_agent import SearchQueryAgent
+from src.agent.business_search_agent import BusinessSearchAgent, BusinessSearchTask
+from src.agent.web_search_intent_agent import WebSearchIntentAgent
 from src.agent.conversation_agent import ConversationAgent
+from src.rest.api.request_deadline import DisconnectWatcher, request_deadline, request_timeout
+from src.rest.api.sse import SSE_HEADERS, sse_event
+from src.service.business_index import BusinessIndex
+from src.service.job_manager import JobManager, JobQueueFullError, JobStatus
+from src.service.opening_hours import HoursIndex, OpeningHours, parse_window
+from src.service.search_cache import SearchCache
+from src.service.search_parser_service import BusinessDirectory, BusinessInfo, SearchParserService
+from src.service.search_service import SearchLocation, SearchService
+from src.util.admission import AdmissionController, AdmissionRejectedError
+from src.util.deadline import DeadlineExceededError, RequestCancelledError, deadline, submit
+from src.util.env import Env
+from src.util.http_client import HttpClient
+from src.util.lazy import Lazy
+from src.util.metrics import REGISTRY
+from src.util.snapshot import SnapshotManager
+from src.util.warmup import Warmup
 from src.rest.dto.conversation_dto import (
     CreateConversationRequest,
     CreateConversationResponse,
@@ -13,50 +38,291 @@ from src.rest.dto.conversation_dto import (
 )
 
 
+def _wants_stream(data) -> bool:
+    """
+    Clients opt into Server-Sent Events with "stream": true in the body, ?stream=true, or Accept: text/event-stream
+    """
+    if isinstance(data, dict) and data.get('stream') is True:
+        return True
+    if request.args.get('stream', '').lower() == 'true':
+        return True
+    return request.accept_mimetypes.best == 'text/event-stream'
+
+
+def _open_during(info: BusinessInfo, window: int) -> bool:
+    """
+    Whether a business is open at some point of a window; businesses with unknown hours are kept, as HoursIndex does
+    """
+    hours = OpeningHours.parse(info.hours)
+    return hours is None or hours.overlaps(window)
+
+
+def _requested_location(data) -> Optional[SearchLocation]:
+    """
+    Location to search around from the body, e.g. "location": {"city": "Oakland", "region": "East Bay"}; the region
+    defaults to the city and the country to "us"
+    :exception: ValueError when it is not an object with a city
+    """
+    location = data.get('location')
+    if location is None:
+        return None
+    city = location.get('city') if isinstance(location, dict) else None
+    if not isinstance(city, str) or not city.strip():
+        raise ValueError("location must be an object with a city")
+    return SearchLocation(
+        city=city.strip(),
+        region=str(location.get('region') or city).strip(),
+        country=str(location.get('country') or "us").strip()
+    )
+
+
+def _wants_job(data) -> bool:
+    """
+    Clients opt into a background job with "async": true in the body, ?async=true, or Prefer: respond-async
+    """
+    if isinstance(data, dict) and data.get('async') is True:
+        return True
+    if request.args.get('async', '').lower() == 'true':
+        return True
+    return 'respond-async' in request.headers.get('Prefer', '').lower()
+
+
+def _error_response(e: Exception):
+    """
+    429 when the request was shed, 504 when it ran out of time, 499 when its client went away, 500 otherwise
+    """
+    if isinstance(e, AdmissionRejectedError):
+        return jsonify({'error': str(e)}), 429, {'Retry-After': str(e.retry_after)}
+    if isinstance(e, DeadlineExceededError):
+        return jsonify({'error': str(e)}), 504
+    if isinstance(e, RequestCancelledError):
+        return jsonify({'error': str(e)}), 499
+    return jsonify({'error': str(e)}), 500
+
+
 def clanker_routes(app):
     """Register all clanker related routes"""
     llm_service = OpenAILlmResponseService()
-    search_agent = SearchAgent(llm_service)
-    conversation_agent = ConversationAgent(llm_service)
+    # Result cleaning is bulk work the user is not waiting on token by token, it yields to interactive calls
+    background_llm_service = OpenAILlmResponseService(priority=Priority.BACKGROUND)
+    # Intent classification, query composition and result cleaning are deterministic rewrites, so they opt into caching
+    cached_llm_service = CachingLlmResponseService(llm_service)
+    cached_background_llm_service = CachingLlmResponseService(background_llm_service)
+    # Agents open the search cache and business index on construction, so they are built on first use or by the
+    # warm-up, not while the app starts. The pipeline input is the CreateConversationRequest. Intent classification
+    # and query composition only need the user request, so they run side by side
+    booking_pipeline = Lazy(lambda: Pipeline([
+        # Nothing downstream needs the intent, so a failed classification must not fail the booking
+        PipelineStep(
+            "intent",
+            WebSearchIntentAgent(cached_llm_service),
+            task=lambda req, _: req.user_request,
+            optional=True
+        ),
+        PipelineStep("query", SearchQueryAgent(cached_llm_service), task=lambda req, _: req.user_request),
+        # Every phrasing of the request is searched, around the requested location or the agent's default ones
+        PipelineStep(
+            "search",
+            BusinessSearchAgent(cached_background_llm_service),
+            depends_on=("query",),
+            task=lambda req, deps: BusinessSearchTask(
+                queries=deps["query"],
+                locations=[req.location] if req.location else None
+            )
+        ),
+    ], max_workers=int(Env()["PIPELINE_WORKERS"] or 32)))
+    conversation_agent = Lazy(lambda: ConversationAgent(
+        llm_service,
+        context_token_budget=int(Env()["CONVERSATION_CONTEXT_TOKENS"] or 4000),
+        # Summaries are written in the background and must not compete with replies in the scheduler
+        summary_llm_response_service=background_llm_service
+    ))
     memory = ConversationMemory()
+    jobs = JobManager(
+        max_workers=int(Env()["JOB_WORKERS"] or 32),
+        max_pending=int(Env()["JOB_MAX_PENDING"] or 1000),
+        ttl_seconds=float(Env()["JOB_TTL_SECONDS"] or 60 * 60)
+    )
+    # Searches fan out into many upstream calls, so only so many run at once; the rest wait briefly or are turned away
+    conversation_admission = AdmissionController(
+        "conversation",
+        max_concurrent=int(Env()["ADMISSION_CONVERSATION_MAX_CONCURRENT"] or 64),
+        max_queue=int(Env()["ADMISSION_CONVERSATION_MAX_QUEUE"] or 128),
+        queue_timeout=float(Env()["ADMISSION_QUEUE_TIMEOUT_SECONDS"] or 10)
+    )
+    # A streamed booking runs the pipeline beside the search it streams; every stream holds a conversation slot, so
+    # one thread per slot never makes a stream wait for one
+    stream_pipelines = ThreadPoolExecutor(
+        max_workers=int(Env()["ADMISSION_CONVERSATION_MAX_CONCURRENT"] or 64),
+        thread_name_prefix="stream-pipeline"
+    )
+    # Jobs outlive the request that started them, so they get a budget of their own instead of the request's
+    job_timeout = float(Env()["JOB_TIMEOUT_SECONDS"] or 10 * 60)
+
+    snapshots = SnapshotManager()
+    snapshots.register("conversations", memory)
+    snapshots.register("llm_cache", cached_llm_service.cache)
+    snapshots.register("llm_cache_background", cached_background_llm_service.cache)
+
+    REGISTRY.register_collector("conversations", memory.stats)
+    REGISTRY.register_collector("llm_cache", cached_llm_service.stats)
+    REGISTRY.register_collector("llm_cache_background", cached_background_llm_service.stats)
+    REGISTRY.register_collector("llm_scheduler", LlmScheduler().stats)
+    REGISTRY.register_collector("llm_inflight", OpenAILlmResponseService.inflight_stats)
+    REGISTRY.register_collector("search_inflight", SearchService.inflight_stats)
+    # Only reported once the pipeline opened them, a scrape should not open the databases
+    REGISTRY.register_collector("search_cache", lambda: SearchCache().stats() if booking_pipeline.initialized else {})
+    REGISTRY.register_collector(
+        "business_index", lambda: BusinessIndex().stats() if booking_pipeline.initialized else {}
+    )
+    REGISTRY.register_collector("jobs", jobs.stats)
+    REGISTRY.register_collector("disconnects", DisconnectWatcher().stats)
+    REGISTRY.register_collector("admission_conversation", conversation_admission.stats)
+
+    warmup = Warmup()
+    warmup.add("booking_pipeline", booking_pipeline.get)
+    warmup.add("conversation_agent", conversation_agent.get)
+    warmup.add("openai_connections", lambda: HttpClient().prewarm(
+        Env()["OPENAI_BASE_URL"] or "https://api.openai.com/v1",
+        connections=int(Env()["WARMUP_CONNECTIONS"] or 4)
+    ))
+
+    def search(req):
+        """
+        Run the booking pipeline, keeping only the businesses open at some point of the requested window
+        """
+        result = booking_pipeline.get().run(req)
+        window = parse_window(req.window) if req.window else None
+        if window is not None:
+            directory = result.outputs["search"]
+            result.outputs["search"] = HoursIndex.from_directory(directory).filter(directory, window)
+        return result
+
+    def remember(conversation_id, req, directory):
+        """
+        Record the request and the businesses found for it as the start of the conversation
+        """
+        memory.add(conversation_id, LlmMessage(role="user", content=req.user_request))
+        memory.add(conversation_id, LlmMessage(role="assistant", content=json.dumps(directory.to_dict())))
+
+    def create(conversation_id, req):
+        """
+        Search for the request and record the exchange as the start of the conversation
+        """
+        result = search(req)
+        response_message = result.outputs["search"]
+        remember(conversation_id, req, response_message)
+
+        return CreateConversationResponse(
+            conversation_id=conversation_id,
+            response_message=response_message,
+            intent=result.outputs["intent"]
+        )
+
+    def create_in_background(conversation_id, req):
+        with deadline(job_timeout):
+            return create(conversation_id, req)
 
     @app.route('/v1/conversation', methods=['POST'])
     def create_conversation():
         """
         Create a new conversation
-        :return: JSON response including conversation ID and response message
+        :return: JSON response including conversation ID and response message, an event stream if requested, or
+                 202 with a job to poll if a background job was requested; 429 with Retry-After when overloaded
         """
         try:
             data = request.get_json()
             if not data or 'user_request' not in data:
                 return jsonify({'error': 'user_request is required'}), 400
             
-            req = CreateConversationRequest(user_request=data['user_request'])
+            try:
+                location = _requested_location(data)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+
+            req = CreateConversationRequest(
+                user_request=data['user_request'],
+                window=data.get('window'),
+                location=location
+            )
             
             conversation_id = uuid.uuid4()
-            response_message = search_agent.execute(req.user_request)
-            
-            memory.add(conversation_id, LlmMessage(role="user", content=req.user_request))
-            memory.add(conversation_id, LlmMessage(role="assistant", content=response_message))
 
-            response = CreateConversationResponse(
-                conversation_id=conversation_id,
-                response_message=response_message
-            )
+            if _wants_job(data):
+                try:
+                    job = jobs.submit(lambda: create_in_background(conversation_id, req))
+                except JobQueueFullError as e:
+                    return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+                return jsonify({
+                    'job_id': job.id,
+                    'conversation_id': conversation_id,
+                    'status': job.status.value,
+                    'status_url': f'/v1/jobs/{job.id}',
+                    'events_url': f'/v1/jobs/{job.id}/events'
+                }), 202, {'Location': f'/v1/jobs/{job.id}'}
+
+            # Background jobs are bounded by the job queue instead. Time queued for a slot is charged to the request:
+            # the slot is acquired within its deadline, so the wait is capped by it and ends if the client leaves
+            timeout = request_timeout(request.headers)
+
+            if _wants_stream(data):
+                with request_deadline(request.environ, timeout) as queued:
+                    admission = conversation_admission.acquire()
+                    remaining = queued.remaining()
+                try:
+                    stream = Response(
+                        _stream_create_conversation(conversation_id, req, request.environ, remaining),
+                        mimetype='text/event-stream',
+                        headers=SSE_HEADERS
+                    )
+                except BaseException:
+                    conversation_admission.release(admission)
+                    raise
+                # The slot is held until the stream is done, also when it is closed before it started
+                stream.call_on_close(lambda: conversation_admission.release(admission))
+                return stream
+
+            with request_deadline(request.environ, timeout):
+                with conversation_admission.slot():
+                    response = create(conversation_id, req)
             
             return jsonify({
                 'conversation_id': response.conversation_id,
-                'response_message': response.response_message
+                'response_message': response.response_message,
+                'intent': response.intent
             })
             
         except Exception as e:
-            return jsonify({'error': str(e)}), 500
+            return _error_response(e)
+
+    @app.route('/v1/jobs/<job_id>', methods=['GET'])
+    def get_job(job_id):
+        """
+        Status of a background job, with its result once it succeeded
+        :return: JSON job, or 404 for unknown or expired jobs
+        """
+        job = jobs.get(job_id)
+        if job is None:
+            return jsonify({'error': 'job not found'}), 404
+        return jsonify(job.to_dict())
+
+    @app.route('/v1/jobs/<job_id>/events', methods=['GET'])
+    def job_events(job_id):
+        """
+        Event stream of a background job: its current status right away, then a done or error event once it
+        finishes, with keep-alive comments in between so proxies do not close the idle connection
+        :return: event stream, or 404 for unknown or expired jobs
+        """
+        job = jobs.get(job_id)
+        if job is None:
+            return jsonify({'error': 'job not found'}), 404
+        return Response(_stream_job(job), mimetype='text/event-stream', headers=SSE_HEADERS)
 
     @app.route('/v1/conversation', methods=['PATCH'])
     def continue_conversation():
         """
         Continue an existing conversation based off the conversation ID provided in the request body
-        :return: JSON response including response message
+        :return: JSON response including response message, or an event stream of the response if requested
         """
         try:
             data = request.get_json()
@@ -71,10 +337,21 @@ def clanker_routes(app):
             conversation_uuid = req.conversation_id
             conversation_history = memory.history(conversation_uuid)
 
-            response_message = conversation_agent.execute(
-                req.user_request, 
-                conversation_history=conversation_history
-            )
+            if _wants_stream(data):
+                return Response(
+                    _stream_continue_conversation(
+                        req, conversation_history, request.environ, request_timeout(request.headers)
+                    ),
+                    mimetype='text/event-stream',
+                    headers=SSE_HEADERS
+                )
+
+            with request_deadline(request.environ, request_timeout(request.headers)):
+                response_message = conversation_agent.get().execute(
+                    req.user_request,
+                    conversation_history=conversation_history,
+                    conversation_id=conversation_uuid
+                )
 
             memory.add(conversation_uuid, LlmMessage(role="user", content=req.user_request))
             memory.add(conversation_uuid, LlmMessage(role="assistant", content=response_message))
@@ -86,6 +363,97 @@ def clanker_routes(app):
             })
             
         except Exception as e:
-            return jsonify({'error': str(e)}), 500
+            return _error_response(e)
+
+    def _stream_create_conversation(conversation_id, req, environ, timeout):
+        """
+        Emit the conversation ID right away, then a business event per business as the search finds it and the
+        intent once it is classified, and finally the whole result once the search is done
+        """
+        yield sse_event({'conversation_id': conversation_id}, event='conversation')
+        businesses = {}
+        try:
+            # The stream is produced after the view returned, so the request's deadline resumes here with what the
+            # wait for a slot left of it
+            with request_deadline(environ, timeout) as stream_deadline:
+                pipeline = booking_pipeline.get()
+                search_step = pipeline.step("search")
+                outputs = {}
+                search_ready: Future = Future()
+
+                def on_output(step, output):
+                    outputs[step] = output
+                    if not search_ready.done() and all(d in outputs for d in search_step.depends_on):
+                        search_ready.set_result({d: outputs[d] for d in search_step.depends_on})
+
+                # The search step is run here instead, streaming its businesses as they are parsed. It starts as
+                # soon as the steps it depends on are done, the intent is sent whenever its classification is
+                run = submit(stream_pipelines, pipeline.run, req, skip=("search",), on_output=on_output)
+                try:
+                    wait({search_ready, run}, return_when=FIRST_COMPLETED)
+                    if not search_ready.done():
+                        run.result()  # raises what failed the pipeline
+                    deps = search_ready.result()
+
+                    intent_sent = False
+                    window = parse_window(req.window) if req.window else None
+                    for name, info in search_step.agent.stream(search_step.task(req, deps)):
+                        if not intent_sent and "intent" in outputs:
+                            intent_sent = True
+                            yield sse_event({'intent': outputs["intent"]}, event='intent')
+                        if window is not None and not _open_during(info, window):
+                            continue
+                        businesses[name] = info
+                        yield sse_event({'name': name, **asdict(info)}, event='business')
+
+                    intent = run.result().outputs["intent"]
+                    if not intent_sent:
+                        yield sse_event({'intent': intent}, event='intent')
+                finally:
+                    # A stream that failed or was closed early leaves nothing for the rest of the pipeline to do
+                    if not run.done():
+                        stream_deadline.cancel("stream ended")
+        except Exception as e:
+            yield sse_event({'error': str(e)}, event='error')
+            return
+
+        response_message = SearchParserService().merge([BusinessDirectory(businesses=businesses)])
+        remember(conversation_id, req, response_message)
+
+        yield sse_event({'response_message': response_message, 'intent': intent})
+        yield sse_event({'conversation_id': conversation_id}, event='done')
+
+    def _stream_job(job):
+        yield sse_event(job.to_dict(), event='status')
+        while not job.wait(timeout=15):
+            yield ': keep-alive\n\n'
+
+        if job.status is JobStatus.FAILED:
+            yield sse_event(job.to_dict(), event='error')
+        else:
+            yield sse_event(job.to_dict(), event='done')
+
+    def _stream_continue_conversation(req, conversation_history, environ, timeout):
+        """
+        Emit each chunk of the reply as it is generated; the assembled reply is stored once the stream completes
+        """
+        chunks = []
+        try:
+            with request_deadline(environ, timeout):
+                for chunk in conversation_agent.get().stream(
+                        req.user_request,
+                        conversation_history=conversation_history,
+                        conversation_id=req.conversation_id
+                ):
+                    chunks.append(chunk)
+                    yield sse_event({'delta': chunk})
+        except Exception as e:
+            yield sse_event({'error': str(e)}, event='error')
+            return
+
+        response_message = ''.join(chunks)
+        memory.add(req.conversation_id, LlmMessage(role="user", content=req.user_request))
+        memory.add(req.conversation_id, LlmMessage(role="assistant", content=response_message))
 
+        yield sse_event({'response_message': response_message}, event='done')
 
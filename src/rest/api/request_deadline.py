@@ -0,0 +1,137 @@
+import _socket
+import os
+import select
+import socket
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+from src.util.deadline import Deadline, deadline
+from src.util.env import Env
+from src.util.singleton import singleton
+
+# WSGI environ keys under which servers expose the client connection
+SOCKET_ENVIRON_KEYS = ("clanker.socket", "werkzeug.socket")
+
+
+def request_timeout(headers: Any, default: Optional[float] = None) -> float:
+    """
+    Time budget of a request: REQUEST_TIMEOUT_SECONDS, or less when the client asks for less with an
+    X-Request-Timeout header in seconds
+
+    :param headers: Request headers
+    :param default: Budget when REQUEST_TIMEOUT_SECONDS is not set, defaults to 120 seconds
+    """
+    limit = float(Env()["REQUEST_TIMEOUT_SECONDS"] or default or 120)
+    try:
+        requested = float(headers.get("X-Request-Timeout", ""))
+    except ValueError:
+        return limit
+    return min(requested, limit) if requested > 0 else limit
+
+
+@singleton
+class DisconnectWatcher:
+    """
+    Cancels the deadline of a request when its client disconnects, so the work behind it stops instead of
+    finishing for nobody.
+
+    A single background thread polls the connections of all watched requests. A connection that turns readable and
+    yields EOF was closed by the client; one that yields data is left alone and no longer watched, since the client
+    is still there.
+    """
+
+    def __init__(self):
+        self.__poll_interval = float(Env()["DISCONNECT_POLL_SECONDS"] or 0.5)
+        self.__lock = threading.Lock()
+        self.__watched: Dict[int, Tuple[int, Deadline]] = {}
+        self.__next_token = 0
+        self.__thread: Optional[threading.Thread] = None
+        # Set while there is something to watch, so an idle watcher does not spin
+        self.__wakeup = threading.Event()
+        self.__cancelled = 0
+
+    def watch(self, sock: socket.socket, request_deadline: Deadline) -> int:
+        """
+        :return: token to stop watching with
+        """
+        with self.__lock:
+            self.__next_token += 1
+            # Polled by descriptor, so the watcher never shares the socket object the server reads requests with
+            self.__watched[self.__next_token] = (sock.fileno(), request_deadline)
+            self.__wakeup.set()
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__poll, name="disconnect-watcher", daemon=True)
+                self.__thread.start()
+            return self.__next_token
+
+    def unwatch(self, token: int) -> Optional[Deadline]:
+        """
+        :return: deadline watched under token, None if it was no longer watched
+        """
+        with self.__lock:
+            watched = self.__watched.pop(token, None)
+        return watched[1] if watched is not None else None
+
+    def __poll(self) -> None:
+        while True:
+            self.__wakeup.wait()
+            with self.__lock:
+                by_fd = {fd: token for token, (fd, _) in self.__watched.items()}
+                if not by_fd:
+                    self.__wakeup.clear()
+                    continue
+
+            try:
+                readable, _, _ = select.select(list(by_fd), [], [], self.__poll_interval)
+            except (OSError, ValueError):
+                # A connection was closed by the server while being polled, its request has ended
+                readable = [fd for fd in by_fd if not self.__open(fd)]
+
+            for fd in readable:
+                # Either way the connection needs no more watching: the client left, or sent data and is still there
+                request_deadline = self.unwatch(by_fd[fd])
+                if request_deadline is not None and self.__peek_eof(fd):
+                    request_deadline.cancel("client disconnected")
+                    with self.__lock:
+                        self.__cancelled += 1
+
+    @staticmethod
+    def __open(fd: int) -> bool:
+        try:
+            os.fstat(fd)
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def __peek_eof(fd: int) -> bool:
+        # A plain socket from _socket, which gevent does not patch, so the peek is a single non-blocking syscall
+        sock = _socket.socket(fileno=fd)
+        try:
+            return sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b""
+        except BlockingIOError:
+            return False
+        except OSError:
+            return True
+        finally:
+            sock.detach()
+
+    def stats(self) -> Dict[str, int]:
+        with self.__lock:
+            return {"watched": len(self.__watched), "cancelled": self.__cancelled}
+
+
+@contextmanager
+def request_deadline(environ: Dict[str, Any], seconds: float) -> Iterator[Deadline]:
+    """
+    Run the enclosed work under a deadline of seconds that is also cancelled when the client of the request
+    disconnects, if the server exposes the client connection
+    """
+    with deadline(seconds) as d:
+        sock = next((environ[k] for k in SOCKET_ENVIRON_KEYS if environ.get(k) is not None), None)
+        token = DisconnectWatcher().watch(sock, d) if sock is not None else None
+        try:
+            yield d
+        finally:
+            if token is not None:
+                DisconnectWatcher().unwatch(token)
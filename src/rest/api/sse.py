@@ -0,0 +1,27 @@
+import json
+from dataclasses import asdict, is_dataclass
+from typing import Any, Optional
+
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+
+def sse_event(data: Any, event: Optional[str] = None) -> str:
+    """
+    Format a single Server-Sent Events frame with a JSON encoded payload
+
+    :param data: JSON serializable payload of the event, dataclasses are serialized field by field
+    :param event: Optional event name, clients receive unnamed events as "message"
+    :return: SSE frame terminated by a blank line
+    """
+    frame = f"event: {event}\n" if event else ""
+    return f"{frame}data: {json.dumps(data, default=_to_json)}\n\n"
+
+
+def _to_json(o: Any) -> Any:
+    if is_dataclass(o) and not isinstance(o, type):
+        return asdict(o)
+    return str(o)
@@ -1,11 +1,17 @@
 import uuid
 from dataclasses import dataclass
+from typing import Optional
+from src.service.search_service import SearchLocation
 
 
 @dataclass
 class CreateConversationRequest:
     """Request DTO for creating a new conversation"""
     user_request: str
+    # Free-text availability like "Mon–Fri afternoon"; businesses closed for the whole window are dropped
+    window: Optional[str] = None
+    # Where to search; the search agent's default locations when not given
+    location: Optional[SearchLocation] = None
 
 
 @dataclass
@@ -13,6 +19,7 @@ class CreateConversationResponse:
     """Response DTO for creating a new conversation"""
     conversation_id: uuid.UUID
     response_message: str
+    intent: Optional[str] = None
 
 
 @dataclass
@@ -0,0 +1,242 @@
+import re
+import sqlite3
+import time
+from dataclasses import dataclass
+from os import makedirs, path
+from threading import Lock
+from typing import Any, Dict, List, Optional
+from src.service.entity_resolution import normalize_phone
+from src.service.search_parser_service import BusinessDirectory, BusinessInfo, SearchParserService
+from src.util.blocking import run_blocking
+from src.util.env import Env
+from src.util.singleton import singleton
+
+
+@dataclass
+class IndexedBusiness:
+    name: str
+    info: BusinessInfo
+    category: str
+    city: str
+    region: str
+    country: str
+    updated_at: float
+
+
+@dataclass
+class IndexLookup:
+    directory: BusinessDirectory
+    # Freshness of the oldest business in the result, seconds since the epoch
+    updated_at: float
+
+    @property
+    def age_seconds(self) -> float:
+        return time.time() - self.updated_at
+
+
+@singleton
+class BusinessIndex:
+    """
+    Persistent index of every business seen in search results, with its location, service category and the time it
+    was last seen. Supports lookups by category and city and by name prefix, so repeat searches for a popular
+    category can be answered locally instead of with a multi-second web search.
+    """
+
+    def __init__(self):
+        env = Env()
+        self.__path = env["BUSINESS_INDEX_PATH"] or path.join(
+            path.dirname(path.realpath(__file__)), "../..", ".cache", "business_index.sqlite3"
+        )
+        if self.__path != ":memory:":
+            makedirs(path.dirname(path.abspath(self.__path)), exist_ok=True)
+
+        self.__lock = Lock()
+        self.__hits = 0
+        self.__misses = 0
+        self.__db = sqlite3.connect(self.__path, check_same_thread=False, isolation_level=None)
+        self.__db.execute("PRAGMA journal_mode=WAL")
+        self.__db.execute("PRAGMA synchronous=NORMAL")
+        self.__db.execute("""
+            CREATE TABLE IF NOT EXISTS businesses (
+                category TEXT NOT NULL,
+                city TEXT NOT NULL,
+                region TEXT NOT NULL,
+                country TEXT NOT NULL,
+                name_norm TEXT NOT NULL,
+                name TEXT NOT NULL,
+                number TEXT,
+                phone TEXT,
+                hours TEXT,
+                stars REAL,
+                price_range TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (category, city, region, country, name_norm)
+            )
+        """)
+        self.__db.execute("CREATE INDEX IF NOT EXISTS businesses_name_norm ON businesses (name_norm, city)")
+        self.__add_phone_column()
+        self.__db.execute("CREATE INDEX IF NOT EXISTS businesses_phone ON businesses (phone)")
+
+    def __add_phone_column(self) -> None:
+        """
+        Adds the E.164 phone column to an index created before it existed, filled in from the stored numbers
+        """
+        columns = {row[1] for row in self.__db.execute("PRAGMA table_info(businesses)")}
+        if "phone" in columns:
+            return
+        rows = self.__db.execute("SELECT rowid, number FROM businesses WHERE number IS NOT NULL").fetchall()
+        self.__db.execute("BEGIN")
+        self.__db.execute("ALTER TABLE businesses ADD COLUMN phone TEXT")
+        self.__db.executemany(
+            "UPDATE businesses SET phone = ? WHERE rowid = ?",
+            [(normalize_phone(number), rowid) for rowid, number in rows]
+        )
+        self.__db.execute("COMMIT")
+
+    @staticmethod
+    def category(query: str) -> str:
+        """
+        Service category of a search query: lowercased, without punctuation and location filler like "near me"
+        """
+        text = re.sub(r"[^\w$+.]+", " ", query.lower())
+        text = re.sub(r"\b(?:near me|nearby|near by|around me|close to me)\b", " ", text)
+        return " ".join(text.split())
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return " ".join(re.sub(r"[\W_]+", " ", text.lower()).split())
+
+    def upsert(self, directory: BusinessDirectory, category: str, city: str, region: str, country: str) -> None:
+        """
+        Record every business of a search result under its category and location, refreshing its timestamp
+        """
+        now = time.time()
+        rows = [
+            (
+                category, self._normalize(city), self._normalize(region), self._normalize(country),
+                self._normalize(name), name, info.number, normalize_phone(info.number), info.hours, info.stars,
+                info.price_range, now
+            )
+            for name, info in directory.businesses.items()
+            if self._normalize(name)
+        ]
+        with self.__lock:
+            run_blocking(self.__write, rows)
+
+    def __write(self, rows: List[tuple]) -> None:
+        """
+        Inserts or replaces rows in one transaction, assumes the lock is held
+        """
+        self.__db.execute("BEGIN")
+        self.__db.executemany(
+            """
+            INSERT OR REPLACE INTO businesses
+                (category, city, region, country, name_norm, name, number, phone, hours, stars, price_range,
+                 updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows
+        )
+        self.__db.execute("COMMIT")
+
+    def lookup(
+        self,
+        category: str,
+        city: str,
+        region: str,
+        country: str,
+        max_age_seconds: Optional[float] = None,
+        min_results: int = 1
+    ) -> Optional[IndexLookup]:
+        """
+        Businesses of a category around a location
+
+        :param max_age_seconds: Ignore businesses not seen in a search for longer than this
+        :param min_results: Treat results with fewer businesses than this as a miss
+        :return: matching businesses sorted by descending stars, or None on a miss
+        """
+        oldest = 0.0 if max_age_seconds is None else time.time() - max_age_seconds
+        with self.__lock:
+            rows = self.__db.execute(
+                """
+                SELECT name, number, hours, stars, price_range, updated_at FROM businesses
+                WHERE category = ? AND city = ? AND region = ? AND country = ? AND updated_at >= ?
+                """,
+                (category, self._normalize(city), self._normalize(region), self._normalize(country), oldest)
+            ).fetchall()
+            if len(rows) < max(min_results, 1):
+                self.__misses += 1
+                return None
+            self.__hits += 1
+
+        directory = SearchParserService().merge([BusinessDirectory(businesses={
+            name: BusinessInfo(number=number, hours=hours, stars=stars, price_range=price_range)
+            for name, number, hours, stars, price_range, _ in rows
+        })])
+        return IndexLookup(directory=directory, updated_at=min(r[5] for r in rows))
+
+    def search_prefix(self, prefix: str, city: Optional[str] = None, limit: int = 20) -> List[IndexedBusiness]:
+        """
+        Businesses whose normalized name starts with prefix, best rated first
+        """
+        low = self._normalize(prefix)
+        if not low:
+            return []
+        # Range scan on the name index; U+10FFFF sorts after every character a name can contain
+        params: List[Any] = [low, low + "\U0010ffff"]
+        where = "name_norm >= ? AND name_norm < ?"
+        if city is not None:
+            where += " AND city = ?"
+            params.append(self._normalize(city))
+        params.append(limit)
+
+        with self.__lock:
+            rows = self.__db.execute(
+                f"""
+                SELECT name, number, hours, stars, price_range, category, city, region, country, updated_at
+                FROM businesses WHERE {where}
+                ORDER BY stars IS NULL, stars DESC, name_norm LIMIT ?
+                """,
+                params
+            ).fetchall()
+
+        return [
+            IndexedBusiness(
+                name=name,
+                info=BusinessInfo(number=number, hours=hours, stars=stars, price_range=price_range),
+                category=category,
+                city=city,
+                region=region,
+                country=country,
+                updated_at=updated_at
+            )
+            for name, number, hours, stars, price_range, category, city, region, country, updated_at in rows
+        ]
+
+    def hours_by_number(self, number: str) -> List[str]:
+        """
+        Opening hours recorded for the business reached at a phone number, compared in E.164 so
+        "+1 (415) 555-0100" and "4155550100" match
+
+        :return: hours of every indexed entry with that number, empty when the number is unknown or has no hours
+        """
+        phone = normalize_phone(number)
+        if phone is None:
+            return []
+        with self.__lock:
+            rows = self.__db.execute(
+                "SELECT hours FROM businesses WHERE phone = ? AND hours IS NOT NULL", (phone,)
+            ).fetchall()
+        return [hours for (hours,) in rows]
+
+    def stats(self) -> Dict[str, int]:
+        with self.__lock:
+            size, categories = self.__db.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT category) FROM businesses"
+            ).fetchone()
+            return {
+                "businesses": size,
+                "categories": categories,
+                "hits": self.__hits,
+                "misses": self.__misses,
+            }
@@ -0,0 +1,160 @@
+import re
+from dataclasses import fields, replace
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set, Tuple
+
+if TYPE_CHECKING:
+    from src.service.search_parser_service import BusinessInfo
+
+# Words that do not tell two businesses apart: "Mario's Barber Shop LLC" and "Marios Barber" are the same shop
+_STOPWORDS = frozenset({
+    "the", "and", "of", "at", "on", "by", "a", "an",
+    "llc", "inc", "co", "corp", "ltd", "company", "studio", "studios", "shop", "salon", "spa",
+})
+
+
+def normalize_phone(number: Optional[str], country_code: str = "1") -> Optional[str]:
+    """
+    Normalizes a phone number to E.164, e.g. "(415) 555-0134" -> "+14155550134"
+
+    :param number: Phone number in any common format; "+" prefixed numbers keep their own country code
+    :param country_code: Country calling code assumed for national numbers, defaults to NANP
+    :return: E.164 number, or None when number is not a plausible phone number
+    """
+    if not number:
+        return None
+    international = number.strip().startswith("+")
+    digits = re.sub(r"\D", "", number)
+    if international:
+        return f"+{digits}" if 8 <= len(digits) <= 15 else None
+    if country_code == "1":
+        if len(digits) == 11 and digits.startswith("1"):
+            digits = digits[1:]
+        return f"+1{digits}" if len(digits) == 10 and digits[0] not in "01" else None
+    return f"+{country_code}{digits.lstrip('0')}" if 6 <= len(digits) <= 14 else None
+
+
+def _name_tokens(name: str) -> List[str]:
+    text = re.sub(r"['’`]", "", name.lower()).replace("&", " and ")
+    return [t for t in re.sub(r"[\W_]+", " ", text).split() if t not in _STOPWORDS]
+
+
+def _trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class EntityResolver:
+    """
+    Groups business records that describe the same business and merges each group into one canonical record.
+
+    Records are only compared within blocks that share a blocking key - the E.164 phone number or the first
+    significant name token - so resolution stays close to linear in the number of records instead of comparing all
+    pairs. Two records in a block are the same business when their phones match, or when neither phone contradicts
+    the other and their names are near-identical (one is a prefix of the other, or their character trigrams mostly
+    overlap, e.g. "Mario's Barber" and "Marios Barbershop").
+
+    Groups never merge when they hold different phones, also not through a record without a phone that resembles
+    both, so branches of a chain stay apart. Different businesses that end up under the same name are keyed apart by
+    their phone.
+    """
+
+    def __init__(self, name_similarity: float = 0.7):
+        """
+        :param name_similarity: Minimum Jaccard similarity of name trigrams for two names to match
+        """
+        self.__name_similarity = name_similarity
+
+    def resolve(self, records: Iterable[Tuple[str, "BusinessInfo"]]) -> Dict[str, "BusinessInfo"]:
+        """
+        De-duplicate business records.
+
+        The canonical name of a merged business is its first occurrence; fields it lacks are filled from later
+        duplicates, the highest rating is kept and phone numbers are normalized to E.164 when possible.
+
+        :param records: (name, info) pairs, in order of preference
+        :return: canonical businesses keyed by name, in order of first occurrence
+        """
+        records = list(records)
+        phones = [normalize_phone(info.number) for _, info in records]
+        names = ["".join(_name_tokens(name)) or re.sub(r"\W+", "", name.lower()) for name, _ in records]
+        parent = list(range(len(records)))
+        # Phone of each group, by root
+        group_phones: List[Optional[str]] = list(phones)
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        def union(i: int, j: int) -> None:
+            ri, rj = find(i), find(j)
+            if ri != rj:
+                # The earlier record stays the root so its name becomes the canonical one
+                root, child = min(ri, rj), max(ri, rj)
+                parent[child] = root
+                group_phones[root] = group_phones[root] or group_phones[child]
+
+        def conflicting(i: int, j: int) -> bool:
+            phone_i, phone_j = group_phones[find(i)], group_phones[find(j)]
+            return bool(phone_i and phone_j and phone_i != phone_j)
+
+        blocks: Dict[str, List[int]] = {}
+        for i, (name, _) in enumerate(records):
+            tokens = _name_tokens(name)
+            if phones[i]:
+                blocks.setdefault(f"phone:{phones[i]}", []).append(i)
+            blocks.setdefault(f"name:{tokens[0] if tokens else names[i]}", []).append(i)
+
+        for key, members in blocks.items():
+            by_phone = key.startswith("phone:")
+            for a, i in enumerate(members):
+                for j in members[a + 1:]:
+                    if find(i) == find(j) or conflicting(i, j):
+                        continue
+                    if by_phone or self.__same_name(names[i], names[j], phones[i], phones[j]):
+                        union(i, j)
+
+        resolved: Dict[str, "BusinessInfo"] = {}
+        roots: Dict[int, str] = {}
+        for i, (name, info) in enumerate(records):
+            root = find(i)
+            if root not in roots:
+                key = name if name not in resolved else self.__distinct_name(name, group_phones[root], resolved)
+                roots[root] = key
+                resolved[key] = replace(info, number=phones[i] or info.number)
+                continue
+
+            merged = resolved[roots[root]]
+            info = replace(info, number=phones[i] or info.number)
+            for f in fields(merged):
+                if getattr(merged, f.name) is None:
+                    setattr(merged, f.name, getattr(info, f.name))
+            if info.stars is not None and merged.stars is not None:
+                merged.stars = max(merged.stars, info.stars)
+
+        return resolved
+
+    @staticmethod
+    def __distinct_name(name: str, phone: Optional[str], taken: Dict[str, "BusinessInfo"]) -> str:
+        """
+        Key for a different business whose name is already taken: the name with its phone, or a counter without one
+        """
+        if phone and f"{name} ({phone})" not in taken:
+            return f"{name} ({phone})"
+        n = 2
+        while f"{name} ({n})" in taken:
+            n += 1
+        return f"{name} ({n})"
+
+    def __same_name(self, a: str, b: str, phone_a: Optional[str], phone_b: Optional[str]) -> bool:
+        # Different phones under one name are usually different branches of a chain
+        if phone_a and phone_b and phone_a != phone_b:
+            return False
+        if a == b:
+            return True
+        shorter, longer = sorted((a, b), key=len)
+        if len(shorter) >= 5 and len(shorter) >= 0.6 * len(longer) and longer.startswith(shorter):
+            return True
+        ta, tb = _trigrams(a), _trigrams(b)
+        return len(ta & tb) / len(ta | tb) >= self.__name_similarity
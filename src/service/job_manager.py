@@ -0,0 +1,156 @@
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from enum import Enum
+from threading import Event, Lock
+from typing import Any, Callable, Dict, Optional
+from src.util.ttl_lru_cache import TtlLruCache
+
+logger = logging.getLogger(__name__)
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+@dataclass
+class Job:
+    id: str
+    status: JobStatus = JobStatus.QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
+    _done: Event = field(default_factory=Event, repr=False, compare=False)
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until the job finishes or timeout passes
+
+        :return: whether the job is done
+        """
+        return self._done.wait(timeout)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status.value,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobQueueFullError(RuntimeError):
+    """
+    Raised when a job is submitted while the queue is at capacity
+    """
+
+
+class JobManager:
+    """
+    Runs long jobs on a bounded background pool so the request that started them can return right away.
+
+    At most max_workers jobs run at once and at most max_pending wait for a worker; submissions beyond that are
+    rejected instead of queueing without bound. Jobs stay queryable for ttl_seconds after they were submitted, or
+    until max_retained newer jobs push them out.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 32,
+        max_pending: int = 1000,
+        ttl_seconds: float = 60 * 60,
+        max_retained: int = 10_000
+    ):
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.__capacity = max_workers + max_pending
+        self.__jobs = TtlLruCache(max_entries=max_retained, ttl_seconds=ttl_seconds)
+        self.__lock = Lock()
+        self.__unfinished = 0
+        self.__submitted = 0
+        self.__rejected = 0
+        self.__succeeded = 0
+        self.__failed = 0
+
+    def submit(self, fn: Callable[[], Any]) -> Job:
+        """
+        Queue fn to run in the background
+
+        :param fn: Work of the job; its return value becomes the job result, an exception fails the job
+        :return: the queued job
+        :exception: JobQueueFullError when max_workers + max_pending jobs are already unfinished
+        """
+        with self.__lock:
+            if self.__unfinished >= self.__capacity:
+                self.__rejected += 1
+                raise JobQueueFullError(f"Job queue is full ({self.__capacity} unfinished jobs)")
+            self.__unfinished += 1
+            self.__submitted += 1
+
+        job = Job(id=str(uuid.uuid4()))
+        self.__jobs.set(job.id, job)
+        try:
+            self.__executor.submit(self.__run, job, fn)
+        except BaseException:
+            with self.__lock:
+                self.__unfinished -= 1
+            raise
+        return job
+
+    def __run(self, job: Job, fn: Callable[[], Any]) -> None:
+        job.started_at = time.time()
+        job.status = JobStatus.RUNNING
+        try:
+            job.result = fn()
+            job.status = JobStatus.SUCCEEDED
+        except Exception as e:
+            logger.exception("Job %s failed", job.id)
+            job.error = str(e)
+            job.status = JobStatus.FAILED
+        finally:
+            job.finished_at = time.time()
+            with self.__lock:
+                self.__unfinished -= 1
+                if job.status is JobStatus.SUCCEEDED:
+                    self.__succeeded += 1
+                else:
+                    self.__failed += 1
+            job._done.set()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.__jobs.get(job_id)
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[Job]:
+        """
+        Block until a job finishes or timeout passes
+
+        :return: the job, finished unless the timeout passed first, or None for an unknown job
+        """
+        job = self.get(job_id)
+        if job is not None:
+            job.wait(timeout)
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        with self.__lock:
+            return {
+                "unfinished": self.__unfinished,
+                "capacity": self.__capacity,
+                "submitted": self.__submitted,
+                "rejected": self.__rejected,
+                "succeeded": self.__succeeded,
+                "failed": self.__failed,
+            }
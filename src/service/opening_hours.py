@@ -0,0 +1,298 @@
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from src.service.search_parser_service import BusinessDirectory, BusinessInfo
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+SLOTS_PER_WEEK = 7 * SLOTS_PER_DAY
+WEEK_MASK = (1 << SLOTS_PER_WEEK) - 1
+
+_DAYS = {
+    "mon": 0, "tue": 1, "wed": 2, "thu": 3, "fri": 4, "sat": 5, "sun": 6,
+}
+_DAY_GROUPS = {
+    "daily": range(7), "everyday": range(7), "every day": range(7), "all week": range(7),
+    "weekdays": range(5), "weekday": range(5), "weekends": range(5, 7), "weekend": range(5, 7),
+}
+# Parts of the day a booking window can name, in minutes since midnight
+_PARTS_OF_DAY = {
+    "morning": (8 * 60, 12 * 60),
+    "midday": (11 * 60, 14 * 60),
+    "lunch": (11 * 60 + 30, 13 * 60 + 30),
+    "afternoon": (12 * 60, 17 * 60),
+    "evening": (17 * 60, 21 * 60),
+    "night": (19 * 60, 24 * 60),
+}
+
+# Whole words only, so "month" or "sunset" name no day
+_DAY_WORD = (
+    r"\b(?:mon(?:day)?|tue(?:s(?:day)?)?|wed(?:nesday)?|thu(?:rs?(?:day)?)?|fri(?:day)?|sat(?:urday)?|sun(?:day)?)"
+    r"s?\b\.?"
+)
+_DAY_RANGE = re.compile(rf"({_DAY_WORD})\s*(?:-|–|—|to|through|thru)\s*({_DAY_WORD})", re.IGNORECASE)
+_DAY_SINGLE = re.compile(_DAY_WORD, re.IGNORECASE)
+_TIME = r"(\d{1,2})(?:[:.](\d{2}))?\s*([ap])?\.?\s*(?:m\b\.?)?"
+_TIME_RANGE = re.compile(rf"{_TIME}\s*(?:-|–|—|to|until|till)\s*{_TIME}", re.IGNORECASE)
+# A single time of a booking window, "3pm" or "15:30"; bare numbers are too ambiguous to be read as a time
+_WINDOW_TIME = re.compile(
+    r"(?:\b(?P<bound>after|from|before|by|until|till)\s+)?\b(?P<hour>\d{1,2})"
+    r"(?:(?P<colon>:)(?P<minute>\d{2}))?\s*(?:(?P<meridiem>[ap])\.?m\b\.?)?"
+)
+_NOON_MIDNIGHT = {"noon": "12:00 pm", "midnight": "12:00 am"}
+_SEGMENT = re.compile(r"^\s*(?P<days>[A-Za-z][A-Za-z\s,.&/+–—-]*?)\s*:\s*(?P<times>.*)$")
+
+
+def _day_index(word: str) -> Optional[int]:
+    return _DAYS.get(word.lower()[:3])
+
+
+def _days(text: str) -> List[int]:
+    """
+    Days of the week named in text: ranges ("Mon–Fri"), lists ("Mon, Wed & Sat") and groups ("weekdays")
+    """
+    lowered = text.lower()
+    days: List[int] = []
+    for group, members in _DAY_GROUPS.items():
+        if re.search(rf"\b{group}\b", lowered):
+            days.extend(members)
+
+    for m in _DAY_RANGE.finditer(text):
+        start, end = _day_index(m.group(1)), _day_index(m.group(2))
+        if start is None or end is None:
+            continue
+        days.extend((start + i) % 7 for i in range((end - start) % 7 + 1))
+    for m in _DAY_SINGLE.finditer(_DAY_RANGE.sub(" ", text)):
+        day = _day_index(m.group(0))
+        if day is not None:
+            days.append(day)
+
+    return sorted(set(days))
+
+
+def _minutes(hour: str, minute: Optional[str], meridiem: Optional[str]) -> int:
+    h, m = int(hour), int(minute or 0)
+    if meridiem:
+        h = h % 12 + (12 if meridiem.lower() == "p" else 0)
+    return h * 60 + m
+
+
+def _time_ranges(text: str) -> List[Tuple[int, int]]:
+    """
+    Time ranges in text as (start, end) minutes since midnight; end may exceed a day for overnight hours
+    """
+    lowered = text.lower()
+    for word, replacement in _NOON_MIDNIGHT.items():
+        lowered = lowered.replace(word, replacement)
+    if re.search(r"24\s*(?:hours|hrs|h\b)|24/7|open all day", lowered):
+        return [(0, 24 * 60)]
+
+    ranges = []
+    for m in _TIME_RANGE.finditer(lowered):
+        sh, sm, sp, eh, em, ep = m.groups()
+        if int(sh) > 24 or int(eh) > 24:
+            continue
+        # "11–2pm": the start borrows the end's meridiem unless that would put it after the end
+        if sp is None and ep is not None:
+            sp = ep
+            if _minutes(sh, sm, sp) >= _minutes(eh, em, ep):
+                sp = "a" if ep == "p" else "p"
+        start, end = _minutes(sh, sm, sp), _minutes(eh, em, ep)
+        # "9–5" without meridiems: a close before the open is in the afternoon
+        if ep is None and end <= start and int(eh) < 12:
+            end += 12 * 60
+        if end <= start:
+            end += 24 * 60
+        ranges.append((start, end))
+    return ranges
+
+
+def _range_mask(day: int, start: int, end: int) -> int:
+    """
+    Slots from start to end minutes on day, wrapping past Sunday into Monday
+    """
+    first = day * SLOTS_PER_DAY + start // SLOT_MINUTES
+    last = day * SLOTS_PER_DAY + -(-end // SLOT_MINUTES)
+    mask = ((1 << (last - first)) - 1) << first
+    return (mask | (mask >> SLOTS_PER_WEEK)) & WEEK_MASK
+
+
+def _slots(mask: int) -> Iterable[int]:
+    """
+    Indexes of the set bits of mask, lowest first
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+@dataclass(frozen=True)
+class OpeningHours:
+    """
+    Compiled weekly opening hours: one bit per 15-minute slot of the week, Monday 00:00 first
+    """
+    mask: int
+
+    @classmethod
+    def parse(cls, text: Optional[str]) -> Optional["OpeningHours"]:
+        """
+        Compile a free-text hours string like "Mon–Fri: 9:00 AM – 7:00 PM; Sat: 10–4; Sun: Closed"
+
+        :return: compiled hours, or None when nothing in text could be understood
+        """
+        if not text:
+            return None
+
+        mask = 0
+        understood = False
+        for segment in re.split(r"[;\n|]+", text):
+            if not segment.strip():
+                continue
+            m = _SEGMENT.match(segment)
+            days = _days(m.group("days")) if m else []
+            times = m.group("times") if m and days else segment
+            if not days:
+                # No day prefix: either a day-less "9–5" that applies all week, or days spelled after the times
+                days = _days(segment) or list(range(7))
+
+            if re.search(r"\bclosed\b", times, re.IGNORECASE):
+                understood = True
+                continue
+            ranges = _time_ranges(times)
+            if ranges:
+                understood = True
+            for day in days:
+                for start, end in ranges:
+                    mask |= _range_mask(day, start, end)
+
+        return cls(mask) if understood else None
+
+    def is_open(self, at: datetime) -> bool:
+        slot = at.weekday() * SLOTS_PER_DAY + (at.hour * 60 + at.minute) // SLOT_MINUTES
+        return bool(self.mask >> slot & 1)
+
+    def overlaps(self, window: int) -> bool:
+        return bool(self.mask & window)
+
+    def covers(self, window: int) -> bool:
+        return self.mask & window == window
+
+
+def _window_times(text: str) -> Optional[List[Tuple[int, int]]]:
+    """
+    Time ranges of a booking window: explicit ranges ("2-5pm"), single times ("3pm") as their 15-minute slot, and
+    open-ended ones ("after 6pm", "before 11:00")
+
+    :return: the ranges, or None when text has numbers that could not be read as a time
+    """
+    lowered = text.lower()
+    for word, replacement in _NOON_MIDNIGHT.items():
+        lowered = lowered.replace(word, replacement)
+
+    ranges = _time_ranges(lowered)
+    for m in _WINDOW_TIME.finditer(_TIME_RANGE.sub(" ", lowered)):
+        if not m.group("colon") and not m.group("meridiem"):
+            return None
+        minutes = _minutes(m.group("hour"), m.group("minute"), m.group("meridiem"))
+        if minutes >= 24 * 60:
+            return None
+        bound = m.group("bound")
+        if bound in ("after", "from"):
+            ranges.append((minutes, 24 * 60))
+        elif bound in ("before", "by", "until", "till"):
+            ranges.append((0, minutes))
+        else:
+            ranges.append((minutes, minutes + SLOT_MINUTES))
+    return ranges
+
+
+def parse_window(text: str, now: Optional[datetime] = None) -> Optional[int]:
+    """
+    Compile a booking window like "Mon–Fri afternoon", "Monday or Tuesday 2-5pm", "Tuesday 3pm" or
+    "tomorrow morning" into a weekly slot mask. Without days the window spans the whole week; without times it
+    spans the whole day.
+
+    :param text: Free-text window, as sent in TriggerRequest.window or CreateConversationRequest.window
+    :param now: Reference time for "today" and "tomorrow", defaults to the current local time
+    :return: mask of the slots in the window, or None when it names no day or time, or has a number that could not
+             be read as a time; businesses should not be filtered by such a window
+    """
+    lowered = text.lower()
+    days = _days(text)
+    if re.search(r"\btoday\b|\btonight\b", lowered):
+        days.append((now or datetime.now()).weekday())
+    if re.search(r"\btomorrow\b", lowered):
+        days.append(((now or datetime.now()).weekday() + 1) % 7)
+
+    ranges = _window_times(lowered)
+    if ranges is None:
+        return None
+    for part, minutes in _PARTS_OF_DAY.items():
+        if re.search(rf"\b{part}s?\b", lowered) or (part == "night" and "tonight" in lowered):
+            ranges.append(minutes)
+    if not days and not ranges:
+        return None
+    days = sorted(set(days)) or list(range(7))
+    ranges = ranges or [(0, 24 * 60)]
+
+    mask = 0
+    for day in days:
+        for start, end in ranges:
+            mask |= _range_mask(day, start, end)
+    return mask
+
+
+class HoursIndex:
+    """
+    Answers "which businesses are open during this window" for a whole directory at once.
+
+    Hours are compiled once, then transposed into one bitset of businesses per 15-minute slot of the week, so a
+    query is a handful of big-integer ORs/ANDs over the window's slots, independent of the number of businesses.
+    """
+
+    def __init__(self, businesses: Dict[str, BusinessInfo]):
+        self.__names = list(businesses)
+        self.__unknown = 0
+        self.__slots: List[int] = [0] * SLOTS_PER_WEEK
+        for i, info in enumerate(businesses.values()):
+            hours = OpeningHours.parse(info.hours)
+            if hours is None:
+                self.__unknown |= 1 << i
+                continue
+            for slot in _slots(hours.mask):
+                self.__slots[slot] |= 1 << i
+
+    @classmethod
+    def from_directory(cls, directory: BusinessDirectory) -> "HoursIndex":
+        return cls(directory.businesses)
+
+    def open_during(self, window: int, require_full: bool = False, include_unknown: bool = True) -> List[str]:
+        """
+        Names of the businesses open during a window
+
+        :param window: Slot mask, see parse_window
+        :param require_full: Require the business to be open for the whole window instead of any part of it
+        :param include_unknown: Keep businesses whose hours are missing or could not be parsed
+        :return: matching business names, in directory order
+        """
+        everyone = (1 << len(self.__names)) - 1
+        matched = everyone if require_full else 0
+        for slot in _slots(window):
+            if require_full:
+                matched &= self.__slots[slot]
+            else:
+                matched |= self.__slots[slot]
+        if require_full and not window:
+            matched = 0
+        if include_unknown:
+            matched |= self.__unknown
+        return [name for i, name in enumerate(self.__names) if matched >> i & 1]
+
+    def filter(self, directory: BusinessDirectory, window: int, **kwargs) -> BusinessDirectory:
+        """
+        The businesses of directory that are open during window, see open_during for the options
+        """
+        names = set(self.open_during(window, **kwargs))
+        return BusinessDirectory(businesses={n: i for n, i in directory.businesses.items() if n in names})
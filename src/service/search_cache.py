@@ -0,0 +1,162 @@
+import json
+import sqlite3
+import time
+from dataclasses import dataclass
+from os import makedirs, path
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple
+from src.service.search_parser_service import BusinessDirectory
+from src.util.blocking import run_blocking
+from src.util.env import Env
+from src.util.singleton import singleton
+
+
+@dataclass
+class CachedSearch:
+    directory: BusinessDirectory
+    age_seconds: float
+    stale: bool
+
+
+@singleton
+class SearchCache:
+    """
+    Persistent, size-bounded cache of parsed search results keyed by normalized query and location.
+
+    Entries younger than the TTL are fresh. Past the TTL they are still served for a stale window while the caller
+    refreshes them in the background (stale-while-revalidate); past that they are treated as missing. The cache lives
+    in SQLite so it survives restarts and redeploys, and the least recently used entries are evicted beyond
+    SEARCH_CACHE_MAX_ENTRIES.
+    """
+
+    def __init__(self):
+        env = Env()
+        self.__ttl_seconds = float(env["SEARCH_CACHE_TTL_SECONDS"] or 24 * 60 * 60)
+        self.__stale_seconds = float(env["SEARCH_CACHE_STALE_SECONDS"] or 6 * 24 * 60 * 60)
+        self.__max_entries = int(env["SEARCH_CACHE_MAX_ENTRIES"] or 10_000)
+        self.__path = env["SEARCH_CACHE_PATH"] or path.join(
+            path.dirname(path.realpath(__file__)), "../..", ".cache", "search_cache.sqlite3"
+        )
+        if self.__path != ":memory:":
+            makedirs(path.dirname(path.abspath(self.__path)), exist_ok=True)
+
+        self.__lock = Lock()
+        self.__hits = 0
+        self.__stale_hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+        self.__db = sqlite3.connect(self.__path, check_same_thread=False, isolation_level=None)
+        self.__db.execute("PRAGMA journal_mode=WAL")
+        self.__db.execute("PRAGMA synchronous=NORMAL")
+        self.__db.execute("""
+            CREATE TABLE IF NOT EXISTS search_cache (
+                key TEXT PRIMARY KEY,
+                query TEXT NOT NULL,
+                city TEXT NOT NULL,
+                region TEXT NOT NULL,
+                country TEXT NOT NULL,
+                directory TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self.__db.execute("CREATE INDEX IF NOT EXISTS search_cache_accessed_at ON search_cache (accessed_at)")
+
+    @staticmethod
+    def _key(key: Tuple[str, str, str, str]) -> str:
+        return "\x1f".join(key)
+
+    def get(self, key: Tuple[str, str, str, str]) -> Optional[CachedSearch]:
+        """
+        Returns the cached result for a normalized (query, city, region, country) key
+
+        :return: cached result flagged stale past the TTL, or None when absent or past the stale window
+        """
+        now = time.time()
+        with self.__lock:
+            # Reads write back the access time, so a read can commit too
+            found = run_blocking(self.__get, key, now)
+        if found is None:
+            return None
+        directory, age, stale = found
+        return CachedSearch(
+            directory=BusinessDirectory.from_dict(json.loads(directory)),
+            age_seconds=age,
+            stale=stale
+        )
+
+    def __get(self, key: Tuple[str, str, str, str], now: float) -> Optional[Tuple[str, float, bool]]:
+        """
+        Serialized directory, age and staleness of a cached result, assumes the lock is held
+        """
+        row = self.__db.execute(
+            "SELECT directory, created_at FROM search_cache WHERE key = ?", (self._key(key),)
+        ).fetchone()
+        if row is None:
+            self.__misses += 1
+            return None
+
+        directory, created_at = row
+        age = now - created_at
+        if age > self.__ttl_seconds + self.__stale_seconds:
+            self.__db.execute("DELETE FROM search_cache WHERE key = ?", (self._key(key),))
+            self.__misses += 1
+            return None
+
+        self.__db.execute("UPDATE search_cache SET accessed_at = ? WHERE key = ?", (now, self._key(key)))
+        stale = age > self.__ttl_seconds
+        if stale:
+            self.__stale_hits += 1
+        else:
+            self.__hits += 1
+        return directory, age, stale
+
+    def put(self, key: Tuple[str, str, str, str], directory: BusinessDirectory) -> None:
+        serialized = json.dumps(directory.to_dict())
+        with self.__lock:
+            run_blocking(self.__put, key, serialized, time.time())
+
+    def __put(self, key: Tuple[str, str, str, str], directory: str, now: float) -> None:
+        """
+        Stores a serialized directory and evicts beyond the size cap, assumes the lock is held
+        """
+        query, city, region, country = key
+        self.__db.execute(
+            """
+            INSERT OR REPLACE INTO search_cache
+                (key, query, city, region, country, directory, created_at, accessed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (self._key(key), query, city, region, country, directory, now, now)
+        )
+        self.__evict(now)
+
+    def __evict(self, now: float) -> None:
+        expired = self.__db.execute(
+            "DELETE FROM search_cache WHERE created_at < ?", (now - self.__ttl_seconds - self.__stale_seconds,)
+        ).rowcount
+        overflow = self.__db.execute(
+            """
+            DELETE FROM search_cache WHERE key IN (
+                SELECT key FROM search_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.__max_entries,)
+        ).rowcount
+        self.__evictions += expired + overflow
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__db.execute("DELETE FROM search_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        with self.__lock:
+            size = self.__db.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+            return {
+                "size": size,
+                "max_entries": self.__max_entries,
+                "hits": self.__hits,
+                "stale_hits": self.__stale_hits,
+                "misses": self.__misses,
+                "evictions": self.__evictions,
+            }
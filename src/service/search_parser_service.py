@@ -1,7 +1,8 @@
 import json
 import re
-from dataclasses import dataclass
-from typing import Optional, Dict, Any
+from dataclasses import asdict, dataclass, fields
+from typing import Optional, Dict, Any, List, Iterable, Tuple
+from src.service.entity_resolution import EntityResolver, normalize_phone
 
 
 @dataclass
@@ -16,8 +17,32 @@ class BusinessInfo:
 class BusinessDirectory:
     businesses: Dict[str, BusinessInfo]
 
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {name: asdict(info) for name, info in self.businesses.items()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Dict[str, Any]]) -> "BusinessDirectory":
+        known = {f.name for f in fields(BusinessInfo)}
+        return cls(businesses={
+            name: BusinessInfo(**{k: info.get(k) for k in known}) for name, info in data.items()
+        })
+
 
 class SearchParserService:
+    _FENCED_BLOCK = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.DOTALL)
+    # "( [yelp.com](https://...) )", "([a](...), [b](...))"
+    _SOURCE_LINKS = re.compile(r"\(\s*(?:\[[^\]]*\]\([^)]*\)[\s,;]*)+\)")
+    # "(yelp.com)", "(source: yelp.com)"
+    _SOURCE_DOMAIN = re.compile(r"\(\s*(?:source:?\s*)?[\w-]+(?:\.[\w-]+)*\.(?:com|org|net|io|co|us|biz|info)\S*\s*\)",
+                                re.IGNORECASE)
+    _MARKDOWN_LINK = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+    _URL = re.compile(r"https?://\S+")
+    _TRAILING_COMMA = re.compile(r",\s*([}\]])")
+    _PHONE = re.compile(r"(?:\+?1[\s.-]?)?\(?\d{3}\)?[\s.-]?\d{3}[\s.-]?\d{4}")
+    _NUMBER = re.compile(r"\d+(?:\.\d+)?")
+    # "$$", "$-$$", "$$ – $$$", "$ to $$"
+    _PRICE = re.compile(r"(\$+)(?:\s*(?:-|–|—|to)\s*(\$+))?")
+
     @staticmethod
     def _clean_str(v: Any) -> Optional[str]:
         if v is None:
@@ -31,25 +56,150 @@ class SearchParserService:
             return None
         if isinstance(v, (int, float)):
             return float(v)
-        m = re.search(r"[\d.]+", str(v))  # e.g., "4.5 stars"
-        return float(m.group(0)) if m else None
+        for m in SearchParserService._NUMBER.finditer(str(v)):  # e.g., "4.5 stars", "Rated 4.7/5"
+            stars = float(m.group(0))
+            if 0 <= stars <= 5:
+                return stars
+        return None
 
-    def clean(self, web_results: str) -> BusinessDirectory:
-        s = web_results.strip()
+    @staticmethod
+    def _clean_number(v: Any) -> Optional[str]:
+        t = SearchParserService._strip_markdown(v)
+        if t is None:
+            return None
+        m = SearchParserService._PHONE.search(t)
+        number = m.group(0).strip() if m else t
+        return normalize_phone(number) or number
+
+    @staticmethod
+    def _clean_hours(v: Any) -> Optional[str]:
+        if isinstance(v, dict):
+            v = "; ".join(f"{day}: {hours}" for day, hours in v.items())
+        elif isinstance(v, list):
+            v = "; ".join(str(h) for h in v)
+        t = SearchParserService._strip_markdown(v)
+        if t is None:
+            return None
+        t = re.sub(r"\s*[\r\n]+\s*", "; ", t)
+        return re.sub(r"\s{2,}", " ", t).strip(" ;") or None
+
+    @staticmethod
+    def _clean_price(v: Any) -> Optional[str]:
+        t = SearchParserService._strip_markdown(v)
+        if t is None:
+            return None
+        m = SearchParserService._PRICE.search(t)
+        if not m:
+            return t
+        # Tiers go up to "$$$"; a range keeps both ends, normalized to "$-$$"
+        low = m.group(1)[:3]
+        high = (m.group(2) or "")[:3]
+        return f"{low}-{high}" if high and high != low else low
+
+    @staticmethod
+    def _strip_markdown(v: Any) -> Optional[str]:
+        """
+        Removes source notes, markdown links and bare URLs from a field value
+        """
+        t = SearchParserService._clean_str(v)
+        if t is None:
+            return None
+        t = SearchParserService._SOURCE_LINKS.sub("", t)
+        t = SearchParserService._SOURCE_DOMAIN.sub("", t)
+        t = SearchParserService._MARKDOWN_LINK.sub(r"\1", t)
+        t = SearchParserService._URL.sub("", t)
+        return t.strip() or None
+
+    @staticmethod
+    def _output_text(web_results: Any) -> str:
+        """
+        Pulls the assistant text out of a Responses API payload; strings are returned as is
+        """
+        if isinstance(web_results, str):
+            return web_results
+        if not isinstance(web_results, dict):
+            raise ValueError(f"Unsupported web search payload: {type(web_results).__name__}")
+
+        if isinstance(web_results.get("output_text"), str):
+            return web_results["output_text"]
+
+        texts: List[str] = []
+        for item in web_results.get("output") or []:
+            if not isinstance(item, dict) or item.get("type") != "message":
+                continue
+            for content in item.get("content") or []:
+                if isinstance(content, dict) and content.get("type") == "output_text":
+                    texts.append(content.get("text") or "")
+        if not texts:
+            raise ValueError("No output text found in the web search response")
+        return "\n".join(texts)
+
+    @staticmethod
+    def _json_object(text: str) -> Any:
+        """
+        Parses the outermost JSON object (or array) out of text that may carry prose around it
+        """
+        s = text.strip()
         # Strip code fences if present
         if s.startswith("```") and s.endswith("```"):
             s = s[3:-3].strip()
         # If it's a log/print wrapper, try to slice out the outermost JSON object
-        if not s.startswith("{"):
+        if not s.startswith(("{", "[")):
             i, j = s.find("{"), s.rfind("}")
             if i != -1 and j != -1 and j > i:
                 s = s[i:j + 1]
         try:
-            obj = json.loads(s)
+            return json.loads(s)
         except json.JSONDecodeError as e:
-            raise ValueError(f"Could not parse JSON from response: {e}") from e
+            try:
+                return json.loads(SearchParserService._TRAILING_COMMA.sub(r"\1", s))
+            except json.JSONDecodeError:
+                raise ValueError(f"Could not parse JSON from response: {e}") from e
+
+    def clean(self, web_results: str) -> BusinessDirectory:
+        obj = self._json_object(web_results)
+        if not isinstance(obj, dict):
+            raise ValueError("Could not parse JSON from response: expected an object of businesses")
 
-        businesses: Dict[str, BusinessInfo] = {}
+        return self._directory(obj)
+
+    def extract(self, web_results: Any) -> BusinessDirectory:
+        """
+        Deterministically parses raw web search output into a directory, without an LLM round trip.
+
+        Handles the polluted formats the web search model produces: markdown-fenced JSON, "[label](url)" links,
+        parenthetical source blocks, trailing commas and businesses given as a list of objects with a name.
+
+        :param web_results: Responses API payload or its output text
+        :return: businesses sorted by descending stars (unrated last), ties by name
+        :exception: ValueError when no business can be extracted
+        """
+        text = self._output_text(web_results)
+        fenced = self._FENCED_BLOCK.search(text)
+        if fenced:
+            text = fenced.group(1)
+        # Source notes sit between JSON tokens ("4.7 ([yelp.com](...))") and break parsing, drop them up front
+        text = self._SOURCE_LINKS.sub("", text)
+        text = self._SOURCE_DOMAIN.sub("", text)
+        text = self._MARKDOWN_LINK.sub(r"\1", text)
+
+        obj = self._json_object(text)
+        if isinstance(obj, list):
+            obj = {
+                str(item.get("name") or item.get("business_name")): item
+                for item in obj
+                if isinstance(item, dict) and (item.get("name") or item.get("business_name"))
+            }
+        if not isinstance(obj, dict):
+            raise ValueError("Could not parse JSON from response: expected an object of businesses")
+
+        directory = self._directory(obj)
+        if not directory.businesses:
+            raise ValueError("No businesses found in the web search response")
+        return directory
+
+    def _directory(self, obj: Dict[str, Any]) -> BusinessDirectory:
+        businesses: List[Tuple[str, BusinessInfo]] = []
         for name, data in obj.items():
             if not isinstance(data, dict):
                 continue
@@ -58,11 +208,133 @@ class SearchParserService:
             stars = data.get("stars") or data.get("rating")
             price = data.get("price_range") or data.get("price") or data.get("priceRange")
 
-            businesses[name] = BusinessInfo(
-                number=self._clean_str(number),
-                hours=self._clean_str(hours),
+            name = self._strip_markdown(name)
+            if name is None:
+                continue
+            businesses.append((name, BusinessInfo(
+                number=self._clean_number(number),
+                hours=self._clean_hours(hours),
                 stars=self._clean_stars(stars),
-                price_range=self._clean_str(price),
-            )
+                price_range=self._clean_price(price),
+            )))
+
+        return self._ranked(EntityResolver().resolve(businesses))
+
+    def merge(self, directories: Iterable[BusinessDirectory]) -> BusinessDirectory:
+        """
+        Merges several directories into one, resolving duplicate businesses (same phone number or near-identical
+        name, see EntityResolver). The first occurrence of a business wins; fields it lacks are filled from later
+        duplicates and the highest rating is kept.
+
+        :return: merged businesses sorted by descending stars (unrated last), ties by name
+        """
+        return self._ranked(EntityResolver().resolve(
+            (name, info) for directory in directories for name, info in directory.businesses.items()
+        ))
+
+    @staticmethod
+    def _ranked(businesses: Dict[str, BusinessInfo]) -> BusinessDirectory:
+        ranked = sorted(
+            businesses.items(),
+            key=lambda item: (item[1].stars is None, -(item[1].stars or 0), item[0].lower())
+        )
+        return BusinessDirectory(businesses=dict(ranked))
+
+
+class IncrementalBusinessParser:
+    """
+    Incrementally parses web search output as it streams in, emitting each business as soon as its JSON object
+    closes instead of waiting for the whole document.
+
+    Accepts the same shapes as SearchParserService.extract: an object of businesses keyed by name, or a list of
+    objects with a "name", optionally inside prose or a markdown fence and polluted with source links.
+    """
+
+    def __init__(self):
+        self.__parser = SearchParserService()
+        self.__buffer = ""
+        self.__pos = 0
+        self.__depth = 0
+        self.__top: Optional[str] = None
+        self.__in_string = False
+        self.__escaped = False
+        # Buffer offsets of the current business: its key (object form) and its opening brace
+        self.__key_start: Optional[int] = None
+        self.__item_start: Optional[int] = None
+        self.__emitted = 0
+
+    @property
+    def emitted(self) -> int:
+        return self.__emitted
+
+    def feed(self, chunk: str) -> List[Tuple[str, BusinessInfo]]:
+        """
+        Consume the next chunk of output text
+
+        :return: businesses completed by this chunk, in arrival order
+        """
+        self.__buffer += chunk
+        completed: List[Tuple[str, BusinessInfo]] = []
+        buf = self.__buffer
+
+        while self.__pos < len(buf):
+            c = buf[self.__pos]
+            if self.__in_string:
+                if self.__escaped:
+                    self.__escaped = False
+                elif c == "\\":
+                    self.__escaped = True
+                elif c == '"':
+                    self.__in_string = False
+            elif c == '"' and self.__depth > 0:
+                # Quotes in prose around the JSON are not strings
+                self.__in_string = True
+                if self.__top == "{" and self.__depth == 1 and self.__item_start is None:
+                    self.__key_start = self.__pos
+            elif c in "{[":
+                if self.__depth == 0:
+                    self.__top = c
+                elif self.__depth == 1 and c == "{":
+                    self.__item_start = self.__pos
+                self.__depth += 1
+            elif c in "}]" and self.__depth > 0:
+                self.__depth -= 1
+                if self.__depth == 1 and c == "}" and self.__item_start is not None:
+                    completed.extend(self.__complete(buf, self.__pos))
+                elif self.__depth == 0:
+                    self.__top = None
+            self.__pos += 1
+
+        self.__compact()
+        return completed
+
+    def __complete(self, buf: str, end: int) -> List[Tuple[str, BusinessInfo]]:
+        if self.__top == "{" and self.__key_start is not None:
+            raw = "{" + buf[self.__key_start:end + 1] + "}"
+        else:
+            raw = "[" + buf[self.__item_start:end + 1] + "]"
+        self.__key_start = None
+        self.__item_start = None
+
+        try:
+            directory = self.__parser.extract(raw)
+        except ValueError:
+            return []
+        self.__emitted += len(directory.businesses)
+        return list(directory.businesses.items())
 
-        return BusinessDirectory(businesses=businesses)
+    def __compact(self) -> None:
+        """
+        Drop text that no pending business can refer to, so memory stays bounded by the largest single business
+        """
+        keep = min(
+            (i for i in (self.__key_start, self.__item_start) if i is not None),
+            default=self.__pos
+        )
+        if keep > 0:
+            self.__buffer = self.__buffer[keep:]
+            self.__pos -= keep
+            if self.__key_start is not None:
+                self.__key_start -= keep
+            if self.__item_start is not None:
+                self.__item_start -= keep
@@ -1,20 +1,84 @@
+import json
+import math
+import time
+import logging
 import requests
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from threading import Lock
+from typing import Optional, Dict, Any, Iterator, List, Set, Tuple
 from textwrap import dedent
 from src.agent.web_search_cleaner_agent import WebSearchCleanerAgent
+from src.llm.service.llm_response_service import LlmResponseService
 from src.llm.service.openai_llm_response_service import OpenAILlmResponseService
-from src.service.search_parser_service import SearchParserService, BusinessDirectory
+from src.llm.service.llm_scheduler import LlmScheduler, Priority, retry_after_seconds
+from src.service.business_index import BusinessIndex
+from src.service.search_cache import SearchCache
+from src.service.search_parser_service import (
+    BusinessDirectory,
+    BusinessInfo,
+    IncrementalBusinessParser,
+    SearchParserService
+)
+from src.util.deadline import budget, check, current_deadline, submit
 from src.util.env import Env
+from src.util.http_client import HttpClient
+from src.util.metrics import span, upstream_call
+from src.util.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class SearchLocation:
+    city: str
+    region: str
+    country: str = "us"
 
 
 class SearchService:
-    def __init__(self):
+    # Shared by every instance so a burst of identical searches runs a single upstream search
+    __inflight = SingleFlight()
+    # Web search answers are long and mostly output; reserved with the scheduler up front
+    __ESTIMATED_TOKENS = 4000
+    __parser_lock = Lock()
+    __parser_counts = {"local": 0, "llm_fallback": 0}
+    # Stale cache entries are refreshed off the request path, at most once per key at a time
+    __revalidator = ThreadPoolExecutor(max_workers=2, thread_name_prefix="search-revalidate")
+    __revalidating: Set[Tuple[str, str, str, str]] = set()
+    __revalidating_lock = Lock()
+    # Bounded pool shared by all fan-out searches, so a wide request cannot open unbounded upstream calls
+    __fanout = ThreadPoolExecutor(
+        max_workers=int(Env()["SEARCH_FANOUT_WORKERS"] or 8),
+        thread_name_prefix="search-fanout"
+    )
+
+    def __init__(
+        self,
+        llm_response_service: Optional[LlmResponseService] = None,
+        search_cache: Optional[SearchCache] = None,
+        business_index: Optional[BusinessIndex] = None
+    ):
+        """
+        :param llm_response_service: Service used by the cleaner agent, defaults to a background priority OpenAI service
+        :param search_cache: Persistent cache of parsed results, defaults to the process-wide SearchCache
+        :param business_index: Index every parsed business is recorded in, defaults to the process-wide BusinessIndex
+        """
         self.__model = "o4-mini"
-        self.__url = "https://api.openai.com/v1/responses"
+        base_url = (Env()["OPENAI_BASE_URL"] or "https://api.openai.com/v1").rstrip("/")
+        self.__url = f"{base_url}/responses"
         self.__api_key = Env()["OPENAI_API_KEY"]
         self.__headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.__api_key}",
         }
+        self.__http = HttpClient()
+        self.__scheduler = LlmScheduler()
+        self.__cleaner_agent = WebSearchCleanerAgent(
+            llm_response_service or OpenAILlmResponseService(priority=Priority.BACKGROUND)
+        )
+        self.__cache = search_cache if search_cache is not None else SearchCache()
+        self.__index = business_index if business_index is not None else BusinessIndex()
 
     def search(
         self,
@@ -22,9 +86,284 @@ class SearchService:
         city: str,
         region: str,
         country: str = "us",
-        timeout: int = 3 * 60  # 3 minutes default timeout
+        timeout: int = 3 * 60,  # 3 minutes default timeout
+        refresh: bool = False
+    ) -> BusinessDirectory:
+        """
+        Search for businesses matching the query around the given location. Results are served from the persistent
+        search cache when present; stale entries are returned right away and refreshed in the background. Concurrent
+        misses for the same normalized query and location share one upstream search and its cleaned result.
+
+        :param refresh: Skip the cache and always search upstream, storing the result in the cache and business index
+        """
+        key = (self._normalize(query), self._normalize(city), self._normalize(region), self._normalize(country))
+
+        with span("search") as s:
+            cached = None if refresh else self.__cache.get(key)
+            if cached is not None:
+                s.attributes["cache"] = "stale" if cached.stale else "fresh"
+                if cached.stale:
+                    self.__revalidate(key, query, city, region, country, timeout)
+                return cached.directory
+
+            s.attributes["cache"] = "refresh" if refresh else "miss"
+            return self.__fetch(key, query, city, region, country, timeout)
+
+    def search_many(
+        self,
+        queries: List[str],
+        locations: List[SearchLocation],
+        deadline: float = 3 * 60,
+        refresh: bool = False
+    ) -> BusinessDirectory:
+        """
+        Run every query against every location concurrently and merge the results into one de-duplicated directory.
+
+        All branches share a global deadline. Branches still running when it passes are abandoned and the merged
+        result of the branches that finished is returned; failed branches are logged and skipped.
+
+        :param queries: Search phrasings, e.g. ["barbers", "men's haircut"]
+        :param locations: Locations to search around
+        :param deadline: Seconds until partial results are returned, capped by the remaining budget of the current
+                         request deadline
+        :param refresh: Bypass the search cache in every branch, see search
+        :return: merged businesses of every branch that finished in time
+        :exception: TimeoutError when no branch finished in time, or the first branch error when every branch failed
+        :exception: RequestCancelledError when the request is cancelled while branches are running
+        """
+        started = time.monotonic()
+        request_deadline = current_deadline()
+        deadline = budget(deadline)
+        branches = {
+            submit(
+                self.__fanout,
+                self.search,
+                query=query,
+                city=location.city,
+                region=location.region,
+                country=location.country,
+                # Rounded up, the branch's upstream calls are capped by the request deadline anyway
+                timeout=max(1, math.ceil(deadline)),
+                refresh=refresh
+            ): (query, location)
+            for query in dict.fromkeys(queries)
+            for location in dict.fromkeys(locations)
+        }
+        if not branches:
+            return BusinessDirectory(businesses={})
+
+        pending = set(branches)
+        while pending:
+            waiting_on = set(pending)
+            if request_deadline is not None:
+                waiting_on.add(request_deadline.cancelled_future)
+            finished, _ = wait(
+                waiting_on, timeout=max(started + deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED
+            )
+            if request_deadline is not None and request_deadline.cancelled:
+                for future in pending:
+                    future.cancel()
+                request_deadline.check()
+            if not finished:
+                break
+            pending -= finished
+        done = set(branches) - pending
+        for future in pending:
+            future.cancel()
+
+        directories: List[BusinessDirectory] = []
+        errors: List[BaseException] = []
+        # Merge in submission order so the first query/location decides a duplicate's name, not the fastest branch
+        for future in (f for f in branches if f in done):
+            if future.exception() is not None:
+                logger.warning("Search branch %s failed: %s", branches[future], future.exception())
+                errors.append(future.exception())
+            else:
+                directories.append(future.result())
+
+        if pending:
+            logger.warning(
+                "Search fan-out hit its %.1fs deadline, returning %d of %d branches",
+                deadline, len(directories), len(branches)
+            )
+        if not directories:
+            check()
+            if errors:
+                raise errors[0]
+            raise TimeoutError(f"No search branch finished within {time.monotonic() - started:.0f}s")
+
+        return SearchParserService().merge(directories)
+
+    def __fetch(
+        self,
+        key: Tuple[str, str, str, str],
+        query: str,
+        city: str,
+        region: str,
+        country: str,
+        timeout: int
+    ) -> BusinessDirectory:
+        def search_and_store() -> BusinessDirectory:
+            directory = self.__search(query, city, region, country, timeout)
+            self.__cache.put(key, directory)
+            self.__index.upsert(directory, BusinessIndex.category(query), city, region, country)
+            return directory
+
+        # Followers of a coalesced search stop waiting once their own budget runs out
+        return self.__inflight.do(key, search_and_store, timeout=budget(timeout))
+
+    def __revalidate(
+        self,
+        key: Tuple[str, str, str, str],
+        query: str,
+        city: str,
+        region: str,
+        country: str,
+        timeout: int
+    ) -> None:
+        with self.__revalidating_lock:
+            if key in self.__revalidating:
+                return
+            self.__revalidating.add(key)
+
+        def refresh() -> None:
+            try:
+                self.__fetch(key, query, city, region, country, timeout)
+            except Exception:
+                logger.warning("Could not refresh stale search results for %s", key, exc_info=True)
+            finally:
+                with self.__revalidating_lock:
+                    self.__revalidating.discard(key)
+
+        self.__revalidator.submit(refresh)
+
+    def __search(
+        self,
+        query: str,
+        city: str,
+        region: str,
+        country: str,
+        timeout: int
     ) -> BusinessDirectory:
-        payload = {
+        payload = self.__payload(query, city, region, country)
+
+        try:
+            slot = self.__scheduler.slot(
+                self.__model, Priority.DEFAULT, self.__ESTIMATED_TOKENS, timeout=budget(timeout)
+            )
+            with slot as ticket, upstream_call("openai", "responses", model=self.__model) as call:
+                response = self.__http.session.post(
+                    url=self.__url,
+                    headers=self.__headers,
+                    json=payload,
+                    timeout=budget(timeout)
+                )
+                call.status = response.status_code
+                if response.status_code == 429:
+                    self.__scheduler.penalize(self.__model, retry_after_seconds(response.headers))
+                elif response.status_code < 400:
+                    usage = response.json().get("usage") or {}
+                    if "total_tokens" in usage:
+                        ticket.record_usage(usage["total_tokens"])
+
+            if response.status_code >= 400:
+                raise RuntimeError(f"Search request failed: {response.status_code} {response.reason} - {response.text}")
+
+            return self.parse_web_results(response.json())
+        except requests.exceptions.Timeout:
+            check()
+            raise TimeoutError("Brave Search API request timed out")
+        except requests.exceptions.RequestException as e:
+            raise RuntimeError(f"Search request failed: {str(e)}")
+
+    def stream_search(
+        self,
+        query: str,
+        city: str,
+        region: str,
+        country: str = "us",
+        timeout: int = 3 * 60  # 3 minutes default timeout
+    ) -> Iterator[Tuple[str, BusinessInfo]]:
+        """
+        Streaming counterpart of search: yields each business as soon as its JSON object arrives from the web search,
+        so downstream steps can start on the first results. Cached results are yielded right away. The full result
+        is cached and indexed once the stream completes; if nothing could be parsed incrementally the complete output
+        goes through parse_web_results instead.
+
+        :return: (business name, business info) pairs in arrival order
+        """
+        key = (self._normalize(query), self._normalize(city), self._normalize(region), self._normalize(country))
+        cached = self.__cache.get(key)
+        if cached is not None:
+            if cached.stale:
+                self.__revalidate(key, query, city, region, country, timeout)
+            yield from cached.directory.businesses.items()
+            return
+
+        payload = self.__payload(query, city, region, country)
+        payload["stream"] = True
+
+        parser = IncrementalBusinessParser()
+        businesses: Dict[str, BusinessInfo] = {}
+        text: List[str] = []
+        try:
+            slot = self.__scheduler.slot(
+                self.__model, Priority.DEFAULT, self.__ESTIMATED_TOKENS, timeout=budget(timeout)
+            )
+            with slot as ticket, upstream_call("openai", "responses", model=self.__model, stream=True) as call:
+                response = self.__http.session.post(
+                    url=self.__url,
+                    headers=self.__headers,
+                    json=payload,
+                    timeout=budget(timeout),
+                    stream=True
+                )
+                call.status = response.status_code
+                with response:
+                    if response.status_code == 429:
+                        self.__scheduler.penalize(self.__model, retry_after_seconds(response.headers))
+                    if response.status_code >= 400:
+                        raise RuntimeError(
+                            f"Search request failed: {response.status_code} {response.reason} - {response.text}"
+                        )
+
+                    # SSE bodies are utf-8, but requests falls back to latin-1 for text/* without a charset
+                    response.encoding = "utf-8"
+                    for line in response.iter_lines(decode_unicode=True):
+                        if not line or not line.startswith("data:"):
+                            continue
+                        event = json.loads(line[len("data:"):].strip())
+                        kind = event.get("type")
+                        if kind == "response.output_text.delta":
+                            text.append(event.get("delta") or "")
+                            for name, info in parser.feed(event.get("delta") or ""):
+                                if name not in businesses:
+                                    businesses[name] = info
+                                    yield name, info
+                        elif kind == "response.completed":
+                            usage = (event.get("response") or {}).get("usage") or {}
+                            if "total_tokens" in usage:
+                                ticket.record_usage(usage["total_tokens"])
+                        elif kind in ("response.failed", "error"):
+                            raise RuntimeError(f"Search request failed: {event}")
+                        check()
+        except requests.exceptions.Timeout:
+            check()
+            raise TimeoutError("Brave Search API request timed out")
+        except requests.exceptions.RequestException as e:
+            raise RuntimeError(f"Search request failed: {str(e)}")
+
+        if businesses:
+            directory = SearchParserService().merge([BusinessDirectory(businesses=businesses)])
+        else:
+            directory = self.parse_web_results("".join(text))
+            yield from directory.businesses.items()
+
+        self.__cache.put(key, directory)
+        self.__index.upsert(directory, BusinessIndex.category(query), city, region, country)
+
+    def __payload(self, query: str, city: str, region: str, country: str) -> Dict[str, Any]:
+        return {
             "model": self.__model,
             "tools": [{
                 "type": "web_search_preview",
@@ -49,24 +388,48 @@ class SearchService:
             """).strip()
         }
 
-        try:
-            response = requests.post(
-                url=self.__url,
-                headers=self.__headers,
-                json=payload,
-                timeout=timeout
-            )
-            if response.status_code >= 400:
-                raise RuntimeError(f"Search request failed: {response.status_code} {response.reason} - {response.text}")
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return " ".join(text.lower().split())
 
-            return self.parse_web_results(response.json())
-        except requests.exceptions.Timeout:
-            raise TimeoutError("Brave Search API request timed out")
-        except requests.exceptions.RequestException as e:
-            raise RuntimeError(f"Search request failed: {str(e)}")
+    @classmethod
+    def inflight_stats(cls) -> Dict[str, int]:
+        return cls.__inflight.stats()
 
-    @staticmethod
-    def parse_web_results(response) -> BusinessDirectory:
-        res = WebSearchCleanerAgent(OpenAILlmResponseService()).execute(response)
+    @classmethod
+    def parser_stats(cls) -> Dict[str, Any]:
+        """
+        How often web search output was parsed locally versus handed to the cleaner LLM
+        """
+        with cls.__parser_lock:
+            local, fallback = cls.__parser_counts["local"], cls.__parser_counts["llm_fallback"]
+        total = local + fallback
+        return {
+            "local": local,
+            "llm_fallback": fallback,
+            "fallback_rate": fallback / total if total else 0.0,
+        }
+
+    def parse_web_results(self, response) -> BusinessDirectory:
+        """
+        Parse web search output locally, only paying for a cleaner LLM round trip when local parsing fails
+        """
+        parser = SearchParserService()
+        try:
+            with span("parse.extract"):
+                directory = parser.extract(response)
+        except ValueError as e:
+            logger.info("Local web search parsing failed, falling back to the cleaner agent: %s", e)
+            self.__count("llm_fallback")
+            with span(f"agent.{self.__cleaner_agent.agent_type()}"):
+                res = self.__cleaner_agent.execute(response)
+            with span("parse.clean"):
+                return parser.clean(res)
+
+        self.__count("local")
+        return directory
 
-        return SearchParserService().clean(res)
+    @classmethod
+    def __count(cls, outcome: str) -> None:
+        with cls.__parser_lock:
+            cls.__parser_counts[outcome] += 1
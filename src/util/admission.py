@@ -0,0 +1,156 @@
+import math
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from contextlib import contextmanager
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Deque, Dict, Iterator, Optional
+from src.util.deadline import budget, current_deadline
+
+
+class AdmissionRejectedError(RuntimeError):
+    """
+    Raised when a request is shed instead of admitted, because the wait queue of its endpoint class is full or it
+    waited longer than the queue timeout
+    """
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class Admission:
+    """
+    Slot handed to an admitted request, returned with AdmissionController.release once the request is done
+    """
+    waited_seconds: float
+    admitted_at: float
+
+
+class AdmissionController:
+    """
+    Bounds the requests of one endpoint class that run at once, so a traffic spike queues briefly or is turned away
+    instead of piling every request up on upstream calls.
+
+    At most max_concurrent requests run; up to max_queue more wait for a slot in arrival order, each for at most
+    queue_timeout seconds. Requests beyond that fail fast with AdmissionRejectedError, which carries a Retry-After
+    estimate from the current queue depth and the average time a request holds its slot.
+    """
+
+    # Weight of the latest request in the running average of slot hold times
+    __SMOOTHING = 0.2
+    __MAX_RETRY_AFTER = 60
+
+    def __init__(self, name: str, max_concurrent: int = 64, max_queue: int = 128, queue_timeout: float = 10.0):
+        if max_concurrent < 1 or max_queue < 0:
+            raise ValueError("max_concurrent must be at least 1 and max_queue at least 0")
+
+        self.name = name
+        self.__max_concurrent = max_concurrent
+        self.__max_queue = max_queue
+        self.__queue_timeout = queue_timeout
+        self.__lock = Lock()
+        # Resolved when a released slot is handed to the waiter
+        self.__waiting: Deque[Future] = deque()
+        self.__in_flight = 0
+        self.__admitted = 0
+        self.__rejected = 0
+        self.__timed_out = 0
+        self.__cancelled = 0
+        self.__average_hold_seconds = 1.0
+
+    def acquire(self, timeout: Optional[float] = None) -> Admission:
+        """
+        Wait for a slot
+
+        :param timeout: Maximum seconds to wait, defaults to the queue timeout; capped by the current request deadline
+        :return: the admission to release once the request is done
+        :exception: AdmissionRejectedError when the queue is full or no slot freed up within the queue timeout
+        :exception: RequestCancelledError when the request is cancelled while it waits, e.g. its client left
+        :exception: DeadlineExceededError when the request deadline runs out while it waits
+        """
+        started = time.monotonic()
+        timeout = budget(self.__queue_timeout if timeout is None else timeout)
+        with self.__lock:
+            if self.__in_flight < self.__max_concurrent and not self.__waiting:
+                self.__in_flight += 1
+                self.__admitted += 1
+                return Admission(waited_seconds=0.0, admitted_at=started)
+
+            if len(self.__waiting) >= self.__max_queue:
+                self.__rejected += 1
+                raise AdmissionRejectedError(
+                    f"Too many {self.name} requests, {len(self.__waiting)} already waiting", self.__retry_after()
+                )
+            turn = Future()
+            self.__waiting.append(turn)
+
+        # Woken by a slot, or by the request being cancelled while it waits, whichever comes first
+        request_deadline = current_deadline()
+        waiting_on = {turn} if request_deadline is None else {turn, request_deadline.cancelled_future}
+        wait(waiting_on, timeout=timeout, return_when=FIRST_COMPLETED)
+        with self.__lock:
+            # A slot may have been handed over right as the wait ended, it is taken then
+            if not turn.done():
+                self.__waiting.remove(turn)
+                if request_deadline is not None and request_deadline.cancelled:
+                    self.__cancelled += 1
+                else:
+                    self.__timed_out += 1
+                if request_deadline is not None:
+                    # Ended by the request's own cancellation or deadline rather than the queue timeout
+                    request_deadline.check()
+                raise AdmissionRejectedError(
+                    f"Timed out waiting for a {self.name} slot after {time.monotonic() - started:.1f}s",
+                    self.__retry_after()
+                )
+            self.__admitted += 1
+
+        now = time.monotonic()
+        return Admission(waited_seconds=now - started, admitted_at=now)
+
+    def release(self, admission: Admission) -> None:
+        """
+        Return the slot of a finished request, handing it straight to the longest waiting request if any
+        """
+        held = time.monotonic() - admission.admitted_at
+        with self.__lock:
+            self.__average_hold_seconds += self.__SMOOTHING * (held - self.__average_hold_seconds)
+            if self.__waiting:
+                self.__waiting.popleft().set_result(None)
+            else:
+                self.__in_flight -= 1
+
+    @contextmanager
+    def slot(self, timeout: Optional[float] = None) -> Iterator[Admission]:
+        """
+        Hold a slot for the enclosed work, see acquire
+        """
+        admission = self.acquire(timeout)
+        try:
+            yield admission
+        finally:
+            self.release(admission)
+
+    def __retry_after(self) -> int:
+        """
+        Whole seconds until the queue has likely drained enough to admit one more request, assumes the lock is held
+        """
+        seconds = self.__average_hold_seconds * (len(self.__waiting) + 1) / self.__max_concurrent
+        return min(max(math.ceil(seconds), 1), self.__MAX_RETRY_AFTER)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.__lock:
+            return {
+                "in_flight": self.__in_flight,
+                "queued": len(self.__waiting),
+                "max_concurrent": self.__max_concurrent,
+                "max_queue": self.__max_queue,
+                "admitted": self.__admitted,
+                "rejected": self.__rejected,
+                "timed_out": self.__timed_out,
+                "cancelled": self.__cancelled,
+                "average_hold_seconds": round(self.__average_hold_seconds, 3),
+            }
@@ -0,0 +1,42 @@
+import sys
+from typing import Any, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+def cooperative() -> bool:
+    """
+    Whether the process serves with gevent, i.e. threads are greenlets sharing one OS thread
+    """
+    monkey = sys.modules.get("gevent.monkey")
+    return monkey is not None and monkey.is_module_patched("threading")
+
+
+def run_blocking(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Run fn on a real OS thread of gevent's threadpool when serving with gevent, so disk work like SQLite commits,
+    fsyncs and pickling a snapshot does not stall every other request of the process; a plain call otherwise.
+
+    The calling greenlet waits for the result while the others keep running. fn must not touch locks, conditions or
+    futures shared with greenlets, gevent's primitives belong to the hub's thread: take them before the call and
+    settle them after it.
+
+    :return: whatever fn returned
+    :exception: whatever fn raised
+    """
+    if not cooperative():
+        return fn(*args, **kwargs)
+
+    import gevent
+
+    def call():
+        # Handed back instead of raised in the pool, where gevent would also print it as an unhandled error
+        try:
+            return fn(*args, **kwargs), None
+        except Exception as e:
+            return None, e
+
+    result, error = gevent.get_hub().threadpool.apply(call)
+    if error is not None:
+        raise error
+    return result
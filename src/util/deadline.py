@@ -0,0 +1,142 @@
+import math
+import time
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from threading import Lock
+from typing import Any, Callable, Iterator, Optional
+
+
+class DeadlineExceededError(TimeoutError):
+    """
+    Raised when the time budget of the current request has run out
+    """
+
+
+class RequestCancelledError(RuntimeError):
+    """
+    Raised when the current request was cancelled, e.g. because its client disconnected
+    """
+
+
+class Deadline:
+    """
+    Time budget and cancellation flag of a request. Nested deadlines never outlive their parent, and cancelling a
+    deadline cancels every deadline nested in it.
+    """
+
+    def __init__(self, seconds: Optional[float] = None, parent: Optional["Deadline"] = None):
+        """
+        :param seconds: Budget from now, None for no limit of its own
+        :param parent: Enclosing deadline, whose expiry and cancellation this one inherits
+        """
+        expires_at = math.inf if seconds is None else time.monotonic() + seconds
+        self.expires_at = min(expires_at, parent.expires_at) if parent is not None else expires_at
+        self.parent = parent
+        self.__lock = Lock()
+        self.__reason: Optional[str] = None
+        # Resolved on cancellation, so waits on futures can include it and wake up right away
+        self.__cancelled = Future()
+        if parent is not None:
+            parent.cancelled_future.add_done_callback(lambda f: self.cancel(f.result()))
+
+    @property
+    def cancelled(self) -> bool:
+        return self.__cancelled.done()
+
+    @property
+    def reason(self) -> Optional[str]:
+        return self.__reason
+
+    @property
+    def cancelled_future(self) -> Future:
+        return self.__cancelled
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        with self.__lock:
+            if self.__cancelled.done():
+                return
+            self.__reason = reason
+        self.__cancelled.set_result(reason)
+
+    def remaining(self) -> float:
+        """
+        :return: seconds left, math.inf without a limit, never negative
+        """
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def check(self) -> None:
+        """
+        :exception: RequestCancelledError when cancelled
+        :exception: DeadlineExceededError when no time is left
+        """
+        if self.cancelled:
+            raise RequestCancelledError(f"Request cancelled: {self.__reason}")
+        if self.remaining() <= 0:
+            raise DeadlineExceededError("Request deadline exceeded")
+
+    def budget(self, timeout: Optional[float] = None) -> Optional[float]:
+        """
+        Timeout for the next hop: the remaining budget, or timeout if that is shorter
+
+        :param timeout: The hop's own timeout, None for none
+        :return: seconds the hop may take, None when neither the hop nor the deadline has a limit
+        :exception: RequestCancelledError, DeadlineExceededError when there is no budget left
+        """
+        self.check()
+        remaining = self.remaining()
+        if math.isinf(remaining):
+            return timeout
+        return remaining if timeout is None else min(timeout, remaining)
+
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("clanker_current_deadline", default=None)
+
+
+@contextmanager
+def deadline(seconds: Optional[float] = None) -> Iterator[Deadline]:
+    """
+    Run the enclosed work under a deadline of seconds from now, capped by the enclosing deadline if any. Calls to
+    upstream APIs made inside, also from executors the work is submitted to with submit(), only get the remaining
+    budget as their timeout.
+    """
+    d = Deadline(seconds, parent=_current_deadline.get())
+    token = _current_deadline.set(d)
+    try:
+        yield d
+    finally:
+        try:
+            _current_deadline.reset(token)
+        except ValueError:
+            # A deadline held open across generator yields can be closed from another context
+            _current_deadline.set(d.parent)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+def budget(timeout: Optional[float] = None) -> Optional[float]:
+    """
+    Timeout for the next upstream call under the current deadline, see Deadline.budget. Without a current deadline
+    timeout is returned unchanged.
+    """
+    d = _current_deadline.get()
+    return timeout if d is None else d.budget(timeout)
+
+
+def check() -> None:
+    """
+    Raise if the current request was cancelled or ran out of time; a no-op without a current deadline
+    """
+    d = _current_deadline.get()
+    if d is not None:
+        d.check()
+
+
+def submit(executor: Executor, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+    """
+    executor.submit that runs fn in a copy of the caller's context, so the deadline and the trace span of the
+    request carry over to the worker thread
+    """
+    return executor.submit(copy_context().run, fn, *args, **kwargs)
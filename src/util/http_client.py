@@ -0,0 +1,163 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+from threading import Lock
+from typing import Any, Dict, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import EmptyPoolError
+from src.util.deadline import budget, check
+from src.util.env import Env
+from src.util.singleton import singleton
+
+logger = logging.getLogger(__name__)
+
+
+class _BoundedWaitPool:
+    """
+    Connection pool whose callers wait for a free connection at most pool_wait seconds, capped by the remaining
+    budget of the current request deadline; urllib3 would otherwise block them without limit
+    """
+    pool_wait: Optional[float] = None
+
+    def urlopen(self, method: str, url: str, *args: Any, pool_timeout: Optional[float] = None, **kwargs: Any):
+        if pool_timeout is None:
+            pool_timeout = budget(self.pool_wait)
+        return super().urlopen(method, url, *args, pool_timeout=pool_timeout, **kwargs)
+
+
+class _BoundedWaitHTTPConnectionPool(_BoundedWaitPool, HTTPConnectionPool):
+    pass
+
+
+class _BoundedWaitHTTPSConnectionPool(_BoundedWaitPool, HTTPSConnectionPool):
+    pass
+
+
+class _BoundedWaitAdapter(HTTPAdapter):
+    def __init__(self, pool_wait: float, **kwargs: Any):
+        self.__pool_wait = pool_wait
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        # Pool keyword arguments are part of urllib3's pool key, so the wait is set on per-adapter pool classes
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": type("HTTPConnectionPool", (_BoundedWaitHTTPConnectionPool,), {"pool_wait": self.__pool_wait}),
+            "https": type("HTTPSConnectionPool", (_BoundedWaitHTTPSConnectionPool,), {"pool_wait": self.__pool_wait}),
+        }
+
+    def send(self, request: requests.PreparedRequest, *args: Any, **kwargs: Any) -> requests.Response:
+        try:
+            return super().send(request, *args, **kwargs)
+        except EmptyPoolError as e:
+            # Raises the request's own error when its deadline is what cut the wait short
+            check()
+            raise requests.exceptions.ConnectionError(
+                f"No free connection to {e.pool.host} within {self.__pool_wait:g}s", request=request
+            ) from e
+
+
+@singleton
+class HttpClient:
+    """
+    Process-wide pooled HTTP transport shared by all upstream clients.
+
+    Connections are kept alive between calls, so only the first request to a host pays for the TCP+TLS handshake.
+    Every host gets at most ``pool_maxsize`` open connections; callers beyond that wait until one is returned to
+    the pool instead of opening throwaway sockets. Individual hosts can be given their own limit with
+    ``configure_host``.
+
+    A caller waits for a connection at most HTTP_POOL_TIMEOUT_SECONDS, and never beyond its request deadline, then
+    fails with requests.exceptions.ConnectionError, or DeadlineExceededError when the deadline ran out. Streamed
+    replies and long web searches hold their connection for their whole duration, so the pool bounds how many run
+    at once per host: with gevent serving up to SERVER_MAX_CONCURRENCY requests, HTTP_POOL_MAXSIZE below the number
+    of those that call the same host at once turns the rest into waiters on the pool.
+    """
+
+    def __init__(self):
+        env = Env()
+        self.__pool_connections = int(env["HTTP_POOL_CONNECTIONS"] or 10)
+        self.__pool_maxsize = int(env["HTTP_POOL_MAXSIZE"] or 32)
+        self.__pool_timeout = float(env["HTTP_POOL_TIMEOUT_SECONDS"] or 10)
+        self.__lock = Lock()
+        self.__host_limits: Dict[str, int] = {}
+        self.__session = requests.Session()
+        self.__mount("https://", self.__pool_maxsize)
+        self.__mount("http://", self.__pool_maxsize)
+        self.__executor = ThreadPoolExecutor(
+            max_workers=self.__pool_maxsize,
+            thread_name_prefix="http-client"
+        )
+
+    @property
+    def session(self) -> requests.Session:
+        return self.__session
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """
+        Bounded executor used by async callers, sized to the per-host pool so it never outgrows the connections
+        available to it.
+        """
+        return self.__executor
+
+    @property
+    def host_limits(self) -> Dict[str, int]:
+        with self.__lock:
+            return dict(self.__host_limits)
+
+    def configure_host(self, base_url: str, pool_maxsize: int) -> None:
+        """
+        Give a single host its own connection limit
+
+        :param base_url: URL prefix of the host, e.g. "https://api.openai.com"
+        :param pool_maxsize: Maximum number of keep-alive connections kept open to that host
+        """
+        if pool_maxsize < 1:
+            raise ValueError("pool_maxsize must be at least 1")
+
+        with self.__lock:
+            self.__mount(base_url.rstrip("/"), pool_maxsize)
+            self.__host_limits[base_url.rstrip("/")] = pool_maxsize
+
+    def __mount(self, prefix: str, pool_maxsize: int) -> None:
+        adapter = _BoundedWaitAdapter(
+            pool_wait=self.__pool_timeout,
+            pool_connections=self.__pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=True
+        )
+        self.__session.mount(prefix, adapter)
+
+    def prewarm(self, base_url: str, connections: int = 1, timeout: float = 5.0) -> int:
+        """
+        Open keep-alive connections to a host ahead of real traffic, so the first requests skip DNS, TCP and TLS
+        setup. Any HTTP response counts, the status of the probe does not matter.
+
+        :param base_url: URL of the host, probed with HEAD
+        :param connections: Number of connections opened concurrently, capped by the pool size of the host
+        :param timeout: Seconds each probe may take
+        :return: number of connections that were opened
+        :exception: ConnectionError when probes were sent and none of them got a response
+        """
+        with self.__lock:
+            limit = self.__host_limits.get(base_url.rstrip("/"), self.__pool_maxsize)
+        probes = [
+            self.__executor.submit(self.__session.head, base_url, timeout=timeout, allow_redirects=False)
+            for _ in range(max(min(connections, limit), 0))
+        ]
+        wait(probes)
+
+        errors = []
+        for probe in probes:
+            try:
+                probe.result()
+            except Exception as e:
+                errors.append(e)
+        if probes and len(errors) == len(probes):
+            raise ConnectionError(f"Failed to prewarm any connection to {base_url}: {errors[0]}")
+
+        opened = len(probes) - len(errors)
+        logger.info("Prewarmed %d/%d connections to %s", opened, len(probes), base_url)
+        return opened
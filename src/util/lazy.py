@@ -0,0 +1,31 @@
+from threading import Lock
+from typing import Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class Lazy(Generic[T]):
+    """
+    Builds a value on first use instead of at startup.
+
+    The factory runs at most once, even when several threads ask for the value at the same time; a factory that
+    raises is retried by the next caller.
+    """
+
+    def __init__(self, factory: Callable[[], T]):
+        self.__factory = factory
+        self.__lock = Lock()
+        self.__value: Optional[T] = None
+        self.__initialized = False
+
+    @property
+    def initialized(self) -> bool:
+        return self.__initialized
+
+    def get(self) -> T:
+        if not self.__initialized:
+            with self.__lock:
+                if not self.__initialized:
+                    self.__value = self.__factory()
+                    self.__initialized = True
+        return self.__value
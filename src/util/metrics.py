@@ -0,0 +1,272 @@
+import logging
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers sub-millisecond cache hits up to the 3 minute search timeout
+LATENCY_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 180.0, 300.0
+)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _flatten(values: Dict[str, Any], prefix: str = "") -> Iterator[Tuple[str, float]]:
+    for key, value in values.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{name}.")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.__lock = Lock()
+        self.__values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self.__lock:
+            self.__values[key] = self.__values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self.__lock:
+            for key, value in sorted(self.__values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.__buckets = tuple(sorted(buckets))
+        self.__lock = Lock()
+        # label values -> (per-bucket counts with a trailing +Inf bucket, sum)
+        self.__series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        i = bisect_left(self.__buckets, value)
+        with self.__lock:
+            series = self.__series.get(key)
+            if series is None:
+                series = self.__series[key] = ([0] * (len(self.__buckets) + 1), [0.0])
+            series[0][i] += 1
+            series[1][0] += value
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.__lock:
+            series = sorted((key, list(counts), total[0]) for key, (counts, total) in self.__series.items())
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip((*self.__buckets, float("inf")), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total:g}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Process-wide metrics, rendered in the Prometheus text exposition format.
+
+    Besides counters and histograms, components with a stats() dict can be registered as gauge collectors; they are
+    only read when /metrics is scraped, so they cost nothing on the request path.
+    """
+
+    def __init__(self):
+        self.__lock = Lock()
+        self.__metrics: Dict[str, Any] = {}
+        self.__collectors: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self.__register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.__register(Histogram(name, documentation, labelnames, buckets))
+
+    def __register(self, metric):
+        with self.__lock:
+            existing = self.__metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric '{metric.name}' is already registered with a different shape")
+                return existing
+            self.__metrics[metric.name] = metric
+            return metric
+
+    def register_collector(self, component: str, stats: Callable[[], Dict[str, Any]]) -> None:
+        """
+        Export the numeric values of a stats() dict as the gauge clanker_component_stat{component, stat}; nested
+        dicts are flattened into dotted stat names
+        """
+        with self.__lock:
+            self.__collectors[component] = stats
+
+    def render(self) -> str:
+        with self.__lock:
+            metrics = list(self.__metrics.values())
+            collectors = dict(self.__collectors)
+
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+
+        gauge = "clanker_component_stat"
+        lines += [f"# HELP {gauge} Numeric stats reported by internal components", f"# TYPE {gauge} gauge"]
+        for component, stats in sorted(collectors.items()):
+            try:
+                values = stats()
+            except Exception:
+                logger.exception("Failed to collect stats of '%s'", component)
+                continue
+            for stat, value in sorted(_flatten(values)):
+                lines.append(f"{gauge}{_labels(('component', 'stat'), (component, stat))} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "clanker_stage_duration_seconds", "Duration of each traced stage of a request", ("stage", "status")
+)
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    "clanker_llm_request_duration_seconds", "Duration of LLM requests by model", ("model", "priority", "status")
+)
+UPSTREAM_RESPONSES = REGISTRY.counter(
+    "clanker_upstream_responses_total",
+    "Responses from upstream APIs by HTTP status, or by exception name when no response arrived",
+    ("service", "endpoint", "status")
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "clanker_http_request_duration_seconds", "Duration of requests served by this app", ("method", "route", "status")
+)
+
+
+class Span:
+    __slots__ = ("stage", "attributes", "parent", "children", "started", "duration", "status")
+
+    def __init__(self, stage: str, attributes: Dict[str, Any], parent: Optional["Span"]):
+        self.stage = stage
+        self.attributes = attributes
+        self.parent = parent
+        self.children: List["Span"] = []
+        self.started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.status = "ok"
+
+    def tree(self, depth: int = 0) -> str:
+        attributes = "".join(f" {k}={v}" for k, v in self.attributes.items())
+        duration = "running" if self.duration is None else f"{self.duration * 1000:.1f}ms"
+        lines = [f"{'  ' * depth}{self.stage}{attributes} {duration} {self.status}"]
+        lines += [child.tree(depth + 1) for child in self.children]
+        return "\n".join(lines)
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("clanker_current_span", default=None)
+
+
+@contextmanager
+def span(stage: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Time a stage of a request. Spans opened inside this one, in the same context, become its children; when a root
+    span ends its whole tree is logged at DEBUG. The duration is recorded in clanker_stage_duration_seconds, so
+    attributes should be used for detail that only matters in the trace, not for high-cardinality values.
+    """
+    parent = _current_span.get()
+    s = Span(stage, attributes, parent)
+    if parent is not None:
+        parent.children.append(s)
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException:
+        s.status = "error"
+        raise
+    finally:
+        s.duration = time.perf_counter() - s.started
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # A span held open across generator yields can be closed from another context
+            _current_span.set(parent)
+        STAGE_SECONDS.observe(s.duration, stage=stage, status=s.status)
+        if parent is None and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Trace:\n%s", s.tree())
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+class UpstreamCall:
+    __slots__ = ("span", "status")
+
+    def __init__(self, s: Span):
+        self.span = s
+        self.status: Any = None
+
+
+@contextmanager
+def upstream_call(service: str, endpoint: str, **attributes: Any) -> Iterator[UpstreamCall]:
+    """
+    Trace a call to an upstream API as the stage "<service>.<endpoint>" and count its outcome in
+    clanker_upstream_responses_total. The caller sets call.status to the HTTP status once a response arrives;
+    calls that raise before that are counted under the exception's name.
+    """
+    call = None
+    try:
+        with span(f"{service}.{endpoint}", **attributes) as s:
+            call = UpstreamCall(s)
+            yield call
+    except BaseException as e:
+        if call is not None and call.status is None:
+            call.status = type(e).__name__
+        raise
+    finally:
+        if call is not None:
+            UPSTREAM_RESPONSES.inc(service=service, endpoint=endpoint, status=call.status or "unknown")
@@ -0,0 +1,103 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, Optional
+from src.util.deadline import DeadlineExceededError, RequestCancelledError, current_deadline
+
+# Outcome of a flight whose leader was cancelled or ran out of time, the followers still waiting run it again
+_ABANDONED = object()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into a single execution.
+
+    The first caller for a key runs the function; callers arriving while it is in flight wait for its outcome
+    instead of repeating the work. The result, or the raised exception, is handed to every waiter. Nothing is kept
+    once the call finishes, so a later call always does fresh work.
+
+    The leader runs the function under its own request deadline. When that deadline is cancelled or expires, the
+    error only fails the leader: its followers' clients may still be waiting, so one of them runs the call again.
+    """
+
+    def __init__(self):
+        self.__lock = Lock()
+        self.__calls: Dict[Hashable, Future] = {}
+        self.__executions = 0
+        self.__coalesced = 0
+        self.__abandoned = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """
+        Run fn under key, or wait for the identical call already in flight
+
+        :param key: Identity of the call, equal keys are coalesced
+        :param fn: Zero argument callable doing the actual work
+        :param timeout: Maximum seconds to wait for a call already in flight, None waits until it finishes
+        :return: result of fn, shared by all callers of the same flight
+        :exception: whatever fn raised, re-raised in every caller of the same flight, except the cancellation and
+                    deadline errors of the leader's own request
+        :exception: TimeoutError when the call in flight does not finish within timeout
+        :exception: RequestCancelledError when the current request deadline is cancelled while waiting
+        """
+        expires_at = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.__lock:
+                call = self.__calls.get(key)
+                leader = call is None
+                if leader:
+                    call = Future()
+                    self.__calls[key] = call
+                    self.__executions += 1
+                else:
+                    self.__coalesced += 1
+
+            if leader:
+                return self.__lead(key, call, fn)
+
+            remaining = None if expires_at is None else max(expires_at - time.monotonic(), 0)
+            res = self.__follow(call, remaining)
+            if res is not _ABANDONED:
+                return res
+
+    def __lead(self, key: Hashable, call: Future, fn: Callable[[], Any]) -> Any:
+        try:
+            res = fn()
+        except (RequestCancelledError, DeadlineExceededError):
+            self.__finish(key)
+            with self.__lock:
+                self.__abandoned += 1
+            call.set_result(_ABANDONED)
+            raise
+        except BaseException as e:
+            self.__finish(key)
+            call.set_exception(e)
+            raise
+        self.__finish(key)
+        call.set_result(res)
+        return res
+
+    def __finish(self, key: Hashable) -> None:
+        # Removed before the outcome is published, so followers running an abandoned call again start a new flight
+        with self.__lock:
+            del self.__calls[key]
+
+    @staticmethod
+    def __follow(call: Future, timeout: Optional[float]) -> Any:
+        request_deadline = current_deadline()
+        if request_deadline is None:
+            return call.result(timeout)
+        # Woken by the flight finishing or by a cancellation of the request waiting on it, whichever comes first
+        wait({call, request_deadline.cancelled_future}, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not call.done():
+            request_deadline.check()
+        return call.result(0)
+
+    def stats(self) -> Dict[str, int]:
+        with self.__lock:
+            return {
+                "in_flight": len(self.__calls),
+                "executions": self.__executions,
+                "coalesced": self.__coalesced,
+                "abandoned": self.__abandoned,
+            }
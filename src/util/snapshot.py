@@ -0,0 +1,290 @@
+import atexit
+import logging
+import mmap
+import os
+import pickle
+import signal
+import struct
+import threading
+import time
+from os import makedirs, path
+from typing import Any, Dict, Optional, Protocol, Tuple
+from src.util.blocking import run_blocking
+from src.util.env import Env
+from src.util.singleton import singleton
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b"CLANKSNAP1\n"
+_INDEX_LENGTH = struct.Struct("<Q")
+
+
+class Snapshottable(Protocol):
+    def snapshot(self) -> Any:
+        """
+        Picklable state of the component, or None when there is nothing to save
+        """
+        ...
+
+    def restore(self, state: Any) -> None:
+        ...
+
+
+@singleton
+class SnapshotManager:
+    """
+    Saves in-memory state (conversation memory, webhook state, caches) to a single file at SNAPSHOT_PATH every
+    SNAPSHOT_INTERVAL_SECONDS and on SIGTERM, and restores it after a restart so deploys do not cost state. The path
+    is suffixed with SNAPSHOT_WORKER_ID, or PORT without one, so worker processes sharing a SNAPSHOT_PATH keep
+    separate files; workers sharing a port need distinct SNAPSHOT_WORKER_IDs.
+
+    The file holds one pickled section per component behind an index. At startup only the index is read and the
+    file is memory-mapped; the sections of the components registered by then are unpickled and restored on a
+    background thread once the manager starts, so boot time does not grow with the snapshot. Until that restore
+    finishes a component serves without its saved state; wait_restored lets /ready hold traffic back meanwhile, and
+    saves wait for it so a snapshot is never overwritten before it was read. Files are written to a temporary path
+    and renamed over the previous snapshot, so a crash mid-write never leaves a torn snapshot behind.
+    """
+
+    def __init__(self):
+        env = Env()
+        snapshot_path = env["SNAPSHOT_PATH"] or path.join(
+            path.dirname(path.realpath(__file__)), "../..", ".cache", "snapshot.bin"
+        )
+        # Every worker process holds its own state, so each gets its own file instead of overwriting the others'.
+        # The id has to survive restarts for a worker to find its snapshot again, which a pid would not.
+        worker = env["SNAPSHOT_WORKER_ID"] or env["PORT"]
+        if worker:
+            root, ext = path.splitext(snapshot_path)
+            snapshot_path = f"{root}-{worker}{ext}"
+        self.__path = snapshot_path
+        self.__interval_seconds = float(env["SNAPSHOT_INTERVAL_SECONDS"] or 300)
+        makedirs(path.dirname(path.abspath(self.__path)), exist_ok=True)
+
+        self.__lock = threading.Lock()
+        self.__save_lock = threading.Lock()
+        self.__components: Dict[str, Snapshottable] = {}
+        # Registered before start, their sections are restored by the restore thread
+        self.__unrestored: Dict[str, Snapshottable] = {}
+        self.__restore_done = threading.Event()
+        self.__restore_done.set()
+        self.__started = False
+        self.__stop = threading.Event()
+        self.__saves = 0
+        self.__last_save_seconds = 0.0
+        self.__last_save_bytes = 0
+        self.__restored = 0
+        self.__mmap: Optional[mmap.mmap] = None
+        self.__sections: Dict[str, Tuple[int, int]] = {}
+        self.__open()
+
+    def __open(self) -> None:
+        """
+        Maps the previous snapshot and reads its index, leaving the sections themselves untouched
+        """
+        try:
+            with open(self.__path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return  # no snapshot yet, or an empty file
+
+        try:
+            if mapped[:len(_MAGIC)] != _MAGIC:
+                raise ValueError("not a snapshot file")
+            start = len(_MAGIC) + _INDEX_LENGTH.size
+            (index_length,) = _INDEX_LENGTH.unpack_from(mapped, len(_MAGIC))
+            index: Dict[str, Tuple[int, int]] = pickle.loads(mapped[start:start + index_length])
+            base = start + index_length
+            self.__sections = {name: (base + offset, length) for name, (offset, length) in index.items()}
+            self.__mmap = mapped
+        except Exception as e:
+            mapped.close()
+            logger.warning("Ignoring unreadable snapshot %s: %s", self.__path, e)
+
+    def register(self, name: str, component: Snapshottable) -> None:
+        """
+        Include a component in every snapshot. Its section of the previous snapshot, if there is one, is restored in
+        the background once the manager starts, or right away when it already has.
+
+        :param name: Unique name of the component's section in the snapshot file
+        :param component: Object with snapshot() and restore(state)
+        """
+        with self.__lock:
+            if name in self.__components:
+                raise ValueError(f"A snapshot component named '{name}' is already registered")
+            self.__components[name] = component
+            deferred = not self.__started
+            if deferred:
+                self.__unrestored[name] = component
+
+        if not deferred:
+            self.__restore(name, component)
+
+    def wait_restored(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until the sections of the components registered before start have been restored
+
+        :return: whether the restore finished
+        """
+        return self.__restore_done.wait(timeout)
+
+    def __restore_registered(self) -> None:
+        started = time.monotonic()
+        with self.__lock:
+            components, self.__unrestored = self.__unrestored, {}
+        try:
+            for name, component in components.items():
+                self.__restore(name, component)
+        finally:
+            self.__restore_done.set()
+        logger.info("Restored snapshot in %.3fs", time.monotonic() - started)
+
+    def __restore(self, name: str, component: Snapshottable) -> None:
+        with self.__lock:
+            section = self.__sections.pop(name, None)
+            data = None
+            if section is not None:
+                offset, length = section
+                data = self.__mmap[offset:offset + length]
+            if not self.__sections and self.__mmap is not None:
+                self.__mmap.close()
+                self.__mmap = None
+        if data is None:
+            return
+
+        try:
+            # Large sections take a while to unpickle, kept off the gevent hub like the save
+            state = run_blocking(pickle.loads, data)
+        except Exception as e:
+            logger.warning("Ignoring unreadable snapshot section '%s': %s", name, e)
+            return
+        if state is not None:
+            try:
+                component.restore(state)
+            except Exception:
+                logger.exception("Failed to restore '%s' from snapshot", name)
+                return
+            self.__restored += 1
+            logger.info("Restored '%s' from snapshot", name)
+
+    def save(self) -> int:
+        """
+        Writes a snapshot of every registered component
+
+        :return: size of the snapshot file in bytes
+        """
+        # Saving before the restore finished would replace sections that were never read
+        self.__restore_done.wait()
+        with self.__save_lock:
+            started = time.monotonic()
+            with self.__lock:
+                components = dict(self.__components)
+
+            states: Dict[str, Any] = {}
+            for name, component in components.items():
+                try:
+                    state = component.snapshot()
+                    if state is not None:
+                        states[name] = state
+                except Exception:
+                    logger.exception("Failed to snapshot '%s'", name)
+
+            # Pickling and the fsync run off the gevent hub, they would stall every request for the whole save
+            size, sections, failed = run_blocking(self.__write, states)
+            for name, e in failed.items():
+                logger.error("Failed to snapshot '%s': %s", name, e)
+
+            self.__saves += 1
+            self.__last_save_bytes = size
+            self.__last_save_seconds = time.monotonic() - started
+            logger.info(
+                "Saved snapshot of %d components, %d bytes in %.3fs", sections, size, self.__last_save_seconds
+            )
+            return size
+
+    def __write(self, states: Dict[str, Any]) -> Tuple[int, int, Dict[str, Exception]]:
+        """
+        Pickles every state into a temporary file and renames it over the previous snapshot
+
+        :return: size of the file in bytes, number of sections written, and the states that could not be pickled
+        """
+        sections: Dict[str, bytes] = {}
+        failed: Dict[str, Exception] = {}
+        for name, state in states.items():
+            try:
+                sections[name] = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception as e:
+                failed[name] = e
+
+        index, offset = {}, 0
+        for name, data in sections.items():
+            index[name] = (offset, len(data))
+            offset += len(data)
+        index_bytes = pickle.dumps(index, protocol=pickle.HIGHEST_PROTOCOL)
+
+        tmp = f"{self.__path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(_MAGIC)
+            f.write(_INDEX_LENGTH.pack(len(index_bytes)))
+            f.write(index_bytes)
+            for data in sections.values():
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        os.replace(tmp, self.__path)
+        return size, len(sections), failed
+
+    def start(self) -> None:
+        """
+        Restores the registered components in the background, then saves periodically, on SIGTERM and at
+        interpreter exit. Idempotent.
+        """
+        with self.__lock:
+            if self.__started:
+                return
+            self.__started = True
+            self.__restore_done.clear()
+
+        threading.Thread(target=self.__restore_registered, name="snapshot-restore", daemon=True).start()
+
+        if self.__interval_seconds > 0:
+            threading.Thread(target=self.__save_periodically, name="snapshot", daemon=True).start()
+        atexit.register(self.__on_exit)
+        if threading.current_thread() is threading.main_thread():
+            previous = signal.getsignal(signal.SIGTERM)
+
+            def on_sigterm(signum, frame):
+                self.__stop.set()
+                self.__save_quietly()
+                if callable(previous):
+                    previous(signum, frame)
+                else:
+                    raise SystemExit(128 + signum)
+
+            signal.signal(signal.SIGTERM, on_sigterm)
+
+    def __on_exit(self) -> None:
+        # After a SIGTERM the snapshot has already been written
+        if not self.__stop.is_set():
+            self.__stop.set()
+            self.__save_quietly()
+
+    def __save_periodically(self) -> None:
+        while not self.__stop.wait(self.__interval_seconds):
+            self.__save_quietly()
+
+    def __save_quietly(self) -> None:
+        try:
+            self.save()
+        except Exception:
+            logger.exception("Failed to save snapshot")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "components": sorted(self.__components),
+            "saves": self.__saves,
+            "last_save_bytes": self.__last_save_bytes,
+            "last_save_seconds": self.__last_save_seconds,
+            "restored": self.__restored,
+        }
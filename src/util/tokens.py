@@ -0,0 +1,26 @@
+from typing import Iterable
+from src.llm.models.llm_message import LlmMessage
+
+# Rough average for English text with OpenAI tokenizers, good enough for budgeting without a tokenizer dependency
+CHARS_PER_TOKEN = 4
+# Every chat message carries a few tokens of framing (role, separators) on top of its content
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the number of tokens in text
+
+    :param text: Text to measure
+    :return: estimated token count
+    :rtype: int
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def estimate_message_tokens(message: LlmMessage) -> int:
+    return estimate_tokens(str(message.content)) + MESSAGE_OVERHEAD_TOKENS
+
+
+def estimate_messages_tokens(messages: Iterable[LlmMessage]) -> int:
+    return sum(estimate_message_tokens(m) for m in messages)
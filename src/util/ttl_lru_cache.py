@@ -0,0 +1,103 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+
+class TtlLruCache:
+    """
+    Thread-safe, size-bounded cache with least-recently-used eviction and a per-entry time to live.
+    """
+
+    MISSING = object()
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+
+        self.__max_entries = max_entries
+        self.__ttl_seconds = ttl_seconds
+        self.__lock = Lock()
+        self.__entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+        self.__expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Returns the cached value for key, or default if it is absent or expired
+        """
+        value = self.lookup(key)
+        return default if value is self.MISSING else value
+
+    def lookup(self, key: Hashable) -> Any:
+        """
+        Like get, but returns TtlLruCache.MISSING on a miss so that cached None values can be told apart
+        """
+        now = time.monotonic()
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                self.__misses += 1
+                return self.MISSING
+
+            expires_at, value = entry
+            if expires_at <= now:
+                del self.__entries[key]
+                self.__expirations += 1
+                self.__misses += 1
+                return self.MISSING
+
+            self.__entries.move_to_end(key)
+            self.__hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.__ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self.__lock:
+            self.__entries[key] = (expires_at, value)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.__max_entries:
+                self.__entries.popitem(last=False)
+                self.__evictions += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Live entries with their remaining time to live, least recently used first
+        """
+        now = time.monotonic()
+        with self.__lock:
+            entries = [(key, expires_at - now, value) for key, (expires_at, value) in self.__entries.items()]
+        return {"saved_at": time.time(), "entries": [e for e in entries if e[1] > 0]}
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        """
+        Loads entries from a snapshot; the time since it was taken counts against their time to live
+        """
+        elapsed = max(time.time() - state["saved_at"], 0)
+        entries: List[Tuple[Hashable, float, Any]] = state["entries"]
+        with self.__lock:
+            # Entries written since startup are newer than the snapshot's
+            entries = [e for e in entries if e[1] > elapsed and e[0] not in self.__entries]
+        for key, remaining, value in entries:
+            self.set(key, value, ttl_seconds=remaining - elapsed)
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return len(self.__entries)
+
+    def stats(self) -> Dict[str, int]:
+        with self.__lock:
+            return {
+                "size": len(self.__entries),
+                "max_entries": self.__max_entries,
+                "hits": self.__hits,
+                "misses": self.__misses,
+                "evictions": self.__evictions,
+                "expirations": self.__expirations,
+            }
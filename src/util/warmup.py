@@ -0,0 +1,96 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+from src.util.env import Env
+from src.util.singleton import singleton
+
+logger = logging.getLogger(__name__)
+
+
+@singleton
+class Warmup:
+    """
+    Runs startup work in the background, off the path of the first requests: building lazily constructed services
+    and opening pooled connections to upstream APIs. The app serves traffic right away; /ready reports whether the
+    warm-up has finished, so a load balancer can hold traffic back until it has.
+
+    Tasks run one after another in registration order. A failing task is logged and recorded but does not block
+    readiness, the request that needs it pays the cost instead. With WARMUP_ENABLED=false nothing runs and the app is
+    ready as soon as it starts.
+    """
+
+    def __init__(self):
+        env = Env()
+        self.__enabled = (env["WARMUP_ENABLED"] or "true").lower() == "true"
+        self.__lock = threading.Lock()
+        self.__tasks: Dict[str, Callable[[], Any]] = {}
+        self.__results: Dict[str, Dict[str, Any]] = {}
+        self.__started = False
+        self.__done = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return self.__enabled
+
+    def add(self, name: str, task: Callable[[], Any]) -> None:
+        """
+        :param name: Name the task is reported under by /ready
+        :param task: Zero argument callable, its return value is ignored
+        """
+        with self.__lock:
+            if self.__started:
+                raise RuntimeError(f"Warm-up task '{name}' was added after the warm-up started")
+            self.__tasks[name] = task
+
+    def start(self) -> None:
+        """
+        Runs the registered tasks in a background thread. Idempotent.
+        """
+        with self.__lock:
+            if self.__started:
+                return
+            self.__started = True
+            tasks = dict(self.__tasks) if self.__enabled else {}
+
+        if not tasks:
+            self.__done.set()
+            return
+        threading.Thread(target=self.__run, args=(tasks,), name="warmup", daemon=True).start()
+
+    def __run(self, tasks: Dict[str, Callable[[], Any]]) -> None:
+        started = time.monotonic()
+        for name, task in tasks.items():
+            task_started = time.monotonic()
+            try:
+                task()
+                result = {"ok": True}
+            except Exception as e:
+                logger.warning("Warm-up task '%s' failed: %s", name, e)
+                result = {"ok": False, "error": str(e)}
+            result["seconds"] = round(time.monotonic() - task_started, 3)
+            with self.__lock:
+                self.__results[name] = result
+
+        self.__done.set()
+        logger.info("Warm-up finished in %.3fs", time.monotonic() - started)
+
+    @property
+    def ready(self) -> bool:
+        return self.__done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until the warm-up finishes or timeout passes
+
+        :return: whether the warm-up finished
+        """
+        return self.__done.wait(timeout)
+
+    def status(self) -> Dict[str, Any]:
+        with self.__lock:
+            return {
+                "ready": self.__done.is_set(),
+                "enabled": self.__enabled,
+                "tasks": {name: dict(self.__results.get(name, {"ok": None})) for name in self.__tasks},
+            }
@@ -0,0 +1,27 @@
+from src.service.entity_resolution import EntityResolver
+from src.service.search_parser_service import BusinessInfo
+
+
+def _info(number=None, stars=None):
+    return BusinessInfo(number=number, hours=None, stars=stars, price_range=None)
+
+
+def test_phoneless_record_does_not_bridge_different_phones():
+    resolved = EntityResolver().resolve([
+        ("Joe's Barber Shop", _info("+14155551234")),
+        ("Joes Barber Shop", _info()),
+        ("Joe's Barbershop", _info("+14155557777")),
+    ])
+    assert {info.number for info in resolved.values()} == {"+14155551234", "+14155557777"}
+
+
+def test_same_name_with_different_phones_is_kept_apart():
+    resolved = EntityResolver().resolve([
+        ("Joe's Barber Shop", _info("+14155551234", stars=4.0)),
+        ("Joe's Barber Shop", _info("+14155558888")),
+        ("Joes Barber Shop", _info("(415) 555-1234", stars=5.0)),
+    ])
+    assert resolved == {
+        "Joe's Barber Shop": _info("+14155551234", stars=5.0),
+        "Joe's Barber Shop (+14155558888)": _info("+14155558888"),
+    }
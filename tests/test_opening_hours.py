@@ -0,0 +1,54 @@
+from datetime import datetime
+from src.service.opening_hours import SLOT_MINUTES, SLOTS_PER_DAY, OpeningHours, parse_window
+
+# A Monday
+NOW = datetime(2026, 10, 19, 9, 0)
+
+
+def _open_days(mask):
+    """
+    Days of the window as {weekday: (first minute, last minute)}
+    """
+    days = {}
+    for day in range(7):
+        slots = [i for i in range(SLOTS_PER_DAY) if mask >> (day * SLOTS_PER_DAY + i) & 1]
+        if slots:
+            days[day] = (slots[0] * SLOT_MINUTES, (slots[-1] + 1) * SLOT_MINUTES)
+    return days
+
+
+def test_words_containing_day_names_are_not_days():
+    assert parse_window("any time this month", now=NOW) is None
+    assert parse_window("sunset dinner", now=NOW) is None
+
+
+def test_plural_parts_of_day():
+    assert _open_days(parse_window("weekday evenings", now=NOW)) == {day: (17 * 60, 21 * 60) for day in range(5)}
+
+
+def test_single_time_is_its_slot():
+    assert _open_days(parse_window("Tuesday 3pm", now=NOW)) == {1: (15 * 60, 15 * 60 + SLOT_MINUTES)}
+
+
+def test_open_ended_times():
+    assert _open_days(parse_window("Mondays after 6pm", now=NOW)) == {0: (18 * 60, 24 * 60)}
+    assert _open_days(parse_window("weds before noon", now=NOW)) == {2: (0, 12 * 60)}
+
+
+def test_unreadable_numbers_disable_the_filter():
+    assert parse_window("Oct 21", now=NOW) is None
+
+
+def test_day_and_time_ranges():
+    assert _open_days(parse_window("Mon–Fri afternoon", now=NOW)) == {day: (12 * 60, 17 * 60) for day in range(5)}
+    assert _open_days(parse_window("Monday or Tuesday 2-5pm", now=NOW)) == {
+        0: (14 * 60, 17 * 60), 1: (14 * 60, 17 * 60)
+    }
+    assert _open_days(parse_window("tomorrow morning", now=NOW)) == {1: (8 * 60, 12 * 60)}
+
+
+def test_closed_business_does_not_overlap():
+    hours = OpeningHours.parse("Mon–Fri: 9:00 AM – 5:00 PM; Sat: 10–4; Sun: Closed")
+    assert not hours.overlaps(parse_window("weekday evenings", now=NOW))
+    assert hours.overlaps(parse_window("Tuesday 3pm", now=NOW))
+    assert not hours.overlaps(parse_window("Sunday", now=NOW))
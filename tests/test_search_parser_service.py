@@ -0,0 +1,21 @@
+from src.service.search_parser_service import SearchParserService
+
+
+def test_single_price_tier():
+    assert SearchParserService._clean_price("$$") == "$$"
+    assert SearchParserService._clean_price("Price: $$$$ (yelp.com)") == "$$$"
+
+
+def test_price_range_keeps_both_ends():
+    assert SearchParserService._clean_price("$-$$") == "$-$$"
+    assert SearchParserService._clean_price("$$ – $$$") == "$$-$$$"
+    assert SearchParserService._clean_price("$ to $$") == "$-$$"
+
+
+def test_price_range_with_equal_ends_is_one_tier():
+    assert SearchParserService._clean_price("$$-$$") == "$$"
+
+
+def test_price_without_symbols_is_kept():
+    assert SearchParserService._clean_price("moderate") == "moderate"
+    assert SearchParserService._clean_price("  ") is None